@@ -0,0 +1,103 @@
+"""
+Compare two load-test reports
+Flags an endpoint as regressed when its throughput drops, its p50/p99
+latency, CPU or RSS grows by more than the threshold, or its error rate
+rises by more than a percentage point.
+
+Usage (from backend/):
+    python -m benchmarks.compare runs/base.json runs/new.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+ERROR_RATE_SLACK = 0.01  # Absolute error-rate increase tolerated between runs
+
+# (label, path in an endpoint result, True if higher is better)
+COMPARED = [
+    ("req/s", ("throughput_rps",), True),
+    ("p50 ms", ("latency_ms", "p50"), False),
+    ("p99 ms", ("latency_ms", "p99"), False),
+    ("cpu %", ("cpu_percent",), False),
+    ("rss MB", ("rss_mb",), False),
+]
+
+
+SETTINGS = ("mode", "concurrency", "rate", "duration_s", "unique")  # Runs differing in these are not comparable
+
+
+def _lookup(result: dict, path: tuple) -> Optional[float]:
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare_reports(base: dict, new: dict, threshold: float = 10.0) -> tuple:
+    """
+    Compare every endpoint present in both reports.
+    
+    Args:
+        base: Baseline report written by load_test
+        new: Report of the run under test
+        threshold: Percent change counted as a regression
+    
+    Returns:
+        (rows of (endpoint, label, base, new, change %, regressed), number of regressions)
+    """
+    rows = []
+    for endpoint, new_result in new["endpoints"].items():
+        base_result = base["endpoints"].get(endpoint)
+        if base_result is None:
+            continue
+        for label, path, higher_is_better in COMPARED:
+            before, after = _lookup(base_result, path), _lookup(new_result, path)
+            if before is None or after is None or before == 0:
+                rows.append((endpoint, label, before, after, None, False))
+                continue
+            change = (after - before) / before * 100
+            regressed = -change > threshold if higher_is_better else change > threshold
+            rows.append((endpoint, label, before, after, round(change, 1), regressed))
+        before, after = base_result["error_rate"], new_result["error_rate"]
+        rows.append((endpoint, "errors", before, after, None, after - before > ERROR_RATE_SLACK))
+    return rows, sum(1 for row in rows if row[5])
+
+
+def warn_if_incomparable(base: dict, new: dict) -> None:
+    """Point out load settings that differ between the runs"""
+    differing = [name for name in SETTINGS if base["meta"].get(name) != new["meta"].get(name)]
+    if differing:
+        print(f"[!] Runs used different load settings ({', '.join(differing)}); changes may not be regressions")
+
+
+def print_comparison(rows: List[tuple], threshold: float) -> None:
+    print(f"{'endpoint':<16}{'metric':<8}{'base':>10}{'new':>10}{'change':>9}")
+    for endpoint, label, before, after, change, regressed in rows:
+        cells = "".join(f"{value:>10.4g}" if value is not None else f"{'-':>10}" for value in (before, after))
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        print(f"{endpoint:<16}{label:<8}{cells}{change_text:>9}{'  REGRESSION' if regressed else ''}")
+    regressions = sum(1 for row in rows if row[5])
+    if regressions:
+        print(f"[!] {regressions} regression(s) beyond {threshold:g}%")
+    else:
+        print(f"[OK] No regressions beyond {threshold:g}%")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two load-test reports")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args(argv)
+    
+    base, new = json.loads(args.base.read_text()), json.loads(args.new.read_text())
+    rows, regressions = compare_reports(base, new, args.threshold)
+    warn_if_incomparable(base, new)
+    print_comparison(rows, args.threshold)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Local OpenRouter stand-in for load tests
+An OpenAI-compatible /v1/chat/completions server that replays recorded
+DeepSeek/Gemini responses with configurable latency and error rates, so
+/analyze, /analyze-llm and /analyze-gemini can be load-tested without
+spending real quota. Supports plain and streamed (SSE) completions.
+
+Usage (from backend/):
+    python -m benchmarks.fake_openrouter --port 9000 --latency-ms 1500 --error-rate 0.02
+    python -m benchmarks.fake_openrouter --model "google/gemini-2.0-flash-exp:free=latency_ms:600,rate_limit_rate:0.1"
+
+Then point the backend at it:
+    OPENROUTER_BASE_URL=http://127.0.0.1:9000/v1 OPENROUTER_API_KEY=bench uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass, fields, replace
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_CORPUS = Path(__file__).parent / "data" / "llm_responses.jsonl"
+STREAM_CHUNK_CHARS = 16  # Characters per streamed delta (a few tokens)
+HANG_SECONDS = 600  # How long a "hung" request stalls before answering
+
+
+@dataclass
+class LatencyProfile:
+    """Response behaviour of one model"""
+    latency_ms: float = 1500.0  # Median time to the full response
+    sigma: float = 0.5  # Spread of the log-normal latency distribution (0 = fixed latency)
+    ttft_ratio: float = 0.25  # Share of the latency spent before the first streamed token
+    error_rate: float = 0.0  # Share of requests answered with HTTP 500
+    rate_limit_rate: float = 0.0  # Share of requests answered with HTTP 429
+    hang_rate: float = 0.0  # Share of requests that stall until the client gives up
+    
+    def sample_latency(self, rng: random.Random) -> float:
+        """Seconds until the full response"""
+        if self.sigma <= 0:
+            return self.latency_ms / 1000
+        return rng.lognormvariate(math.log(self.latency_ms / 1000), self.sigma)
+
+
+def parse_model_profile(value: str, base: LatencyProfile) -> tuple:
+    """Parse "model=latency_ms:400,error_rate:0.05" into (model, profile) with base as the defaults"""
+    model, _, settings = value.partition("=")
+    names = {field.name for field in fields(LatencyProfile)}
+    overrides = {}
+    for item in filter(None, settings.split(",")):
+        name, _, number = item.partition(":")
+        name = name.strip()
+        if name not in names:
+            raise ValueError(f"Unknown profile setting '{name}' (expected one of {sorted(names)})")
+        overrides[name] = float(number)
+    return model.strip(), replace(base, **overrides)
+
+
+def load_responses(path: Path) -> Dict[str, List[str]]:
+    """Recorded analyses by model ("*" holds all of them)"""
+    responses = defaultdict(list)
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            responses[record["model"]].append(record["analysis"])
+            responses["*"].append(record["analysis"])
+    return responses
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(responses: Dict[str, List[str]], default_profile: LatencyProfile,
+               model_profiles: Optional[Dict[str, LatencyProfile]] = None, seed: Optional[int] = None) -> FastAPI:
+    """
+    Build the fake OpenRouter app.
+    
+    Args:
+        responses: Recorded analyses by model, from load_responses
+        default_profile: Behaviour of models without their own profile
+        model_profiles: Per-model behaviour overrides
+        seed: Seed for reproducible latency and error draws
+    
+    Returns:
+        FastAPI app serving /v1/chat/completions and /stats
+    """
+    app = FastAPI(title="Fake OpenRouter")
+    model_profiles = model_profiles or {}
+    rng = random.Random(seed)
+    outcomes = Counter()  # (model, outcome) -> requests
+    
+    def error(status: int, message: str, headers: Optional[dict] = None) -> JSONResponse:
+        return JSONResponse(status_code=status, content={"error": {"message": message, "code": status}},
+                            headers=headers)
+    
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        profile = model_profiles.get(model, default_profile)
+        prompt = "".join(str(message.get("content", "")) for message in body.get("messages", []))
+        latency = profile.sample_latency(rng)
+        draw = rng.random()
+        
+        if draw < profile.rate_limit_rate:
+            outcomes[model, "rate_limited"] += 1
+            await asyncio.sleep(min(latency, 0.05))
+            return error(429, "Rate limit exceeded (fake)", {"Retry-After": "2"})
+        draw -= profile.rate_limit_rate
+        if draw < profile.error_rate:
+            outcomes[model, "error"] += 1
+            await asyncio.sleep(latency)
+            return error(500, "Upstream provider error (fake)")
+        draw -= profile.error_rate
+        if draw < profile.hang_rate:
+            outcomes[model, "hung"] += 1
+            await asyncio.sleep(HANG_SECONDS)
+        
+        outcomes[model, "ok"] += 1
+        analysis = rng.choice(responses.get(model) or responses["*"])
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(analysis),
+            "total_tokens": estimate_tokens(prompt) + estimate_tokens(analysis)
+        }
+        
+        if not body.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": analysis},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            }
+        
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        pieces = [analysis[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(analysis), STREAM_CHUNK_CHARS)]
+        
+        async def events():
+            def chunk(delta: Optional[dict], finish_reason: Optional[str] = None, chunk_usage: Optional[dict] = None):
+                choices = [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": choices, "usage": chunk_usage}
+                return f"data: {json.dumps(payload)}\n\n"
+            
+            await asyncio.sleep(latency * profile.ttft_ratio)
+            gap = latency * (1 - profile.ttft_ratio) / max(1, len(pieces))
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in pieces:
+                yield chunk({"content": piece})
+                await asyncio.sleep(gap)
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk(None, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    @app.get("/stats")
+    async def stats():
+        """Requests served per model and outcome"""
+        by_model = defaultdict(dict)
+        for (model, outcome), count in sorted(outcomes.items()):
+            by_model[model][outcome] = count
+        return {"requests": sum(outcomes.values()), "models": by_model}
+    
+    return app
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenRouter server replaying recorded LLM responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="JSONL file with 'model' and 'analysis' per line")
+    parser.add_argument("--latency-ms", type=float, default=LatencyProfile.latency_ms, help="Median response time")
+    parser.add_argument("--sigma", type=float, default=LatencyProfile.sigma, help="Log-normal latency spread (0 = fixed)")
+    parser.add_argument("--ttft-ratio", type=float, default=LatencyProfile.ttft_ratio,
+                        help="Share of the latency before the first streamed token")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests failing with HTTP 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests that never answer in time")
+    parser.add_argument("--model", action="append", default=[], metavar="MODEL=SETTING:VALUE,...",
+                        help="Per-model override, e.g. 'google/gemini-2.0-flash-exp:free=latency_ms:600'")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    
+    default_profile = LatencyProfile(args.latency_ms, args.sigma, args.ttft_ratio, args.error_rate,
+                                     args.rate_limit_rate, args.hang_rate)
+    model_profiles = dict(parse_model_profile(value, default_profile) for value in args.model)
+    responses = load_responses(args.corpus)
+    print(f"[OK] Replaying {len(responses['*'])} recorded responses ({len(responses) - 1} models)")
+    for model, profile in model_profiles.items():
+        print(f"    - {model}: {profile}")
+    
+    import uvicorn
+    uvicorn.run(create_app(responses, default_profile, model_profiles, args.seed),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Load generator and latency report for the API
+Drives one or more endpoints in closed-loop mode (N users sending back to
+back) or open-loop mode (requests arrive at a fixed rate whether or not
+earlier ones finished, which exposes queueing), then reports throughput,
+latency percentiles and the server's CPU and RSS per endpoint.
+
+Usage (from backend/, with the server running):
+    python -m benchmarks.load_test --endpoint /detect --mode closed --concurrency 16 --duration 30
+    python -m benchmarks.load_test --endpoint /analyze-llm --mode open --rate 5 --unique --output runs/new.json
+    python -m benchmarks.load_test --endpoint /detect --output runs/new.json --baseline runs/base.json
+
+Latencies in open-loop mode are measured from each request's scheduled
+send time, so a stalled server is not hidden by the generator waiting too.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+import httpx
+
+from benchmarks.compare import compare_reports, print_comparison, warn_if_incomparable
+from prefork import memory_usage
+
+ENDPOINTS = ["/detect", "/analyze", "/analyze-llm", "/analyze-gemini", "/analyze-dual"]
+LLM_ENDPOINTS = {"/analyze-llm", "/analyze-gemini", "/analyze-dual"}
+PERCENTILES = (50, 90, 95, 99)
+SAMPLE_INTERVAL = 0.5  # Seconds between server CPU/RSS samples
+
+# Default request mix when no --corpus is given
+SAMPLES = [
+    ("url", "https://www.wikipedia.org/wiki/Phishing"),
+    ("url", "http://paypa1-secure-login.verify-account.xyz/signin"),
+    ("url", "https://github.com/login"),
+    ("email", "Dear customer, your account has been suspended. Verify your identity within 24 hours "
+              "at http://secure-bank-update.com/login or it will be closed."),
+    ("email", "Hi team, the quarterly planning meeting moved to Thursday at 10am. Agenda attached."),
+    ("sms", "USPS: your package is on hold due to an unpaid fee. Pay now: http://usps-redelivery.top/pay"),
+    ("sms", "Running 10 min late, order me a coffee please"),
+]
+
+
+def load_samples(path: Optional[Path]) -> List[tuple]:
+    """(content_type, content) pairs from a JSONL file with 'content' and 'content_type' per line"""
+    if path is None:
+        return SAMPLES
+    with open(path, encoding="utf-8") as handle:
+        records = [json.loads(line) for line in handle if line.strip()]
+    return [(record["content_type"], record["content"]) for record in records]
+
+
+def build_payload(endpoint: str, content_type: str, content: str, sequence: Optional[int]) -> dict:
+    """Request body for an endpoint; a sequence number makes the content unique to bypass caches"""
+    if sequence is not None:
+        content = f"{content}?bench={sequence}" if content_type == "url" else f"{content}\n[ref {sequence}]"
+    payload = {"content": content, "content_type": content_type}
+    if endpoint in LLM_ENDPOINTS:
+        payload.update(threat_level="suspicious", confidence=70.0)
+    return payload
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def process_tree(pid: int) -> List[int]:
+    """pid and all of its descendants (prefork workers under the master)"""
+    pids = [pid]
+    for parent in pids:
+        try:
+            for task in os.listdir(f"/proc/{parent}/task"):
+                with open(f"/proc/{parent}/task/{task}/children") as handle:
+                    pids.extend(int(child) for child in handle.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def cpu_seconds(pid: int) -> float:
+    """User + system CPU time of a process"""
+    try:
+        with open(f"/proc/{pid}/stat") as handle:
+            fields = handle.read().rpartition(")")[2].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+class ServerSampler:
+    """Samples CPU time and RSS of the server processes while an endpoint is under load"""
+    
+    def __init__(self, pids: List[int]):
+        self.pids = pids
+        self.peak_rss_mb = 0.0
+        self._task = None
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+        self._pids_now: List[int] = []
+    
+    def _sample(self) -> None:
+        self._pids_now = [pid for root in self.pids for pid in process_tree(root)]
+        rss = sum(memory_usage(pid)["rss_mb"] or 0 for pid in self._pids_now)
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+    
+    async def _run(self) -> None:
+        while True:
+            self._sample()
+            await asyncio.sleep(SAMPLE_INTERVAL)
+    
+    def start(self) -> None:
+        if not self.pids:
+            return
+        self._sample()
+        self._cpu_start = sum(cpu_seconds(pid) for pid in self._pids_now)
+        self._wall_start = time.monotonic()
+        self._task = asyncio.ensure_future(self._run())
+    
+    def stop(self) -> dict:
+        if self._task is None:
+            return {"cpu_percent": None, "rss_mb": None}
+        self._task.cancel()
+        self._sample()
+        cpu = sum(cpu_seconds(pid) for pid in self._pids_now) - self._cpu_start
+        wall = time.monotonic() - self._wall_start
+        return {"cpu_percent": round(cpu / wall * 100, 1) if wall else None, "rss_mb": round(self.peak_rss_mb, 1)}
+
+
+class EndpointRun:
+    """Outcomes of the requests sent to one endpoint"""
+    
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.statuses = Counter()
+        self.errors = 0
+        self.dropped = 0  # Open loop: arrivals not sent because too many requests were outstanding
+        self.recording = False  # False during warm-up
+    
+    def record(self, status: str, latency_ms: float, ok: bool) -> None:
+        if not self.recording:
+            return
+        self.statuses[status] += 1
+        if ok:
+            self.latencies_ms.append(latency_ms)
+        else:
+            self.errors += 1
+    
+    def summary(self, duration: float) -> dict:
+        latencies = sorted(self.latencies_ms)
+        requests = sum(self.statuses.values())
+        latency = {f"p{q}": round(percentile(latencies, q), 2) if latencies else None for q in PERCENTILES}
+        latency["mean"] = round(sum(latencies) / len(latencies), 2) if latencies else None
+        latency["max"] = round(latencies[-1], 2) if latencies else None
+        return {
+            "requests": requests,
+            "ok": len(latencies),
+            "errors": self.errors,
+            "error_rate": round(self.errors / requests, 4) if requests else 0.0,
+            "dropped": self.dropped,
+            "statuses": dict(self.statuses),
+            "duration_s": round(duration, 2),
+            "throughput_rps": round(len(latencies) / duration, 2) if duration else 0.0,
+            "latency_ms": latency
+        }
+
+
+class LoadGenerator:
+    """Sends the request mix to the server in closed- or open-loop mode"""
+    
+    def __init__(self, url: str, samples: List[tuple], unique: bool = False, timeout: float = 120.0,
+                 max_in_flight: int = 1000, seed: Optional[int] = None):
+        self.url = url.rstrip("/")
+        self.samples = samples
+        self.unique = unique
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.rng = random.Random(seed)
+        self._sequence = itertools.count()
+        self._in_flight = 0
+    
+    async def _send(self, client: httpx.AsyncClient, endpoint: str, run: EndpointRun,
+                    started: Optional[float] = None) -> None:
+        content_type, content = self.rng.choice(self.samples)
+        payload = build_payload(endpoint, content_type, content, next(self._sequence) if self.unique else None)
+        start = started if started is not None else time.perf_counter()
+        self._in_flight += 1
+        try:
+            response = await client.post(endpoint, json=payload)
+            run.record(str(response.status_code), (time.perf_counter() - start) * 1000, response.is_success)
+        except httpx.HTTPError as e:
+            run.record(type(e).__name__, (time.perf_counter() - start) * 1000, False)
+        finally:
+            self._in_flight -= 1
+    
+    async def closed_loop(self, client: httpx.AsyncClient, endpoint: str, run: EndpointRun,
+                          concurrency: int, duration: float) -> None:
+        """`concurrency` users, each sending its next request as soon as the previous one returns"""
+        end = time.monotonic() + duration
+        
+        async def user():
+            while time.monotonic() < end:
+                await self._send(client, endpoint, run)
+        
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+    
+    async def open_loop(self, client: httpx.AsyncClient, endpoint: str, run: EndpointRun,
+                        rate: float, duration: float, poisson: bool = True) -> None:
+        """Requests arriving at `rate` per second (Poisson or evenly spaced) regardless of responses"""
+        start = time.perf_counter()
+        end = start + duration
+        next_arrival = start
+        tasks = set()
+        while next_arrival < end:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self._in_flight >= self.max_in_flight:
+                if run.recording:
+                    run.dropped += 1
+            else:
+                task = asyncio.ensure_future(self._send(client, endpoint, run, started=next_arrival))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_arrival += self.rng.expovariate(rate) if poisson else 1 / rate
+        if tasks:
+            await asyncio.gather(*tasks)
+    
+    async def run_endpoint(self, endpoint: str, mode: str, concurrency: int, rate: float, duration: float,
+                           warmup: float, pids: List[int]) -> dict:
+        limits = httpx.Limits(max_connections=max(concurrency, self.max_in_flight))
+        async with httpx.AsyncClient(base_url=self.url, timeout=self.timeout, limits=limits) as client:
+            run = EndpointRun()
+            
+            async def drive(seconds: float) -> None:
+                if mode == "closed":
+                    await self.closed_loop(client, endpoint, run, concurrency, seconds)
+                else:
+                    await self.open_loop(client, endpoint, run, rate, seconds)
+            
+            if warmup > 0:
+                await drive(warmup)
+            sampler = ServerSampler(pids)
+            run.recording = True
+            sampler.start()
+            start = time.monotonic()
+            await drive(duration)
+            elapsed = time.monotonic() - start  # Includes draining requests still in flight at the end
+            return {**run.summary(elapsed), **sampler.stop()}
+
+
+def server_pids(url: str, pids: List[int]) -> List[int]:
+    """Explicit --pid values, or the pid /stats reports when the server runs on this machine"""
+    if pids:
+        return pids
+    try:
+        pid = httpx.get(f"{url.rstrip('/')}/stats", timeout=10).json()["process"]["pid"]
+    except (httpx.HTTPError, KeyError, ValueError):
+        return []
+    return [pid] if os.path.exists(f"/proc/{pid}") else []
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(report: dict) -> None:
+    header = f"{'endpoint':<16}{'req/s':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'errors':>8}{'cpu%':>7}{'rss MB':>8}"
+    print(header)
+    for endpoint, result in report["endpoints"].items():
+        latency = result["latency_ms"]
+        cells = [latency["p50"], latency["p90"], latency["p99"], latency["max"]]
+        print(f"{endpoint:<16}{result['throughput_rps']:>8.1f}"
+              + "".join(f"{cell:>9.1f}" if cell is not None else f"{'-':>9}" for cell in cells)
+              + f"{result['errors']:>8}"
+              + (f"{result['cpu_percent']:>7.0f}" if result["cpu_percent"] is not None else f"{'-':>7}")
+              + (f"{result['rss_mb']:>8.0f}" if result["rss_mb"] is not None else f"{'-':>8}"))
+    print("(latencies in ms)")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the SPEAR AI API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", action="append", choices=ENDPOINTS,
+                        help="Endpoint to load, repeatable; each is run in turn (default: /detect)")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=8, help="Closed loop: simultaneous users")
+    parser.add_argument("--rate", type=float, default=10.0, help="Open loop: requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds per endpoint")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Unmeasured seconds before each endpoint's run")
+    parser.add_argument("--unique", action="store_true", help="Make every request's content unique to bypass caches")
+    parser.add_argument("--corpus", type=Path, default=None, help="JSONL with 'content' and 'content_type' per line")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request in seconds")
+    parser.add_argument("--max-in-flight", type=int, default=1000, help="Open loop: outstanding requests before arrivals are dropped")
+    parser.add_argument("--pid", type=int, action="append", default=[],
+                        help="Server process to sample CPU/RSS of (children included); default: the pid /stats reports")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", type=Path, default=None, help="Write the report as JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="Compare against an earlier report")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args(argv)
+    
+    endpoints = args.endpoint or ["/detect"]
+    pids = server_pids(args.url, args.pid)
+    if not pids:
+        print("[!] Server process not found on this machine; CPU and RSS will not be reported")
+    generator = LoadGenerator(args.url, load_samples(args.corpus), args.unique, args.timeout,
+                              args.max_in_flight, args.seed)
+    
+    report = {
+        "meta": {
+            "url": args.url,
+            "mode": args.mode,
+            "concurrency": args.concurrency if args.mode == "closed" else None,
+            "rate": args.rate if args.mode == "open" else None,
+            "duration_s": args.duration,
+            "unique": args.unique,
+            "revision": git_revision(),
+            "started": time.strftime("%Y-%m-%d %H:%M:%S")
+        },
+        "endpoints": {}
+    }
+    for endpoint in endpoints:
+        print(f"[*] {endpoint}: {args.mode} loop for {args.duration:g}s")
+        report["endpoints"][endpoint] = asyncio.run(generator.run_endpoint(
+            endpoint, args.mode, args.concurrency, args.rate, args.duration, args.warmup, pids
+        ))
+    print_report(report)
+    
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"[OK] Report written to {args.output}")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        rows, regressions = compare_reports(baseline, report, args.threshold)
+        warn_if_incomparable(baseline, report)
+        print_comparison(rows, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
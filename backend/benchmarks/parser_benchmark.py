@@ -0,0 +1,166 @@
+"""
+Micro-benchmark: incremental analysis parser vs the original regex parser
+Runs both over a corpus of recorded LLM responses, checks that they produce
+identical ParsedAnalysis dicts, and reports the time per response.
+
+Usage (from backend/):
+    python -m benchmarks.parser_benchmark
+    python -m benchmarks.parser_benchmark --corpus my_responses.jsonl --iterations 500
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from models.analysis_parser import AnalysisParser, parse_analysis
+
+DEFAULT_CORPUS = Path(__file__).parent / "data" / "llm_responses.jsonl"
+STREAM_CHUNK_CHARS = 4  # Roughly one token per streamed chunk
+
+
+def legacy_parse(analysis_text: str) -> dict:
+    """The regex implementation LLMAnalyzer._parse_llm_analysis used before the incremental parser"""
+    # Extract risk level
+    risk_match = re.search(r'\*\*Risk Level\*\*:\s*(CRITICAL|HIGH|MEDIUM|LOW)', analysis_text, re.IGNORECASE)
+    risk_level = risk_match.group(1).upper() if risk_match else "MEDIUM"
+    
+    # Extract risk score
+    score_match = re.search(r'\*\*Risk Score\*\*:\s*(\d+)', analysis_text)
+    risk_score = int(score_match.group(1)) if score_match else 50
+    
+    # Extract anomaly score
+    anomaly_match = re.search(r'\*\*Anomaly Score\*\*:\s*(\d+)', analysis_text)
+    anomaly_score = int(anomaly_match.group(1)) if anomaly_match else 0
+    
+    # Extract risk category
+    category_match = re.search(r'\*\*Risk Category\*\*:\s*([^\n]+)', analysis_text)
+    category = category_match.group(1).strip() if category_match else "Unknown"
+    
+    # Extract anomalies (bullet points under Detected Anomalies)
+    anomalies = []
+    anomaly_section = re.search(r'\*\*Detected Anomalies\*\*:(.*?)(?=\*\*|##|$)', analysis_text, re.DOTALL)
+    if anomaly_section:
+        anomalies = [line.strip('• ').strip() for line in anomaly_section.group(1).split('\n')
+                     if line.strip().startswith('•')]
+    
+    # Extract risk factors
+    factors = []
+    factor_section = re.search(r'\*\*Risk Factors\*\*:(.*?)(?=##|$)', analysis_text, re.DOTALL)
+    if factor_section:
+        factors = [line.strip('• ').strip() for line in factor_section.group(1).split('\n')
+                   if line.strip().startswith('•')]
+    
+    # Extract strategies
+    strategies = []
+    strategy_section = re.search(r'### Security Strategies(.*?)(?=###|##|$)', analysis_text, re.DOTALL)
+    if strategy_section:
+        strategies = [line.strip('• ').strip() for line in strategy_section.group(1).split('\n')
+                      if line.strip().startswith('•')]
+    
+    # Extract incident response
+    incident_response = []
+    incident_section = re.search(r'### Incident Response(.*?)(?=###|##|$)', analysis_text, re.DOTALL)
+    if incident_section:
+        incident_response = [line.strip('• ').strip() for line in incident_section.group(1).split('\n')
+                             if line.strip().startswith('•')]
+    
+    # Extract patterns
+    patterns = []
+    pattern_match = re.search(r'\*\*Behavioral Patterns\*\*:\s*([^\n]+)', analysis_text)
+    if pattern_match:
+        patterns = [p.strip() for p in pattern_match.group(1).split(',')]
+    
+    return {
+        "riskAssessment": {
+            "level": risk_level,
+            "score": risk_score,
+            "factors": factors[:10],
+            "category": category
+        },
+        "anomalyDetection": {
+            "hasAnomalies": len(anomalies) > 0,
+            "anomalies": anomalies[:15],
+            "anomalyScore": anomaly_score,
+            "patterns": patterns[:8]
+        },
+        "mitigationRecommendations": {
+            "strategies": strategies[:10],
+            "incidentResponse": incident_response[:8],
+            "policyAlignment": ["NIST CSF", "ISO/IEC 27001", "CIS Controls"]
+        }
+    }
+
+
+def chunks(text: str, size: int = STREAM_CHUNK_CHARS) -> List[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def legacy_stream(pieces: List[str]) -> dict:
+    """Streaming with the regex parser: re-parse the accumulated text whenever a section completes"""
+    text = ""
+    for piece in pieces:
+        text += piece
+        if "\n## " in piece or piece.startswith("## "):
+            legacy_parse(text)
+    return legacy_parse(text)
+
+
+def incremental_stream(pieces: List[str]) -> dict:
+    """Streaming with the incremental parser: snapshot only when a section completes"""
+    parser = AnalysisParser()
+    for piece in pieces:
+        if parser.feed(piece):
+            parser.result()
+    parser.close()
+    return parser.result()
+
+
+def load_corpus(path: Path) -> List[str]:
+    with open(path, encoding="utf-8") as handle:
+        return [json.loads(line)["analysis"] for line in handle if line.strip()]
+
+
+def time_per_item(func: Callable, items: list, iterations: int) -> float:
+    """Mean microseconds per item"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for item in items:
+            func(item)
+    return (time.perf_counter() - start) / (iterations * len(items)) * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the LLM analysis parser")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="JSONL file with an 'analysis' field per line")
+    parser.add_argument("--iterations", type=int, default=200, help="Passes over the corpus per measurement")
+    args = parser.parse_args(argv)
+    
+    corpus = load_corpus(args.corpus)
+    streamed = [chunks(text) for text in corpus]
+    
+    mismatches = [i for i, text in enumerate(corpus)
+                  if not legacy_parse(text) == parse_analysis(text) == incremental_stream(streamed[i])]
+    if mismatches:
+        print(f"[!] Parsers disagree on corpus entries: {mismatches}")
+        return 1
+    print(f"[OK] Identical output on {len(corpus)} responses ({sum(map(len, corpus)) / len(corpus):.0f} chars avg)")
+    
+    rows = [
+        ("full text", time_per_item(legacy_parse, corpus, args.iterations),
+         time_per_item(parse_analysis, corpus, args.iterations)),
+        ("streamed", time_per_item(legacy_stream, streamed, args.iterations),
+         time_per_item(incremental_stream, streamed, args.iterations))
+    ]
+    
+    print(f"{'mode':<12}{'regex (us)':>14}{'incremental (us)':>20}{'speedup':>10}")
+    for mode, legacy_us, incremental_us in rows:
+        print(f"{mode:<12}{legacy_us:>14.1f}{incremental_us:>20.1f}{legacy_us / incremental_us:>9.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
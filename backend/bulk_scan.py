@@ -0,0 +1,582 @@
+"""
+Offline bulk scan
+Scores large JSONL/CSV archives and mailboxes (mbox, .eml files) with the
+BERT model without going through the HTTP API. Items are read as a stream and scored in chunks by a pool of
+worker processes; each worker tokenizes the next batch on its own threads
+while the current one runs through the model. Results are written as JSONL
+in input order, so memory stays bounded by the chunks in flight. Progress is
+checkpointed next to the output, so an interrupted scan can be resumed.
+
+Usage (from backend/):
+    python bulk_scan.py messages.jsonl -o results.jsonl --workers 4
+    python bulk_scan.py archive.csv -o results.jsonl --content-type email --resume
+    python bulk_scan.py inbox.mbox -o results.jsonl --llm-threshold suspicious
+    cat urls.jsonl | python bulk_scan.py - -o results.jsonl --llm-threshold malicious
+"""
+
+import argparse
+import asyncio
+import csv
+import gc
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from models.email_ingest import aggregate_verdict, iter_messages, parse_message
+from models.phishing_model import PhishingDetector, PredictionResult, get_threat_level
+from prefork import configure_worker, default_workers
+
+VALID_CONTENT_TYPES = ("url", "email", "sms")
+MAILBOX_SUFFIXES = (".mbox", ".mbx", ".eml")
+MESSAGE = "message"  # Content type of raw RFC 822 items, split into parts in the worker
+THREAT_ORDER = {"safe": 0, "suspicious": 1, "malicious": 2}
+CHUNK_SIZE = 256  # Items per task sent to a worker process
+BATCH_SIZE = 32  # Items per forward pass inside a worker
+TOKENIZER_THREADS = 2  # Tokenizer threads per worker process
+LLM_CONCURRENCY = 4  # LLM analyses in flight at once
+LLM_RETRIES = 5  # Times a rate-limited analysis is retried after its retry_after hint
+PROGRESS_INTERVAL = 5.0  # Seconds between progress lines
+
+# Set in each worker process by _init_worker (inherited from the parent when forked)
+_detector: Optional[PhishingDetector] = None
+_tokenize_pool: Optional[ThreadPoolExecutor] = None
+
+
+def load_detector() -> PhishingDetector:
+    detector = PhishingDetector(batching=False)
+    detector.load()
+    return detector
+
+
+def read_items(source: TextIO, fmt: str, content_field: str = "content", type_field: str = "content_type",
+               id_field: str = "id", default_type: Optional[str] = None) -> Iterator[tuple]:
+    """
+    Stream (id, content, content_type, error) items from JSONL or CSV.
+    Items that cannot be scored carry an error and are reported, not skipped,
+    so output lines stay aligned with input records.
+    """
+    if fmt == "csv":
+        csv.field_size_limit(2 ** 31 - 1)  # Archived emails easily exceed the 128 KB default
+        records = ((number, row, None) for number, row in enumerate(csv.DictReader(source), start=1))
+    else:
+        records = _jsonl_records(source)
+    
+    for number, record, error in records:
+        item_id = record.get(id_field, number) if record else number
+        if error is not None:
+            yield item_id, None, None, error
+            continue
+        content = str(record.get(content_field) or "").strip()
+        content_type = str(record.get(type_field) or default_type or "").lower()
+        if not content:
+            yield item_id, None, content_type, "Content cannot be empty"
+        elif content_type not in VALID_CONTENT_TYPES:
+            yield item_id, None, content_type, f"Invalid content type '{content_type}'. Must be one of {list(VALID_CONTENT_TYPES)}"
+        else:
+            yield item_id, content, content_type, None
+
+
+def read_messages(source: str) -> Iterator[tuple]:
+    """
+    Stream (id, raw message, "message", None) items from an mbox or .eml file,
+    a directory of .eml files, or - for an mbox on stdin.
+    Messages are ided by file name in a directory, by position otherwise.
+    """
+    path = Path(source)
+    if source != "-" and path.is_dir():
+        for message_path in sorted(path.glob("*.eml")):
+            yield message_path.name, message_path.read_bytes(), MESSAGE, None
+        return
+    
+    stream = sys.stdin.buffer if source == "-" else open(path, "rb")
+    try:
+        for number, raw in enumerate(iter_messages(stream), start=1):
+            yield number, raw, MESSAGE, None
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def _jsonl_records(source: TextIO) -> Iterator[tuple]:
+    for number, line in enumerate(source, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Invalid JSON: expected an object"
+            continue
+        yield number, record, None
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _init_worker(counter, workers: int, tokenizer_threads: int, pin: bool) -> None:
+    """Pin the worker, size its torch threads and load the model unless it was inherited by fork"""
+    global _detector, _tokenize_pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is handled by the parent, which stops the pool
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    configure_worker(index, workers, pin=pin)
+    if _detector is None:
+        _detector = load_detector()
+    _tokenize_pool = ThreadPoolExecutor(max_workers=max(1, tokenizer_threads), thread_name_prefix="spear-tokenize")
+
+
+def _start_encoding(batch: List[tuple]) -> list:
+    return [_tokenize_pool.submit(_detector.encode, content) if error is None else None
+            for _, content, _, error in batch]
+
+
+def _score_batch(batch: List[tuple], encodings: list) -> List[dict]:
+    """Score one batch, retrying item by item if the batch fails so one bad input does not fail its neighbours"""
+    outcomes: List[Optional[dict]] = [None] * len(batch)
+    sequences = {}
+    for position, ((_, _, _, error), encoding) in enumerate(zip(batch, encodings)):
+        if error is not None:
+            outcomes[position] = {"error": error}
+            continue
+        try:
+            sequences[position] = encoding.result()
+        except Exception as e:
+            outcomes[position] = {"error": f"Tokenization failed: {e}"}
+    
+    positions = list(sequences)
+    try:
+        predictions = _detector.score_encoded([sequences[position] for position in positions])
+    except Exception:
+        predictions = []
+        for position in positions:
+            try:
+                predictions.extend(_detector.score_encoded([sequences[position]]))
+            except Exception as e:
+                predictions.append(e)
+    
+    for position, prediction in zip(positions, predictions):
+        outcomes[position] = {"error": f"Prediction failed: {prediction}"} if isinstance(prediction, Exception) \
+            else asdict(prediction)
+    return outcomes
+
+
+def _expand_messages(items: List[tuple]) -> tuple:
+    """
+    Replace raw message items by the parts parse_message splits them into.
+    
+    Returns:
+        (flat items to score, per input item: None, the ParsedEmail, or an error string)
+    """
+    flat = []
+    messages = []
+    for item in items:
+        item_id, content, content_type, error = item
+        if content_type != MESSAGE or error is not None:
+            flat.append(item)
+            messages.append(None)
+            continue
+        try:
+            parsed = parse_message(content)
+        except Exception as e:
+            messages.append(f"Could not parse message: {e}")
+            continue
+        flat.extend((item_id, part.content, part.content_type, None) for part in parsed.parts)
+        messages.append(parsed)
+    return flat, messages
+
+
+def _message_outcome(parsed, outcomes: List[dict]) -> dict:
+    predictions = [Exception(outcome["error"]) if "error" in outcome else PredictionResult(**outcome)
+                   for outcome in outcomes]
+    return {
+        "message": {
+            **parsed.headers(),
+            "urls": parsed.urls,
+            "attachments": [{"filename": attachment.filename, "mimeType": attachment.mime_type, "size": attachment.size}
+                            for attachment in parsed.attachments],
+            "truncated": parsed.truncated
+        },
+        "parts": [{"kind": part.kind, "label": part.label, "content_type": part.content_type, **outcome}
+                  for part, outcome in zip(parsed.parts, outcomes)],
+        "verdict": aggregate_verdict(parsed.parts, predictions),
+        "summary": parsed.summary_text()
+    }
+
+
+def scan_chunk(items: List[tuple], batch_size: int) -> List[dict]:
+    """
+    Score a chunk of items in a worker process.
+    Raw messages are parsed here and their parts scored alongside the other
+    items. The next batch is tokenized on the tokenizer threads while the
+    current one runs through the model.
+    
+    Returns:
+        One prediction dict (or {"error": ...}) per item, in order; for
+        messages, a dict with the message, its scored parts and verdict
+    """
+    flat, messages = _expand_messages(items)
+    batches = list(chunked(flat, batch_size))
+    results = []
+    encodings = _start_encoding(batches[0]) if batches else []
+    for position, batch in enumerate(batches):
+        current = encodings
+        if position + 1 < len(batches):
+            encodings = _start_encoding(batches[position + 1])
+        results.extend(_score_batch(batch, current))
+    
+    outcomes = []
+    offset = 0
+    for message in messages:
+        if message is None:
+            outcomes.append(results[offset])
+            offset += 1
+        elif isinstance(message, str):
+            outcomes.append({"error": message})
+        else:
+            outcomes.append(_message_outcome(message, results[offset:offset + len(message.parts)]))
+            offset += len(message.parts)
+    return outcomes
+
+
+def _detection(outcome: dict, content_type: str) -> dict:
+    return {
+        "threatLevel": get_threat_level(outcome["is_phishing"], outcome["confidence"]),
+        "confidenceScore": round(outcome["confidence"], 2),
+        "rawLabel": outcome["raw_label"],
+        "rawScore": round(outcome["raw_score"], 4),
+        "contentType": content_type.upper(),
+        "windows": outcome["windows"]
+    }
+
+
+def _message_record(index: int, item_id, outcome: dict) -> dict:
+    """Output line for a message: its verdict, headers and the result of every part"""
+    parts = [
+        {"kind": part["kind"], "label": part["label"], "success": False, "error": part["error"]}
+        if "error" in part else
+        {"kind": part["kind"], "label": part["label"], "success": True,
+         "detection": _detection(part, part["content_type"])}
+        for part in outcome["parts"]
+    ]
+    verdict = outcome["verdict"]
+    record = {"index": index, "id": item_id, "success": verdict is not None}
+    if verdict is None:
+        record["error"] = "Message has no text or URLs to score"
+    else:
+        record["detection"] = {**verdict, "contentType": "EMAIL"}
+    record.update(outcome["message"])
+    record["parts"] = parts
+    return record
+
+
+def build_record(index: int, item: tuple, outcome: dict) -> dict:
+    """Output line for one item, shaped like a /detect/batch result (or an /ingest/email message)"""
+    item_id, _, content_type, _ = item
+    if "error" in outcome:
+        return {"index": index, "id": item_id, "success": False, "error": outcome["error"]}
+    if content_type == MESSAGE:
+        return _message_record(index, item_id, outcome)
+    return {
+        "index": index,
+        "id": item_id,
+        "success": True,
+        "detection": _detection(outcome, content_type)
+    }
+
+
+class Checkpoint:
+    """
+    Items written so far and the output size at that point, saved next to the
+    output after every chunk. Resuming truncates anything written after the
+    last checkpoint and skips the items already done.
+    """
+    
+    def __init__(self, output: Path):
+        self.path = output.with_name(output.name + ".checkpoint")
+    
+    def load(self) -> Optional[dict]:
+        try:
+            with open(self.path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+    
+    def save(self, source: str, items_done: int, output_bytes: int) -> None:
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with open(temporary, "w") as handle:
+            json.dump({"source": source, "items_done": items_done, "output_bytes": output_bytes,
+                       "updated": time.strftime("%Y-%m-%d %H:%M:%S")}, handle)
+        os.replace(temporary, self.path)
+    
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+class Progress:
+    """Throughput readout on stderr"""
+    
+    def __init__(self, already_done: int = 0, interval: float = PROGRESS_INTERVAL):
+        self.interval = interval
+        self.start = time.monotonic()
+        self.next_report = self.start + interval
+        self.already_done = already_done
+        self.done = 0
+        self.errors = 0
+        self.flagged = 0  # Suspicious or malicious
+        self.analyzed = 0  # Sent to the LLM
+    
+    def update(self, records: List[dict]) -> None:
+        for record in records:
+            self.done += 1
+            if not record["success"]:
+                self.errors += 1
+            elif record["detection"]["threatLevel"] != "safe":
+                self.flagged += 1
+            if "llm" in record:
+                self.analyzed += 1
+        if time.monotonic() >= self.next_report:
+            self.next_report = time.monotonic() + self.interval
+            print(f"[*] {self.line()}", file=sys.stderr, flush=True)
+    
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.start
+        rate = self.done / elapsed if elapsed else 0.0
+        total = self.already_done + self.done
+        return (f"{total:,} items ({rate:,.0f}/s), {self.flagged:,} flagged, {self.errors:,} errors, "
+                f"{self.analyzed:,} LLM analyses, {elapsed:.0f}s")
+
+
+class BulkScanner:
+    """Feeds chunks to the worker pool, adds LLM analyses and writes results in input order"""
+    
+    def __init__(self, workers: int, chunk_size: int = CHUNK_SIZE, batch_size: int = BATCH_SIZE,
+                 tokenizer_threads: int = TOKENIZER_THREADS, pin: bool = True,
+                 llm_threshold: Optional[str] = None, llm_concurrency: int = LLM_CONCURRENCY):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.tokenizer_threads = tokenizer_threads
+        self.pin = pin
+        self.llm_threshold = llm_threshold
+        self.llm_concurrency = llm_concurrency
+        self.max_in_flight = workers * 2  # Chunks queued or running; bounds memory and the reorder buffer
+        self._llm_slots = None
+    
+    def _pool(self) -> ProcessPoolExecutor:
+        # Forking shares the model loaded in this process copy-on-write, as the prefork server does
+        context = multiprocessing.get_context("fork" if hasattr(os, "fork") else "spawn")
+        counter = context.Value("i", 0)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=_init_worker,
+                                   initargs=(counter, self.workers, self.tokenizer_threads, self.pin))
+    
+    async def _process(self, pool: ProcessPoolExecutor, start_index: int, chunk: List[tuple]) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        outcomes = await loop.run_in_executor(pool, scan_chunk, chunk, self.batch_size)
+        records = [build_record(start_index + offset, item, outcome)
+                   for offset, (item, outcome) in enumerate(zip(chunk, outcomes))]
+        if self.llm_threshold is not None:
+            minimum = THREAT_ORDER[self.llm_threshold]
+            await asyncio.gather(*(
+                self._analyze(record, item, outcome) for record, item, outcome in zip(records, chunk, outcomes)
+                if record["success"] and THREAT_ORDER[record["detection"]["threatLevel"]] >= minimum
+            ))
+        return records
+    
+    async def _analyze(self, record: dict, item: tuple, outcome: dict) -> None:
+        """LLM analysis at bulk priority, waiting out rate limiting instead of dropping the item"""
+        from models import llm_analyzer
+        
+        _, content, content_type, _ = item
+        if content_type == MESSAGE:
+            content, content_type = outcome["summary"], "email"  # Headers and bodies of the whole message
+        detection = record["detection"]
+        async with self._llm_slots:
+            for retry in range(LLM_RETRIES + 1):
+                result = await llm_analyzer.analyze_async(
+                    content, content_type, detection["threatLevel"], detection["confidenceScore"], priority="bulk"
+                )
+                if result.get("success") or result.get("retry_after") is None or retry == LLM_RETRIES:
+                    break
+                await asyncio.sleep(result["retry_after"])
+        record["llm"] = {key: result.get(key) for key in ("success", "model", "error", "parsed", "analysis")}
+        record["llm"]["cached"] = result.get("cached", False)
+    
+    async def run(self, items: Iterable[tuple], output: TextIO, start_index: int = 0,
+                  on_chunk_written=None) -> Progress:
+        """
+        Scan every item, writing one JSON line per item in input order.
+        
+        Args:
+            items: (id, content, content_type, error) tuples from read_items or read_messages
+            output: Text stream the JSONL results are written to
+            start_index: Index of the first item (items already done when resuming)
+            on_chunk_written: Called with the number of items written so far after every chunk
+        """
+        self._llm_slots = asyncio.Semaphore(max(1, self.llm_concurrency))
+        progress = Progress(already_done=start_index)
+        pending = deque()
+        chunks = chunked(items, self.chunk_size)
+        next_index = start_index
+        written = start_index
+        exhausted = False
+        
+        pool = self._pool()
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    pending.append(asyncio.ensure_future(self._process(pool, next_index, chunk)))
+                    next_index += len(chunk)
+                if not pending:
+                    break
+                
+                records = await pending.popleft()
+                output.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+                output.flush()
+                written += len(records)
+                progress.update(records)
+                if on_chunk_written is not None:
+                    on_chunk_written(written)
+        except BaseException:
+            # Interrupted: drop queued chunks; the checkpoint covers everything written
+            for task in pending:
+                task.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+        return progress
+
+
+def detect_format(source: str) -> str:
+    if source != "-" and Path(source).is_dir():
+        return "mbox"
+    suffix = Path(source).suffix.lower()
+    if suffix in MAILBOX_SUFFIXES:
+        return "mbox"
+    return "csv" if suffix == ".csv" else "jsonl"
+
+
+def open_output(path: Optional[Path], resume_bytes: Optional[int]) -> TextIO:
+    if path is None:
+        return sys.stdout
+    if resume_bytes is None:
+        return open(path, "w", encoding="utf-8")
+    handle = open(path, "r+", encoding="utf-8")
+    handle.truncate(resume_bytes)  # Drop lines written after the last checkpoint
+    handle.seek(resume_bytes)
+    return handle
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Scan a JSONL/CSV archive or a mailbox with the phishing model")
+    parser.add_argument("input", help="JSONL, CSV, mbox or .eml file, directory of .eml files, or - for stdin")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="JSONL results (default: stdout)")
+    parser.add_argument("--format", choices=["jsonl", "csv", "mbox"], default=None,
+                        help="Input format (default: from the extension; mbox also reads .eml files)")
+    parser.add_argument("--content-field", default="content")
+    parser.add_argument("--type-field", default="content_type")
+    parser.add_argument("--id-field", default="id", help="Copied to the output (default: the input line number)")
+    parser.add_argument("--content-type", choices=VALID_CONTENT_TYPES, default=None,
+                        help="Content type of items without a type field")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (0 = one per two CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Items per worker task")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Items per forward pass")
+    parser.add_argument("--tokenizer-threads", type=int, default=TOKENIZER_THREADS, help="Tokenizer threads per worker")
+    parser.add_argument("--no-pin", action="store_true", help="Do not pin workers to CPUs")
+    parser.add_argument("--llm-threshold", choices=["suspicious", "malicious"], default=None,
+                        help="Also run the DeepSeek analysis on items at or above this threat level")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_CONCURRENCY)
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted scan from its checkpoint")
+    args = parser.parse_args(argv)
+    
+    if args.resume and args.output is None:
+        parser.error("--resume needs --output")
+    fmt = args.format or detect_format(args.input)
+    source_name = "stdin" if args.input == "-" else str(Path(args.input).resolve())
+    
+    checkpoint = Checkpoint(args.output) if args.output is not None else None
+    skip = 0
+    resume_bytes = None
+    if args.resume:
+        state = checkpoint.load()
+        if state is None:
+            print("[!] No checkpoint found, starting from the beginning", file=sys.stderr)
+        elif state["source"] != source_name:
+            print(f"[ERROR] Checkpoint belongs to {state['source']}, not {source_name}", file=sys.stderr)
+            return 1
+        else:
+            skip, resume_bytes = state["items_done"], state["output_bytes"]
+            print(f"[*] Resuming after {skip:,} items", file=sys.stderr)
+    
+    if args.llm_threshold is not None:
+        from models import llm_analyzer
+        if not llm_analyzer.is_available():
+            print("[!] OPENROUTER_API_KEY not set; LLM analysis disabled", file=sys.stderr)
+            args.llm_threshold = None
+    
+    global _detector
+    start = time.monotonic()
+    _detector = load_detector()
+    print(f"[OK] Model loaded in {time.monotonic() - start:.1f}s", file=sys.stderr)
+    gc.collect()
+    if hasattr(gc, "freeze"):
+        gc.freeze()  # Keep the loaded model's objects out of the workers' collections (copy-on-write)
+    
+    workers = args.workers or default_workers()
+    scanner = BulkScanner(workers, args.chunk_size, args.batch_size, args.tokenizer_threads, not args.no_pin,
+                          args.llm_threshold, args.llm_concurrency)
+    output = open_output(args.output, resume_bytes)
+    if fmt == "mbox":
+        source = None
+        items = itertools.islice(read_messages(args.input), skip, None)
+    else:
+        source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+        items = itertools.islice(read_items(source, fmt, args.content_field, args.type_field, args.id_field,
+                                            args.content_type), skip, None)
+    
+    def save_checkpoint(written: int) -> None:
+        if checkpoint is not None:
+            os.fsync(output.fileno())
+            checkpoint.save(source_name, written, output.tell())
+    
+    print(f"[*] Scanning with {workers} workers", file=sys.stderr)
+    try:
+        progress = asyncio.run(scanner.run(items, output, skip, save_checkpoint))
+    except KeyboardInterrupt:
+        print("\n[!] Interrupted; run again with --resume to continue", file=sys.stderr)
+        return 130
+    finally:
+        if source is not None and source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    
+    if checkpoint is not None:
+        checkpoint.clear()
+    print(f"[OK] {progress.line()}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Execution layer for blocking work
+Runs BERT inference and LLM calls off the asyncio event loop with bounded
+concurrency, and rejects work with a retry hint when the pools are full.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+from typing import AsyncIterator, Callable, Optional
+
+from models import metrics
+
+# Concurrency limits
+BERT_WORKERS = int(os.getenv("SPEAR_BERT_WORKERS", "2"))  # Threads running forward passes
+BERT_MAX_PENDING = int(os.getenv("SPEAR_BERT_MAX_PENDING", "64"))  # Running + queued BERT requests
+LLM_MAX_CONCURRENCY = int(os.getenv("SPEAR_LLM_MAX_CONCURRENCY", "8"))  # Simultaneous LLM calls
+LLM_MAX_PENDING = int(os.getenv("SPEAR_LLM_MAX_PENDING", "32"))  # Running + queued LLM calls
+RETRY_AFTER_SECONDS = int(os.getenv("SPEAR_RETRY_AFTER_SECONDS", "2"))
+
+
+class PoolSaturated(Exception):
+    """Raised when a lane has no room for more work"""
+    
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"{lane} capacity exhausted, retry in {retry_after}s")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Lane:
+    """
+    Bounded admission lane.
+    At most max_concurrency callers run at once and at most max_pending
+    callers are admitted (running or waiting); anyone beyond that is rejected.
+    """
+    
+    def __init__(self, name: str, max_concurrency: int, max_pending: int,
+                 on_wait: Optional[Callable[[float], None]] = None):
+        self.name = name
+        self.on_wait = on_wait  # Called with the seconds each caller queued for a slot
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max(self.max_concurrency, max_pending)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    @property
+    def queue_depth(self) -> int:
+        return self.pending - self.running
+    
+    def check_capacity(self) -> None:
+        """Raise PoolSaturated if the lane cannot admit another caller right now"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise PoolSaturated(self.name, RETRY_AFTER_SECONDS)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot for the duration of the block or raise PoolSaturated"""
+        self.check_capacity()
+        
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        self.pending += 1
+        queued_at = time.perf_counter()
+        try:
+            async with self._semaphore:
+                if self.on_wait is not None:
+                    self.on_wait(time.perf_counter() - queued_at)
+                self.running += 1
+                try:
+                    yield
+                finally:
+                    self.running -= 1
+                    self.completed += 1
+        finally:
+            self.pending -= 1
+    
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "running": self.running,
+            "queued": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+class StageTimings:
+    """Call counts and latencies of the detection pipeline stages"""
+    
+    def __init__(self, histogram: Optional[metrics.Histogram] = None):
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [count, total_ms, max_ms]
+        self.histogram = histogram  # Also observed per stage with the current request's labels
+    
+    @contextmanager
+    def measure(self, stage: str, latencies: Optional[dict] = None):
+        """Time the block as one call of `stage`, also storing milliseconds in `latencies` if given"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.record(stage, elapsed_ms)
+            if self.histogram is not None:
+                self.histogram.observe(elapsed_ms / 1000, stage=stage, **metrics.request_labels())
+            if latencies is not None:
+                latencies[stage] = round(elapsed_ms, 3)
+    
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] = max(entry[2], elapsed_ms)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                stage: {"count": count, "avg_ms": round(total / count, 3), "max_ms": round(peak, 3)}
+                for stage, (count, total, peak) in self._stages.items()
+            }
+
+
+class ExecutionLayer:
+    """
+    Routes blocking work away from the event loop.
+    BERT inference runs on a bounded thread pool (PyTorch releases the GIL
+    during forward passes) or joins the detector's micro-batch. Async LLM
+    calls are awaited under the LLM lane's limits; synchronous ones run on
+    their own pool so slow providers never starve BERT.
+    """
+    
+    def __init__(self, bert_workers: int = BERT_WORKERS, bert_max_pending: int = BERT_MAX_PENDING,
+                 llm_max_concurrency: int = LLM_MAX_CONCURRENCY, llm_max_pending: int = LLM_MAX_PENDING):
+        self.cpu_pool = ThreadPoolExecutor(max_workers=max(1, bert_workers), thread_name_prefix="spear-bert")
+        self.llm_pool = ThreadPoolExecutor(max_workers=max(1, llm_max_concurrency), thread_name_prefix="spear-llm")
+        # The BERT pool (or micro-batcher) bounds actual parallelism; the lane only bounds admission
+        self.bert = Lane("bert", bert_max_pending, bert_max_pending)
+        self.llm = Lane("llm", llm_max_concurrency, llm_max_pending, on_wait=self._record_llm_wait)
+    
+    @staticmethod
+    def _record_llm_wait(seconds: float) -> None:
+        metrics.LLM_PHASE_SECONDS.observe(seconds, model="any", phase="lane_wait", **metrics.request_labels())
+    
+    async def predict(self, detector, content: str):
+        """Run PhishingDetector.predict without blocking the event loop"""
+        async with self.bert.slot():
+            if detector.batcher is not None:
+                return await asyncio.wrap_future(detector.submit(content))
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.cpu_pool, detector.predict, content)
+    
+    async def run_cpu(self, func, *args, **kwargs):
+        """Run CPU-bound work on the BERT pool"""
+        async with self.bert.slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.cpu_pool, partial(func, *args, **kwargs))
+    
+    async def run_llm(self, func, *args, **kwargs):
+        """Run an LLM call: coroutines are awaited directly, blocking calls go to the LLM pool"""
+        async with self.llm.slot():
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args, **kwargs)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.llm_pool, partial(func, *args, **kwargs))
+    
+    def stream_llm(self, events: AsyncIterator) -> AsyncIterator:
+        """
+        Hold an LLM slot while a streaming call is consumed.
+        Capacity is checked immediately, so a full lane can still be
+        answered with 503 before the response starts.
+        """
+        self.llm.check_capacity()
+        return self._hold_llm_slot(events)
+    
+    async def _hold_llm_slot(self, events):
+        async with self.llm.slot():
+            async for event in events:
+                yield event
+    
+    def stats(self) -> dict:
+        return {
+            "bert": self.bert.stats(),
+            "llm": self.llm.stats()
+        }
+    
+    def shutdown(self) -> None:
+        self.cpu_pool.shutdown(wait=False, cancel_futures=True)
+        self.llm_pool.shutdown(wait=False, cancel_futures=True)
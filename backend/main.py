@@ -3,18 +3,44 @@ SPEAR AI Backend - Phishing Detection API
 Uses BERT model fine-tuned for phishing detection + LLM analysis
 """
 
-from fastapi import FastAPI, HTTPException
+import time
+IMPORT_STARTED = time.perf_counter()  # Start of the startup profile reported by /health
+
+from fastapi import FastAPI, File, HTTPException, Request, Response, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Match
+from dataclasses import asdict
 from pathlib import Path
-import time
+from typing import List, Optional
+import asyncio
+import itertools
+import json
 
 from dotenv import load_dotenv
 # Load environment variables from backend/.env
 ENV_PATH = Path(__file__).parent / ".env"
 load_dotenv(dotenv_path=ENV_PATH)
 
-from schemas import AnalysisRequest, AnalysisResponse, LLMAnalysis, DetectionResponse, LLMRequest
-from models import PhishingDetector, llm_analyzer
+from schemas import (
+    AnalysisRequest, AnalysisResponse, LLMAnalysis, DualLLMAnalysis, DetectionResponse, LLMRequest,
+    BatchDetectionRequest, BatchDetectionResponse, BatchDetectionResult, EmailAttachment, EmailIngestResponse,
+    EmailPartResult, IngestedEmail, MessageVerdict, JobProgress, JobStatus
+)
+from models import PhishingDetector, PredictionResult, llm_analyzer, metrics
+from models.phishing_model import WARMUP_ENABLED, get_threat_level
+from models.cache import VerdictCache
+from models.url_features import UrlFastPath
+from models.domain_index import DomainIndexStage
+from models.ngram_model import NgramCascade
+from models.llm_policy import LLMRoutingPolicy, templated_analysis
+from models.email_ingest import INGEST_MAX_MESSAGES, aggregate_verdict, iter_messages, parse_message
+from models.jobs import JOBS_ENABLED, Job, JobRetry, JobStore, JobWorkerPool
+from execution import ExecutionLayer, PoolSaturated, StageTimings
+from prefork import process_stats
+
+VALID_CONTENT_TYPES = ["url", "email", "sms"]
+MAX_BATCH_ITEMS = 1000  # Upper bound on items per /detect/batch request
 
 app = FastAPI(
     title="SPEAR AI Phishing Detection API",
@@ -31,14 +57,125 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class MetricsMiddleware:
+    """
+    Times every HTTP request and labels everything recorded while serving it
+    with the route template (e.g. "/detect"), so metrics deeper in the
+    pipeline can be broken down by endpoint.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        
+        endpoint = route_template(scope)
+        metrics.set_request_labels(endpoint)
+        status = {"code": 500}
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+        
+        start = time.perf_counter()
+        with metrics.REQUESTS_IN_FLIGHT.track(endpoint=endpoint):
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint,
+                                                method=scope["method"], status=str(status["code"]))
+
+
+def route_template(scope) -> str:
+    """Path template of the route serving the request ("unmatched" for 404s, to bound label cardinality)"""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+app.add_middleware(MetricsMiddleware)
+
 # Initialize the phishing detector
 detector = PhishingDetector()
 
+# Bounded pools keeping BERT and LLM work off the event loop
+execution = ExecutionLayer()
+
+# Content-addressed cache of BERT verdicts
+verdict_cache = VerdictCache(detector.model_id)
+
+# Memory-mapped allow/block domain lists, consulted before any model
+domain_index = DomainIndexStage()
+
+# Lexical scorer that decides obvious URLs without BERT
+url_fastpath = UrlFastPath()
+
+# Hashed n-gram first stage; only its uncertainty band reaches BERT
+cascade = NgramCascade()
+
+# Decides how many LLMs /analyze calls for a verdict
+llm_policy = LLMRoutingPolicy()
+
+# Durable queue of /jobs analyses, worked on by every server process
+job_store = JobStore() if JOBS_ENABLED else None
+job_workers = None
+
+# Per-stage latency statistics of the detection pipeline
+stage_timings = StageTimings(histogram=metrics.DETECTION_STAGE_SECONDS)
+
+# Startup phase -> milliseconds, reported by /health
+startup_timings = StageTimings()
+startup_phases = {"imports": round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)}
+
+
+def preload(warm_up: bool = WARMUP_ENABLED) -> None:
+    """
+    Load the BERT model, domain index and n-gram model, then run the BERT
+    warm-up pass. The prefork server calls this in its master with
+    warm_up=False before forking, so workers find everything loaded, share
+    the pages copy-on-write and only warm up themselves.
+    """
+    if not detector.is_loaded:
+        detector.load()
+        with startup_timings.measure("domain_index", startup_phases):
+            domain_index.load()
+        with startup_timings.measure("cascade", startup_phases):
+            cascade.load()
+    if warm_up:
+        detector.warm_up()
+
+
+def startup_profile() -> dict:
+    """Time spent in each startup phase, in the order they ran"""
+    phases = {"imports": startup_phases["imports"]}
+    phases.update({f"bert.{phase}": ms for phase, ms in detector.load_timings.items() if phase != "warm_up"})
+    phases.update({phase: ms for phase, ms in startup_phases.items() if phase != "imports"})
+    if "warm_up" in detector.load_timings:
+        phases["bert.warm_up"] = detector.load_timings["warm_up"]
+    return {
+        "ready": detector.is_loaded and (detector.is_warm or not WARMUP_ENABLED),
+        "model_source": detector.source,
+        "total_ms": round(sum(phases.values()), 1),
+        "phases_ms": phases
+    }
+
 
 @app.on_event("startup")
 async def startup_event():
     """Load the BERT model and check LLM on startup"""
-    detector.load()
+    preload()
+    
+    global job_workers
+    if job_store is not None:
+        job_workers = JobWorkerPool(job_store, process_job)
+        job_workers.start()
     
     # Check LLM status
     if llm_analyzer.is_available():
@@ -47,18 +184,194 @@ async def startup_event():
         print("[!] LLM Analyzer NOT configured - Add OPENROUTER_API_KEY to backend/.env")
 
 
-def get_threat_level(is_phishing: bool, confidence: float) -> str:
-    """Determine threat level based on model prediction"""
-    if is_phishing:
-        if confidence >= 80:
-            return "malicious"
-        else:
-            return "suspicious"
-    else:
-        if confidence >= 80:
-            return "safe"
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release worker pools and pooled LLM connections"""
+    if job_workers is not None:
+        await job_workers.stop()  # Unfinished jobs go back to the queue
+        job_store.close()
+    execution.shutdown()
+    verdict_cache.close()
+    await llm_analyzer.aclose()
+
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    """Apply backpressure when the inference or LLM pools are full"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Server busy: {exc.lane} queue is full"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+def build_detection_response(prediction: PredictionResult, content_type: str, processing_time: int,
+                             stage_latencies: Optional[dict] = None) -> DetectionResponse:
+    """Build the API response for a BERT prediction"""
+    labels = {**metrics.request_labels(), "content_type": content_type}  # Batches mix content types
+    metrics.DETECTIONS.inc(stage=prediction.stage, **labels)
+    return DetectionResponse(
+        threatLevel=get_threat_level(prediction.is_phishing, prediction.confidence),
+        confidenceScore=round(prediction.confidence, 2),
+        rawLabel=prediction.raw_label,
+        rawScore=round(prediction.raw_score, 4),
+        contentType=content_type.upper(),
+        timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+        processingTime=processing_time,
+        cached=prediction.cached,
+        decisionStage=prediction.stage,
+        stageLatencies=stage_latencies or {}
+    )
+
+
+def cache_prediction(cache_key: str, prediction: PredictionResult) -> None:
+    """Store a fresh BERT verdict in the verdict cache"""
+    verdict = asdict(prediction)
+    verdict.pop("cached")
+    verdict.pop("stage")
+    verdict_cache.set(cache_key, verdict)
+
+
+def cached_prediction(cache_key: str, verdict: Optional[dict] = None):
+    """
+    Look up a BERT verdict in the in-memory verdict cache, or wrap a verdict
+    already fetched from the shared store by shared_predictions
+    """
+    if verdict is None:
+        verdict = verdict_cache.get_memory(cache_key)
+    if verdict is None:
+        return None
+    return PredictionResult(**verdict, cached=True, stage="cache")
+
+
+async def shared_predictions(cache_keys: List[str]) -> list:
+    """
+    Look up in-memory misses in the shared verdict store. SQLite runs in the
+    BERT lane, where the miss would be scored anyway, never on the event loop.
+    
+    Returns:
+        PredictionResult or None per key
+    """
+    if not cache_keys or verdict_cache.shared is None or not verdict_cache.enabled:
+        return [None] * len(cache_keys)
+    verdicts = await execution.run_cpu(verdict_cache.get_shared_many, cache_keys)
+    return [cached_prediction(cache_key, verdict) for cache_key, verdict in zip(cache_keys, verdicts)]
+
+
+async def run_detection(content: str, content_type: str) -> tuple:
+    """
+    Classify content through the detection stages, cheapest first:
+    verdict cache, domain allow/block lists (the URL itself, or the links
+    in an email/SMS body), lexical URL fast path (URLs only), the n-gram
+    cascade stage (when enabled), then BERT.
+    
+    Returns:
+        (PredictionResult, milliseconds spent in each stage that ran)
+    """
+    latencies = {}
+    with stage_timings.measure("cache", latencies):
+        cache_key = verdict_cache.key(content, content_type)
+        prediction = cached_prediction(cache_key)
+        if prediction is None:
+            prediction = (await shared_predictions([cache_key]))[0]
+    if prediction is not None:
+        return prediction, latencies
+    
+    if domain_index.index is not None:
+        with stage_timings.measure("domainIndex", latencies):
+            prediction = domain_index.classify(content, content_type)
+        if prediction is not None:
+            return prediction, latencies
+    
+    if content_type == "url":
+        with stage_timings.measure("urlLexical", latencies):
+            prediction = url_fastpath.classify(content)
+        if prediction is not None:
+            return prediction, latencies
+    
+    first_stage = None
+    if cascade.model is not None:
+        with stage_timings.measure("ngram", latencies):
+            first_stage = cascade.screen(content)
+        if first_stage.prediction is not None:
+            return first_stage.prediction, latencies
+    
+    with stage_timings.measure("bert", latencies):
+        prediction = await execution.predict(detector, content)
+    if first_stage is not None:
+        cascade.record_bert(first_stage, prediction)
+    cache_prediction(cache_key, prediction)
+    return prediction, latencies
+
+
+async def detect_many(items: List[tuple]) -> list:
+    """
+    Classify (content, content_type) pairs through the same stages as
+    run_detection, scoring every BERT miss together in chunked batched
+    forward passes.
+    
+    Returns:
+        PredictionResult, or the Exception that failed it, per item in input order
+    """
+    predictions = [None] * len(items)
+    first_stages = {}
+    miss_indices = []
+    miss_contents = []
+    miss_keys = []
+    
+    cache_keys = [verdict_cache.key(content, content_type) for content, content_type in items]
+    cached = [cached_prediction(cache_key) for cache_key in cache_keys]
+    memory_misses = [index for index, prediction in enumerate(cached) if prediction is None]
+    shared = await shared_predictions([cache_keys[index] for index in memory_misses])
+    for index, prediction in zip(memory_misses, shared):
+        cached[index] = prediction
+    
+    for index, (content, content_type) in enumerate(items):
+        cache_key = cache_keys[index]
+        prediction = cached[index]
+        if prediction is None:
+            prediction = domain_index.classify(content, content_type)
+        if prediction is None and content_type == "url":
+            prediction = url_fastpath.classify(content)
+        if prediction is None and cascade.model is not None:
+            first_stages[index] = cascade.screen(content)
+            prediction = first_stages[index].prediction
+        if prediction is not None:
+            predictions[index] = prediction
         else:
-            return "suspicious"
+            miss_indices.append(index)
+            miss_contents.append(content)
+            miss_keys.append(cache_key)
+    
+    # Run BERT model classification in chunked batches for cache misses
+    if miss_contents:
+        fresh = await execution.run_cpu(detector.predict_many, miss_contents)
+        for index, cache_key, prediction in zip(miss_indices, miss_keys, fresh):
+            predictions[index] = prediction
+            if not isinstance(prediction, Exception):
+                if index in first_stages:
+                    cascade.record_bert(first_stages[index], prediction)
+                cache_prediction(cache_key, prediction)
+    return predictions
+
+
+def build_llm_analysis(result: dict) -> LLMAnalysis:
+    """Build the API response for an LLM analysis result"""
+    metrics.record_llm_result(result)
+    return LLMAnalysis(
+        success=result["success"],
+        analysis=result["analysis"],
+        model=result.get("model"),
+        error=result.get("error"),
+        parsed=result.get("parsed"),
+        cached=result.get("cached", False),
+        coalesced=result.get("coalesced", False),
+        skipped=result.get("skipped", False),
+        waitMs=result.get("wait_ms"),
+        attempts=result.get("attempts"),
+        hedged=result.get("hedged", False),
+        retryAfter=result.get("retry_after")
+    )
 
 
 @app.post("/detect", response_model=DetectionResponse)
@@ -74,32 +387,170 @@ async def detect_content(request: AnalysisRequest):
     
     content = request.content.strip()
     content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
     
     if not content:
         raise HTTPException(status_code=400, detail="Content cannot be empty")
     
-    if content_type not in ["url", "email", "sms"]:
+    if content_type not in VALID_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Invalid content type")
     
     # Run BERT model classification
     try:
-        prediction = detector.predict(content)
+        prediction, stage_latencies = await run_detection(content, content_type)
+    except PoolSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
     
-    # Determine threat level from model output
-    threat_level = get_threat_level(prediction.is_phishing, prediction.confidence)
-    
     # Calculate processing time
     processing_time = int((time.time() - start_time) * 1000)
     
-    return DetectionResponse(
-        threatLevel=threat_level,
-        confidenceScore=round(prediction.confidence, 2),
-        rawLabel=prediction.raw_label,
-        rawScore=round(prediction.raw_score, 4),
-        contentType=content_type.upper(),
-        timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+    return build_detection_response(prediction, content_type, processing_time, stage_latencies)
+
+
+@app.post("/detect/batch", response_model=BatchDetectionResponse)
+async def detect_batch(request: BatchDetectionRequest):
+    """
+    Bulk BERT-based threat detection.
+    Classifies all items in chunked batched forward passes and returns one
+    result per item in input order. Invalid items are reported inline.
+    """
+    if not detector.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (max {MAX_BATCH_ITEMS})")
+    
+    start_time = time.time()
+    
+    results = [None] * len(request.items)
+    valid_indices = []
+    valid_items = []
+    
+    for index, item in enumerate(request.items):
+        content = item.content.strip()
+        content_type = item.content_type.lower()
+        
+        if not content:
+            results[index] = BatchDetectionResult(index=index, success=False, error="Content cannot be empty")
+        elif content_type not in VALID_CONTENT_TYPES:
+            results[index] = BatchDetectionResult(index=index, success=False, error="Invalid content type")
+        else:
+            valid_indices.append(index)
+            valid_items.append((content, content_type))
+    
+    try:
+        predictions = await detect_many(valid_items)
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+    
+    processing_time = int((time.time() - start_time) * 1000)
+    
+    for index, prediction in zip(valid_indices, predictions):
+        if isinstance(prediction, Exception):
+            results[index] = BatchDetectionResult(
+                index=index, success=False, error=f"Model inference error: {str(prediction)}"
+            )
+        else:
+            results[index] = BatchDetectionResult(
+                index=index,
+                success=True,
+                detection=build_detection_response(prediction, request.items[index].content_type.lower(), processing_time)
+            )
+    
+    succeeded = sum(1 for result in results if result.success)
+    
+    return BatchDetectionResponse(
+        results=results,
+        total=len(results),
+        succeeded=succeeded,
+        failed=len(results) - succeeded,
+        processingTime=processing_time
+    )
+
+
+def parse_upload(stream) -> list:
+    """Parse every message of an uploaded .eml or mbox file (ParsedEmail, or the Exception per message)"""
+    raw_messages = list(itertools.islice(iter_messages(stream), INGEST_MAX_MESSAGES + 1))
+    if len(raw_messages) > INGEST_MAX_MESSAGES:
+        raise ValueError(f"Too many messages (max {INGEST_MAX_MESSAGES}); use bulk_scan.py for whole mailboxes")
+    messages = []
+    for raw in raw_messages:
+        try:
+            messages.append(parse_message(raw))
+        except Exception as e:
+            messages.append(e)
+    return messages
+
+
+@app.post("/ingest/email", response_model=EmailIngestResponse)
+async def ingest_email(file: UploadFile = File(...)):
+    """
+    Score a raw .eml message or an mbox file.
+    Each message is split into its bodies (HTML converted to text), text
+    attachments and URLs; the parts of all messages are classified in one
+    batch and every message gets the verdict of its most phishing-like part.
+    """
+    if not detector.is_loaded:
+        raise HTTPException(status_code=503, detail="Model not loaded yet")
+    metrics.set_content_type("email")
+    
+    start_time = time.time()
+    try:
+        messages = await execution.run_cpu(parse_upload, file.file)
+    except PoolSaturated:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    items = [(part.content, part.content_type) for message in messages if not isinstance(message, Exception)
+             for part in message.parts]
+    try:
+        predictions = await detect_many(items)
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
+    
+    processing_time = int((time.time() - start_time) * 1000)
+    
+    results = []
+    offset = 0
+    for index, message in enumerate(messages):
+        if isinstance(message, Exception):
+            results.append(IngestedEmail(index=index, success=False, error=f"Could not parse message: {message}"))
+            continue
+        
+        message_predictions = predictions[offset:offset + len(message.parts)]
+        offset += len(message.parts)
+        parts = [
+            EmailPartResult(kind=part.kind, label=part.label, success=False, error=f"Model inference error: {prediction}")
+            if isinstance(prediction, Exception) else
+            EmailPartResult(kind=part.kind, label=part.label, success=True,
+                            detection=build_detection_response(prediction, part.content_type, processing_time))
+            for part, prediction in zip(message.parts, message_predictions)
+        ]
+        verdict = aggregate_verdict(message.parts, message_predictions)
+        results.append(IngestedEmail(
+            index=index,
+            success=verdict is not None,
+            headers=message.headers(),
+            verdict=MessageVerdict(**verdict) if verdict is not None else None,
+            parts=parts,
+            urls=message.urls,
+            attachments=[EmailAttachment(filename=attachment.filename, mimeType=attachment.mime_type,
+                                         size=attachment.size) for attachment in message.attachments],
+            truncated=message.truncated,
+            error=None if verdict is not None else "Message has no text or URLs to score"
+        ))
+    
+    return EmailIngestResponse(
+        messages=results,
+        total=len(results),
+        phishing=sum(1 for result in results if result.verdict is not None and result.verdict.isPhishing),
         processingTime=processing_time
     )
 
@@ -113,24 +564,68 @@ async def analyze_with_llm(request: LLMRequest):
     """
     content = request.content.strip()
     content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
     
     if not content:
         raise HTTPException(status_code=400, detail="Content cannot be empty")
     
     # Run LLM analysis
-    llm_result = llm_analyzer.analyze(
+    llm_result = await execution.run_llm(
+        llm_analyzer.analyze_async,
         content=content,
         content_type=content_type,
         bert_threat_level=request.threat_level,
-        bert_confidence=request.confidence
+        bert_confidence=request.confidence,
+        use_cache=not request.bypass_cache,
+        priority=request.priority
     )
     
-    return LLMAnalysis(
-        success=llm_result["success"],
-        analysis=llm_result["analysis"],
-        model=llm_result.get("model"),
-        error=llm_result.get("error"),
-        parsed=llm_result.get("parsed")
+    return build_llm_analysis(llm_result)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/analyze-llm/stream")
+async def analyze_with_llm_stream(request: LLMRequest):
+    """
+    Streaming variant of /analyze-llm (Server-Sent Events).
+    Sends `start`, then `token` events as DeepSeek generates text, a `section`
+    event with the parsed fields as each structured section completes, and a
+    final `done` event carrying the same payload /analyze-llm returns.
+    """
+    content = request.content.strip()
+    content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
+    
+    if not content:
+        raise HTTPException(status_code=400, detail="Content cannot be empty")
+    
+    # Rejected with 503 here, before any bytes are sent, when the LLM lane is full
+    events = execution.stream_llm(llm_analyzer.analyze_stream(
+        content=content,
+        content_type=content_type,
+        bert_threat_level=request.threat_level,
+        bert_confidence=request.confidence,
+        use_cache=not request.bypass_cache,
+        priority=request.priority
+    ))
+    
+    async def event_stream():
+        try:
+            async for event, data in events:
+                if event == "done":
+                    data = build_llm_analysis(data).model_dump()
+                yield format_sse(event, data)
+        except PoolSaturated as e:
+            yield format_sse("error", {"detail": "Server busy", "retryAfter": e.retry_after})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
@@ -142,24 +637,58 @@ async def analyze_with_gemini(request: LLMRequest):
     """
     content = request.content.strip()
     content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
     
     if not content:
         raise HTTPException(status_code=400, detail="Content cannot be empty")
     
     # Run Gemini validation
-    gemini_result = llm_analyzer.analyze_with_gemini(
+    gemini_result = await execution.run_llm(
+        llm_analyzer.analyze_with_gemini_async,
         content=content,
         content_type=content_type,
         bert_threat_level=request.threat_level,
-        bert_confidence=request.confidence
+        bert_confidence=request.confidence,
+        use_cache=not request.bypass_cache,
+        priority=request.priority
     )
     
-    return LLMAnalysis(
-        success=gemini_result["success"],
-        analysis=gemini_result["analysis"],
-        model=gemini_result.get("model"),
-        error=gemini_result.get("error"),
-        parsed=gemini_result.get("parsed")
+    return build_llm_analysis(gemini_result)
+
+
+@app.post("/analyze-dual", response_model=DualLLMAnalysis)
+async def analyze_dual(request: LLMRequest):
+    """
+    DeepSeek and Gemini analysis run concurrently.
+    Latency is the slower of the two models; results that miss the
+    deadline are reported as timed out and the consensus uses the rest.
+    """
+    start_time = time.time()
+    
+    content = request.content.strip()
+    content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
+    
+    if not content:
+        raise HTTPException(status_code=400, detail="Content cannot be empty")
+    
+    dual_result = await execution.run_llm(
+        llm_analyzer.analyze_dual_async,
+        content=content,
+        content_type=content_type,
+        bert_threat_level=request.threat_level,
+        bert_confidence=request.confidence,
+        use_cache=not request.bypass_cache,
+        priority=request.priority
+    )
+    
+    processing_time = int((time.time() - start_time) * 1000)
+    
+    return DualLLMAnalysis(
+        primary=build_llm_analysis(dual_result["primary"]),
+        secondary=build_llm_analysis(dual_result["secondary"]),
+        consensus=dual_result["consensus"],
+        processingTime=processing_time
     )
 
 
@@ -167,7 +696,8 @@ async def analyze_with_gemini(request: LLMRequest):
 async def analyze_content(request: AnalysisRequest):
     """
     Full analysis - BERT detection + LLM analysis combined.
-    For backwards compatibility.
+    The routing policy decides whether the verdict gets a templated
+    analysis, DeepSeek, or DeepSeek + Gemini.
     """
     if not detector.is_loaded:
         raise HTTPException(status_code=503, detail="Model not loaded yet")
@@ -176,29 +706,52 @@ async def analyze_content(request: AnalysisRequest):
     
     content = request.content.strip()
     content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
     
     if not content:
         raise HTTPException(status_code=400, detail="Content cannot be empty")
     
-    if content_type not in ["url", "email", "sms"]:
+    if content_type not in VALID_CONTENT_TYPES:
         raise HTTPException(status_code=400, detail="Invalid content type")
     
     # Step 1: Run BERT model classification
     try:
-        prediction = detector.predict(content)
+        prediction, stage_latencies = await run_detection(content, content_type)
+    except PoolSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Model inference error: {str(e)}")
     
     # Determine threat level from model output
     threat_level = get_threat_level(prediction.is_phishing, prediction.confidence)
     
-    # Step 2: Run LLM analysis (cybersecurity expert analysis)
-    llm_result = llm_analyzer.analyze(
-        content=content,
-        content_type=content_type,
-        bert_threat_level=threat_level,
-        bert_confidence=prediction.confidence
-    )
+    # Step 2: Run LLM analysis (cybersecurity expert analysis) as the routing policy decides
+    route = llm_policy.route(threat_level, prediction.confidence, content_type, execution.llm.queue_depth)
+    secondary_result = None
+    consensus = None
+    if route.llm_calls == 0:
+        llm_result = templated_analysis(
+            content_type, threat_level, prediction.confidence, prediction.stage, route.reason
+        )
+    elif route.llm_calls == 1:
+        llm_result = await execution.run_llm(
+            llm_analyzer.analyze_async,
+            content=content,
+            content_type=content_type,
+            bert_threat_level=threat_level,
+            bert_confidence=prediction.confidence
+        )
+    else:
+        dual_result = await execution.run_llm(
+            llm_analyzer.analyze_dual_async,
+            content=content,
+            content_type=content_type,
+            bert_threat_level=threat_level,
+            bert_confidence=prediction.confidence
+        )
+        llm_result = dual_result["primary"]
+        secondary_result = build_llm_analysis(dual_result["secondary"])
+        consensus = dual_result["consensus"]
     
     # Calculate processing time
     processing_time = int((time.time() - start_time) * 1000)
@@ -208,19 +761,303 @@ async def analyze_content(request: AnalysisRequest):
         confidenceScore=round(prediction.confidence, 2),
         rawLabel=prediction.raw_label,
         rawScore=round(prediction.raw_score, 4),
-        llmAnalysis=LLMAnalysis(
-            success=llm_result["success"],
-            analysis=llm_result["analysis"],
-            model=llm_result.get("model"),
-            error=llm_result.get("error"),
-            parsed=llm_result.get("parsed")
-        ),
+        llmAnalysis=build_llm_analysis(llm_result),
+        secondaryLlmAnalysis=secondary_result,
+        consensus=consensus,
+        llmCalls=route.llm_calls,
+        llmRoute=route.reason,
         contentType=content_type.upper(),
         timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
-        processingTime=processing_time
+        processingTime=processing_time,
+        cached=prediction.cached,
+        decisionStage=prediction.stage,
+        stageLatencies=stage_latencies
     )
 
 
+async def process_job(job: Job) -> None:
+    """
+    Run a /jobs analysis the way /analyze does, saving each step as it
+    completes: the BERT detection, then the LLM analyses the routing policy
+    chose (both LLMs concurrently). Steps saved by an interrupted attempt
+    are not run again.
+    """
+    metrics.set_request_labels("/jobs", job.content_type)
+    content = job.content
+    content_type = job.content_type
+    progress = job.progress
+    
+    if "detection" not in progress:
+        start_time = time.time()
+        try:
+            prediction, stage_latencies = await run_detection(content, content_type)
+        except PoolSaturated as e:
+            raise JobRetry(e.retry_after)
+        detection = build_detection_response(prediction, content_type, int((time.time() - start_time) * 1000),
+                                             stage_latencies)
+        route = llm_policy.route(detection.threatLevel, prediction.confidence, content_type, execution.llm.queue_depth)
+        await job_store.save_progress_async(job, detection=detection.model_dump(), confidence=prediction.confidence,
+                                            llm_calls=route.llm_calls, llm_route=route.reason)
+    
+    detection = progress["detection"]
+    threat_level = detection["threatLevel"]
+    if progress["llm_calls"] == 0:
+        if "primary" not in progress:
+            llm_result = templated_analysis(content_type, threat_level, progress["confidence"],
+                                            detection["decisionStage"], progress["llm_route"])
+            await job_store.save_progress_async(job, primary=build_llm_analysis(llm_result).model_dump())
+    else:
+        steps = {"primary": llm_analyzer.analyze_async}
+        if progress["llm_calls"] == 2:
+            steps["secondary"] = llm_analyzer.analyze_secondary_async
+        
+        async def run_step(name, analyze):
+            llm_result = await execution.run_llm(
+                analyze,
+                content=content,
+                content_type=content_type,
+                bert_threat_level=threat_level,
+                bert_confidence=progress["confidence"]
+            )
+            await job_store.save_progress_async(job, **{name: build_llm_analysis(llm_result).model_dump()})
+        
+        outcomes = await asyncio.gather(
+            *(run_step(name, analyze) for name, analyze in steps.items() if name not in progress),
+            return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, PoolSaturated):
+                raise JobRetry(outcome.retry_after)
+            if isinstance(outcome, BaseException):
+                raise outcome
+        if "secondary" in steps and "consensus" not in progress:
+            consensus = llm_analyzer.generate_consensus(progress["primary"], progress["secondary"])
+            await job_store.save_progress_async(job, consensus=consensus)
+    
+    result = AnalysisResponse(
+        threatLevel=threat_level,
+        confidenceScore=detection["confidenceScore"],
+        rawLabel=detection["rawLabel"],
+        rawScore=detection["rawScore"],
+        llmAnalysis=progress["primary"],
+        secondaryLlmAnalysis=progress.get("secondary"),
+        consensus=progress.get("consensus"),
+        llmCalls=progress["llm_calls"],
+        llmRoute=progress["llm_route"],
+        contentType=detection["contentType"],
+        timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+        processingTime=int((time.time() - job.created_at) * 1000),  # Queue wait included
+        cached=detection["cached"],
+        decisionStage=detection["decisionStage"],
+        stageLatencies=detection["stageLatencies"]
+    )
+    await job_store.save_progress_async(job, result=result.model_dump())
+
+
+def build_job_status(job: Job, reused: bool = False) -> JobStatus:
+    """Build the API response for a job from the steps it has completed"""
+    progress = job.progress
+    llm_calls = progress.get("llm_calls")
+    return JobStatus(
+        jobId=job.id,
+        status=job.status,
+        progress=JobProgress(
+            bert="detection" in progress,
+            primaryLlm="primary" in progress,
+            secondaryLlm="secondary" in progress if llm_calls == 2 else None
+        ),
+        detection=progress.get("detection"),
+        llmCalls=llm_calls,
+        llmRoute=progress.get("llm_route"),
+        llmAnalysis=progress.get("primary"),
+        secondaryLlmAnalysis=progress.get("secondary"),
+        consensus=progress.get("consensus"),
+        result=progress.get("result") if job.status == "done" else None,
+        error=job.error,
+        attempts=job.attempts,
+        reused=reused,
+        createdAt=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job.created_at)),
+        updatedAt=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(job.updated_at))
+    )
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+async def submit_job(request: AnalysisRequest, response: Response):
+    """
+    Asynchronous /analyze: queue the content and return a job ID at once.
+    Poll GET /jobs/{id} for the BERT verdict and LLM analyses as they
+    complete. Identical content submitted within the dedup window returns
+    the existing job.
+    """
+    if job_store is None:
+        raise HTTPException(status_code=404, detail="Jobs are disabled (SPEAR_JOBS_ENABLED)")
+    
+    content = request.content.strip()
+    content_type = request.content_type.lower()
+    metrics.set_content_type(content_type)
+    
+    if not content:
+        raise HTTPException(status_code=400, detail="Content cannot be empty")
+    
+    if content_type not in VALID_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid content type")
+    
+    job, reused = await job_store.submit_async(content, content_type)
+    if not reused and job_workers is not None:
+        job_workers.notify()
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return build_job_status(job, reused)
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """Progress and results of an analysis job"""
+    if job_store is None:
+        raise HTTPException(status_code=404, detail="Jobs are disabled (SPEAR_JOBS_ENABLED)")
+    job = await job_store.get_async(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return build_job_status(job)
+
+
+class AnalysisSession:
+    """
+    One /ws/analyze connection. Each submitted content is analyzed by a task
+    that sends the BERT verdict, then streams DeepSeek and Gemini side by
+    side. Submitting new content, or a cancel message, cancels the task in
+    flight; messages carry the requestId of the analysis they belong to.
+    """
+    
+    LLM_STREAMS = {
+        "primary": llm_analyzer.analyze_stream,
+        "secondary": llm_analyzer.analyze_with_gemini_stream
+    }
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.task: Optional[asyncio.Task] = None
+        self.request_id = None
+        self.submitted = 0
+        self._send_lock = asyncio.Lock()  # The two LLM streams send concurrently
+    
+    async def send(self, message_type: str, **fields) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json({"type": message_type, "requestId": self.request_id, **fields})
+    
+    async def handle(self, message: dict) -> None:
+        """Start or cancel an analysis for one client message"""
+        message_type = message.get("type", "analyze")
+        if message_type == "cancel":
+            await self.cancel()
+            return
+        if message_type != "analyze":
+            await self.send("error", detail=f"Unknown message type '{message_type}'")
+            return
+        
+        await self.cancel()
+        self.submitted += 1
+        self.request_id = message.get("requestId", self.submitted)
+        
+        content = str(message.get("content") or "").strip()
+        content_type = str(message.get("content_type") or "").lower()
+        models = message.get("models", list(self.LLM_STREAMS))
+        if not content:
+            await self.send("error", detail="Content cannot be empty")
+        elif content_type not in VALID_CONTENT_TYPES:
+            await self.send("error", detail="Invalid content type")
+        elif not isinstance(models, list) or any(model not in self.LLM_STREAMS for model in models):
+            await self.send("error", detail=f"models must be a list drawn from {list(self.LLM_STREAMS)}")
+        elif not detector.is_loaded:
+            await self.send("error", detail="Model not loaded yet")
+        else:
+            self.task = asyncio.ensure_future(self.analyze(content, content_type, models))
+    
+    async def cancel(self, notify: bool = True) -> None:
+        """Stop the analysis in flight, if any"""
+        if self.task is None or self.task.done():
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        if notify:
+            await self.send("cancelled")
+    
+    async def analyze(self, content: str, content_type: str, models: List[str]) -> None:
+        metrics.set_request_labels("/ws/analyze", content_type)
+        start_time = time.time()
+        try:
+            prediction, stage_latencies = await run_detection(content, content_type)
+        except PoolSaturated as e:
+            await self.send("error", detail=f"Server busy: {e.lane} queue is full", retryAfter=e.retry_after)
+            return
+        except Exception as e:
+            await self.send("error", detail=f"Model inference error: {str(e)}")
+            return
+        
+        processing_time = int((time.time() - start_time) * 1000)
+        detection = build_detection_response(prediction, content_type, processing_time, stage_latencies)
+        await self.send("detection", data=detection.model_dump())
+        
+        await asyncio.gather(*(
+            self.stream(model, content, content_type, detection.threatLevel, prediction.confidence) for model in models
+        ))
+        await self.send("complete", processingTime=int((time.time() - start_time) * 1000))
+    
+    async def stream(self, model: str, content: str, content_type: str, threat_level: str,
+                     confidence: float) -> None:
+        """Forward one LLM's start/token/section/done events, as /analyze-llm/stream sends them"""
+        try:
+            events = execution.stream_llm(self.LLM_STREAMS[model](
+                content=content,
+                content_type=content_type,
+                bert_threat_level=threat_level,
+                bert_confidence=confidence
+            ))
+        except PoolSaturated as e:
+            await self.send("llm", model=model, event="error", data={"detail": "Server busy", "retryAfter": e.retry_after})
+            return
+        
+        try:
+            async for event, data in events:
+                if event == "done":
+                    data = build_llm_analysis(data).model_dump()
+                await self.send("llm", model=model, event=event, data=data)
+        except PoolSaturated as e:
+            await self.send("llm", model=model, event="error", data={"detail": "Server busy", "retryAfter": e.retry_after})
+        finally:
+            await events.aclose()  # Releases the LLM slot right away when cancelled
+
+
+@app.websocket("/ws/analyze")
+async def analyze_websocket(websocket: WebSocket):
+    """
+    BERT verdict and LLM analyses over one connection.
+    Send {"type": "analyze", "content", "content_type"} (optionally
+    "requestId" and "models", default ["primary", "secondary"]); the server
+    replies with a `detection` message carrying the /detect payload, then
+    `llm` messages for each model (event start, token, section or done, as
+    on /analyze-llm/stream) and finally `complete`. New content, or
+    {"type": "cancel"}, cancels the analysis in flight (`cancelled`).
+    """
+    await websocket.accept()
+    session = AnalysisSession(websocket)
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+            except ValueError:
+                await session.send("error", detail="Messages must be JSON objects")
+                continue
+            if not isinstance(message, dict):
+                await session.send("error", detail="Messages must be JSON objects")
+                continue
+            await session.handle(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await session.cancel(notify=False)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -228,10 +1065,76 @@ async def health_check():
         "status": "healthy",
         "bert_model_loaded": detector.is_loaded,
         "llm_configured": llm_analyzer.is_available(),
-        "gpu_available": detector.is_gpu_available()
+        "gpu_available": detector.is_gpu_available(),
+        "startup": startup_profile()
     }
 
 
+@app.get("/stats")
+async def stats():
+    """Runtime statistics for the inference pipeline"""
+    stages = stage_timings.stats()
+    return {
+        "process": process_stats(),
+        "batching": detector.batch_stats(),
+        "execution": execution.stats(),
+        "verdict_cache": await verdict_cache.stats_async(),
+        "domain_index": domain_index.stats(),
+        "url_fastpath": url_fastpath.stats(),
+        "cascade": cascade.stats(
+            bert_avg_ms=stages.get("bert", {}).get("avg_ms"),
+            first_stage_avg_ms=stages.get("ngram", {}).get("avg_ms")
+        ),
+        "stages": stages,
+        "llm_policy": llm_policy.stats(),
+        "llm_calls": llm_analyzer.call_stats(),
+        "llm_quota": llm_analyzer.scheduler.stats(),
+        "llm_cache": await llm_analyzer.cache_stats_async(),
+        "jobs": {**(await job_store.stats_async()), **job_workers.stats()} if job_workers is not None else None,
+        "coalescing": {
+            "bert": detector.coalescing_stats(),
+            "llm": llm_analyzer.flights.stats()
+        }
+    }
+
+
+def collect_component_metrics() -> None:
+    """Copy cache, lane and coalescing counters into their gauges before a scrape"""
+    caches = []
+    if llm_analyzer.cache is not None:
+        caches += [("llm", "memory", llm_analyzer.cache.memory), ("llm", "shared", llm_analyzer.cache.store)]
+    if verdict_cache.enabled:
+        caches += [("verdict", "memory", verdict_cache.memory), ("verdict", "shared", verdict_cache.shared)]
+    for cache, tier, store in caches:
+        if store is None:
+            continue
+        lookups = store.hits + store.misses
+        metrics.CACHE_REQUESTS.set(store.hits, cache=cache, tier=tier, result="hit")
+        metrics.CACHE_REQUESTS.set(store.misses, cache=cache, tier=tier, result="miss")
+        metrics.CACHE_HIT_RATIO.set(store.hits / lookups if lookups else 0.0, cache=cache, tier=tier)
+    
+    for lane, lane_stats in execution.stats().items():
+        metrics.LANE_REQUESTS.set(lane_stats["running"], lane=lane, state="running")
+        metrics.LANE_REQUESTS.set(lane_stats["queued"], lane=lane, state="queued")
+    
+    metrics.COALESCED.set(detector.flights.coalesced, kind="bert")
+    metrics.COALESCED.set(llm_analyzer.flights.coalesced, kind="llm")
+
+
+metrics.REGISTRY.add_collector(collect_component_metrics)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled (SPEAR_METRICS_ENABLED)")
+    if job_store is not None:
+        for status, count in (await job_store.counts_async()).items():  # SQLite, so not in the sync collector
+            metrics.JOBS.set(count, status=status)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -1,5 +1,4 @@
-from .phishing_model import PhishingDetector
+from .phishing_model import PhishingDetector, PredictionResult
 from .llm_analyzer import LLMAnalyzer, llm_analyzer
 
-__all__ = ["PhishingDetector", "LLMAnalyzer", "llm_analyzer"]
-
+__all__ = ["PhishingDetector", "PredictionResult", "LLMAnalyzer", "llm_analyzer"]
@@ -0,0 +1,255 @@
+"""
+Incremental parser for LLM security analyses
+Extracts the structured risk, anomaly and mitigation fields from the
+markdown report requested by SYSTEM_PROMPT in a single pass over the text.
+The response can be fed as one string or as a stream of chunks, and the
+fields parsed so far are available at any point.
+"""
+
+import re
+from itertools import chain
+from typing import List, Optional
+
+# Markers that start a field. Each pattern begins with a literal so the regex
+# engine can skip ahead quickly; a combined alternation would lose that.
+_LABEL_PATTERN = re.compile(
+    r"\*\*(Risk Level|Risk Score|Anomaly Score|Risk Category|Behavioral Patterns|Detected Anomalies|Risk Factors)\*\*:",
+    re.IGNORECASE
+)
+_SUBHEADING_PATTERN = re.compile(r"### (Security Strategies|Incident Response)")
+# "## " section headings; the title is whatever follows on the line
+_HEADING_PATTERN = re.compile(r"\n[^\S\n]*## ([^\n]*)")
+_FIRST_LINE_HEADING_PATTERN = re.compile(r"[^\S\n]*## ([^\n]*)")
+_RISK_LEVEL_PATTERN = re.compile(r"(CRITICAL|HIGH|MEDIUM|LOW)", re.IGNORECASE)
+_NUMBER_PATTERN = re.compile(r"\d+")
+_NON_SPACE_PATTERN = re.compile(r"\S")
+
+# Marker label -> (field, terminators). Scalar values (terminators None) follow
+# the marker, possibly after blank lines; lists collect "•" bullets until a terminator.
+_FIELDS = {
+    "Risk Level": ("risk_level", None),
+    "Risk Score": ("risk_score", None),
+    "Anomaly Score": ("anomaly_score", None),
+    "Risk Category": ("category", None),
+    "Behavioral Patterns": ("patterns", None),
+    "Detected Anomalies": ("anomalies", ("**", "##")),
+    "Risk Factors": ("factors", ("##",)),
+    "Security Strategies": ("strategies", ("##",)),
+    "Incident Response": ("incident_response", ("##",))
+}
+
+
+class AnalysisParser:
+    """
+    Single-pass, incremental parser for the analysis report.
+    
+    Usage:
+        parser = AnalysisParser()
+        for chunk in stream:
+            for title in parser.feed(chunk):
+                ...  # section `title` is complete; parser.result() has its fields
+        parser.close()
+        parsed = parser.result()
+    
+    Each field takes the first well-formed occurrence of its marker, and list
+    fields collect the "•" bullets up to the next heading, which matches the
+    behaviour of the original regex-based parser.
+    """
+    
+    def __init__(self):
+        self._chunks: List[str] = []  # Text not parsed yet
+        self._heading_pending = False  # Whether the unparsed text holds a "##" heading candidate
+        self._closed = False
+        self.section: Optional[str] = None  # Title of the "## " section being read
+        self.sections: List[str] = []  # Completed section titles, in order
+        
+        self._values = {}  # field -> parsed scalar value
+        self._pending = {}  # field -> saw_space, for markers still waiting for their value
+        self._lists = {}  # field -> collected bullets
+        self._open_lists = {}  # field -> terminators, for lists still being read
+    
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Consume the next piece of the response.
+        
+        Returns:
+            Titles of the "## " sections completed by this chunk
+        """
+        if self._closed:
+            raise ValueError("parser is closed")
+        
+        if not chunk:
+            return []
+        
+        # Text is parsed in blocks of whole lines, and only once a "##" heading
+        # candidate has arrived, so sections are reported as soon as they end
+        # without paying for a scan per chunk
+        if not self._heading_pending:
+            self._heading_pending = "##" in chunk or (
+                chunk[0] == "#" and bool(self._chunks) and self._chunks[-1][-1] == "#"
+            )
+        self._chunks.append(chunk)
+        if not self._heading_pending or "\n" not in chunk:
+            return []
+        
+        text = "".join(self._chunks)
+        last_newline = text.rfind("\n")
+        rest = text[last_newline + 1:]
+        self._chunks = [rest] if rest else []
+        self._heading_pending = "##" in rest
+        return self._process(text[:last_newline + 1])
+    
+    def close(self) -> List[str]:
+        """
+        Mark the end of the response.
+        
+        Returns:
+            The final section title, if a section was still open
+        """
+        if self._closed:
+            return []
+        
+        text = "".join(self._chunks)
+        completed = self._process(text) if text else []
+        self._chunks = []
+        self._closed = True
+        if self.section is not None:
+            completed.append(self.section)
+            self.sections.append(self.section)
+            self.section = None
+        return completed
+    
+    def result(self) -> dict:
+        """ParsedAnalysis dict for everything fed so far"""
+        if self._chunks:
+            # Parse the buffered text on a copy so feeding can continue
+            finished = self._copy()
+            finished.close()
+            return finished.result()
+        
+        values = dict(self._values)
+        for field, saw_space in self._pending.items():
+            # A marker followed only by whitespace still matches "[^\n]+" if any of it is not a newline
+            if field == "category" and saw_space:
+                values[field] = ""
+            elif field == "patterns" and saw_space:
+                values[field] = [""]
+        
+        anomalies = self._lists.get("anomalies", [])
+        return {
+            "riskAssessment": {
+                "level": values.get("risk_level", "MEDIUM"),
+                "score": values.get("risk_score", 50),
+                "factors": self._lists.get("factors", [])[:10],  # Limit to 10
+                "category": values.get("category", "Unknown")
+            },
+            "anomalyDetection": {
+                "hasAnomalies": len(anomalies) > 0,
+                "anomalies": anomalies[:15],  # Limit to 15
+                "anomalyScore": values.get("anomaly_score", 0),
+                "patterns": values.get("patterns", [])[:8]  # Limit to 8
+            },
+            "mitigationRecommendations": {
+                "strategies": self._lists.get("strategies", [])[:10],
+                "incidentResponse": self._lists.get("incident_response", [])[:8],
+                "policyAlignment": ["NIST CSF", "ISO/IEC 27001", "CIS Controls"]
+            }
+        }
+    
+    def _copy(self) -> "AnalysisParser":
+        clone = AnalysisParser()
+        clone._chunks = list(self._chunks)
+        clone._heading_pending = self._heading_pending
+        clone.section = self.section
+        clone.sections = list(self.sections)
+        clone._values = dict(self._values)
+        clone._pending = dict(self._pending)
+        clone._lists = {field: list(items) for field, items in self._lists.items()}
+        clone._open_lists = dict(self._open_lists)
+        return clone
+    
+    def _process(self, block: str) -> List[str]:
+        """Parse a run of whole lines (or the final unterminated line)"""
+        for field in list(self._pending):
+            self._read_value(field, block, 0)
+        for field, terminators in list(self._open_lists.items()):
+            self._collect(field, terminators, block, 0)
+        
+        # Fields are independent of each other, so the two marker kinds can be scanned separately
+        for match in chain(_LABEL_PATTERN.finditer(block), _SUBHEADING_PATTERN.finditer(block)):
+            label = match.group(1)
+            spec = _FIELDS.get(label)
+            if spec is None:
+                # Only the risk level label is matched case-insensitively
+                if label.lower() != "risk level":
+                    continue
+                spec = _FIELDS["Risk Level"]
+            
+            field, terminators = spec
+            if terminators is None:
+                if field not in self._values:
+                    self._read_value(field, block, match.end())
+            elif field not in self._lists:
+                self._lists[field] = []
+                self._collect(field, terminators, block, match.end())
+        
+        # Blocks always start at the beginning of a line
+        completed = []
+        first = _FIRST_LINE_HEADING_PATTERN.match(block)
+        for match in chain((first,) if first else (), _HEADING_PATTERN.finditer(block)):
+            title = match.group(1).strip()
+            if not title:
+                continue
+            if self.section is not None:
+                completed.append(self.section)
+                self.sections.append(self.section)
+            self.section = title
+        return completed
+    
+    def _read_value(self, field: str, block: str, offset: int) -> None:
+        """Read a scalar value that starts at the first non-whitespace character after offset"""
+        match = _NON_SPACE_PATTERN.search(block, offset)
+        if match is None:
+            # Still only whitespace; the value may follow in a later block
+            self._pending[field] = self._pending.get(field, False) or bool(block[offset:].replace("\n", ""))
+            return
+        
+        self._pending.pop(field, None)
+        start = match.start()
+        if field == "risk_level":
+            level = _RISK_LEVEL_PATTERN.match(block, start)
+            if level:
+                self._values[field] = level.group(1).upper()
+        elif field in ("risk_score", "anomaly_score"):
+            number = _NUMBER_PATTERN.match(block, start)
+            if number:
+                self._values[field] = int(number.group(0))
+        else:
+            line_end = block.find("\n", start)
+            value = block[start:line_end if line_end >= 0 else len(block)]
+            if field == "category":
+                self._values[field] = value.strip()
+            else:
+                self._values[field] = [pattern.strip() for pattern in value.split(",")]
+    
+    def _collect(self, field: str, terminators: tuple, block: str, offset: int) -> None:
+        """Add the bullets between offset and the list's terminator; close the list if it appears"""
+        ends = [index for index in (block.find(t, offset) for t in terminators) if index >= 0]
+        region = block[offset:min(ends)] if ends else block[offset:]
+        if "•" in region:
+            self._lists[field].extend(
+                [line.strip("• ").strip() for line in region.split("\n") if line.strip().startswith("•")]
+            )
+        
+        if ends:
+            self._open_lists.pop(field, None)
+        else:
+            self._open_lists[field] = terminators
+
+
+def parse_analysis(text: str) -> dict:
+    """Parse a complete analysis response into the ParsedAnalysis dict"""
+    parser = AnalysisParser()
+    parser.feed(text)
+    parser.close()
+    return parser.result()
@@ -0,0 +1,387 @@
+"""
+Caching primitives
+In-memory LRU with TTL, plus a SQLite store that several worker processes
+can share, used to skip repeat BERT passes and OpenRouter calls on
+identical content.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Optional
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Verdict cache configuration
+VERDICT_CACHE_ENABLED = os.getenv("SPEAR_VERDICT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+VERDICT_CACHE_MAX_ENTRIES = int(os.getenv("SPEAR_VERDICT_CACHE_MAX_ENTRIES", "50000"))
+VERDICT_CACHE_TTL = float(os.getenv("SPEAR_VERDICT_CACHE_TTL", "3600"))  # Seconds
+VERDICT_CACHE_DB = os.getenv("SPEAR_VERDICT_CACHE_DB", "")  # Shared SQLite file; empty = per-process only
+VERDICT_CACHE_DB_MAX_ENTRIES = int(os.getenv("SPEAR_VERDICT_CACHE_DB_MAX_ENTRIES", "500000"))
+
+# LLM analysis cache configuration
+LLM_CACHE_ENABLED = os.getenv("SPEAR_LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_DB = os.getenv("SPEAR_LLM_CACHE_DB", "cache/llm_analyses.db")
+LLM_CACHE_TTL = float(os.getenv("SPEAR_LLM_CACHE_TTL", "86400"))  # Seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("SPEAR_LLM_CACHE_MAX_ENTRIES", "20000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("SPEAR_LLM_CACHE_MEMORY_ENTRIES", "1000"))  # Per-process LRU; 0 = off
+
+
+def normalize_content(content: str) -> str:
+    """Normalize content for cache keys (Unicode NFKC, collapsed whitespace)"""
+    return " ".join(unicodedata.normalize("NFKC", content).split())
+
+
+def content_key(*parts: str) -> str:
+    """Stable SHA-256 key over several string parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+def analysis_key(model: str, prompt_version: str, content: str, content_type: str, threat_level: str) -> str:
+    """Key of an LLM analysis: everything its prompt and answer depend on"""
+    return content_key(model, prompt_version, content_type.lower(), threat_level.lower(), normalize_content(content))
+
+
+def resolve_path(path: str) -> Path:
+    """Resolve a cache path relative to the backend directory"""
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = BACKEND_DIR / resolved
+    return resolved
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with per-entry TTL"""
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+class BackgroundWriter:
+    """
+    Single thread per process running store writes in the order they were
+    submitted, so callers (and the event loop) never wait on SQLite locks.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._executor = None
+        self._pid = None
+    
+    def submit(self, func, *args) -> None:
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+            self._pid = os.getpid()
+        self._executor.submit(self._run, func, *args)
+    
+    def _run(self, func, *args) -> None:
+        try:
+            func(*args)
+        except sqlite3.Error as e:
+            print(f"[!] {self.name} write failed: {e}")
+    
+    def close(self) -> None:
+        """Finish pending writes"""
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+async def run_blocking(func, *args):
+    """Run a blocking store call on the loop's default executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+class SqliteStore:
+    """
+    Key -> JSON value store in a SQLite file.
+    Safe to share between threads and worker processes (WAL mode); entries
+    expire after ttl_seconds and the least recently used ones are evicted
+    once the table grows past max_entries.
+    """
+    
+    PRUNE_EVERY = 256  # Writes between eviction passes
+    
+    def __init__(self, path: str, table: str, ttl_seconds: float, max_entries: int):
+        self.path = resolve_path(path)
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection().execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._connection().execute(
+            f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+        )
+    
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and per process"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def get(self, key: str) -> Optional[Any]:
+        conn = self._connection()
+        row = conn.execute(
+            f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        now = time.time()
+        
+        if row is None or row[1] + self.ttl_seconds < now:
+            self.misses += 1
+            return None
+        
+        conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+    
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now, now)
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+    
+    def delete(self, key: str) -> None:
+        self._connection().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+    
+    def prune(self) -> None:
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        conn = self._connection()
+        conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        conn.execute(
+            f"DELETE FROM {self.table} WHERE key IN ("
+            f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+    
+    def count(self) -> int:
+        return self._connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": self.count(),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class VerdictCache:
+    """
+    Content-addressed cache of BERT verdicts.
+    Keys hash the normalized content together with the content type and the
+    model identity, so a model or revision change never serves stale verdicts.
+    Lookups hit the per-process LRU first, then the optional shared store.
+    The shared store is SQLite: get_shared() blocks and belongs off the event
+    loop, and set() writes it through on a background thread.
+    """
+    
+    def __init__(self, model_id: str, max_entries: int = VERDICT_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = VERDICT_CACHE_TTL, shared_path: str = VERDICT_CACHE_DB,
+                 shared_max_entries: int = VERDICT_CACHE_DB_MAX_ENTRIES, enabled: bool = VERDICT_CACHE_ENABLED):
+        self.model_id = model_id
+        self.enabled = enabled
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.shared = None
+        if enabled and shared_path:
+            self.shared = SqliteStore(shared_path, "verdicts", ttl_seconds, shared_max_entries)
+        self._writer = BackgroundWriter("verdict-cache")
+    
+    def key(self, content: str, content_type: str) -> str:
+        return content_key(self.model_id, content_type.lower(), normalize_content(content))
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached verdict fields, or None on a miss"""
+        verdict = self.get_memory(key)
+        if verdict is None:
+            verdict = self.get_shared(key)
+        return verdict
+    
+    def get_memory(self, key: str) -> Optional[dict]:
+        """Look up the per-process LRU only; never touches SQLite"""
+        if not self.enabled:
+            return None
+        return self.memory.get(key)
+    
+    def get_shared(self, key: str) -> Optional[dict]:
+        """Look up the shared store (blocking), copying a hit into the LRU"""
+        if not self.enabled or self.shared is None:
+            return None
+        verdict = self.shared.get(key)
+        if verdict is not None:
+            self.memory.set(key, verdict)
+        return verdict
+    
+    def get_shared_many(self, keys: list) -> list:
+        """get_shared() for several keys in one call"""
+        return [self.get_shared(key) for key in keys]
+    
+    def set(self, key: str, verdict: dict) -> None:
+        """Store in the LRU now; the shared store is written in the background"""
+        if not self.enabled:
+            return
+        self.memory.set(key, verdict)
+        if self.shared is not None:
+            self._writer.submit(self.shared.set, key, verdict)
+    
+    def close(self) -> None:
+        """Finish pending shared-store writes"""
+        self._writer.close()
+    
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "model_id": self.model_id,
+            "memory": self.memory.stats(),
+            "shared": self.shared.stats() if self.shared is not None else None
+        }
+    
+    async def stats_async(self) -> dict:
+        """stats() off the event loop (the shared store counts its rows)"""
+        return await run_blocking(self.stats)
+
+
+class AnalysisCache:
+    """
+    Disk-backed cache of LLM analyses.
+    Keys cover the model, the prompt template and its version, the content
+    type and normalized content, and the BERT threat level the prompt was
+    built with. Only successful analyses are stored.
+    Hot entries are also kept in a per-process LRU; async callers use
+    get_async(), and writes reach SQLite on a background thread.
+    """
+    
+    def __init__(self, path: str = LLM_CACHE_DB, ttl_seconds: float = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES, memory_entries: int = LLM_CACHE_MEMORY_ENTRIES):
+        self.store = SqliteStore(path, "llm_analyses", ttl_seconds, max_entries)
+        self.memory = LRUCache(memory_entries, ttl_seconds) if memory_entries > 0 else None
+        self._writer = BackgroundWriter("llm-cache")
+    
+    def key(self, model: str, prompt_version: str, content: str, content_type: str, threat_level: str) -> str:
+        return analysis_key(model, prompt_version, content, content_type, threat_level)
+    
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached analysis, parsed structure and token usage, or None (blocking)"""
+        entry = self.memory.get(key) if self.memory is not None else None
+        if entry is None:
+            entry = self.store.get(key)
+            if entry is not None and self.memory is not None:
+                self.memory.set(key, entry)
+        return entry
+    
+    async def get_async(self, key: str) -> Optional[dict]:
+        """get() that only leaves the event loop on an in-memory miss"""
+        entry = self.memory.get(key) if self.memory is not None else None
+        if entry is None:
+            entry = await run_blocking(self.get, key)
+        return entry
+    
+    def set(self, key: str, result: dict) -> None:
+        entry = {
+            "analysis": result["analysis"],
+            "model": result.get("model"),  # The model that answered (may differ after failover or hedging)
+            "parsed": result.get("parsed"),
+            "tokens_used": result.get("tokens_used")
+        }
+        if self.memory is not None:
+            self.memory.set(key, entry)
+        self._writer.submit(self.store.set, key, entry)
+    
+    def close(self) -> None:
+        """Finish pending writes"""
+        self._writer.close()
+    
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            **self.store.stats(),
+            "memory": self.memory.stats() if self.memory is not None else None
+        }
+    
+    async def stats_async(self) -> dict:
+        """stats() off the event loop (the store counts its rows)"""
+        return await run_blocking(self.stats)
@@ -0,0 +1,342 @@
+"""
+Memory-mapped domain allow/block index
+Compiles plain-text domain lists into one compact binary file: a Bloom filter
+prefilter followed by a sorted array of 64-bit domain hashes and a parallel
+verdict array. The file is memory-mapped read-only, so it loads instantly,
+costs nothing until pages are touched, and every worker process shares the
+same page cache instead of holding its own Python sets.
+
+Lookups walk the host's suffixes from longest to shortest, so an entry for
+"evil.com" also covers "login.evil.com", and a more specific entry wins
+("docs.example.com" allowed under a blocked "example.com").
+
+Usage:
+    python -m models.domain_index build --allow allow.txt --block block.txt
+    python -m models.domain_index lookup login.paypa1-secure.xyz
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import resolve_path
+from .phishing_model import PredictionResult
+from .url_features import extract_urls, url_host
+
+# Domain index configuration
+DOMAIN_INDEX_ENABLED = os.getenv("SPEAR_DOMAIN_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+DOMAIN_INDEX_PATH = os.getenv("SPEAR_DOMAIN_INDEX_PATH", "cache/domains.idx")  # Relative to backend/
+DOMAIN_INDEX_MAX_URLS = int(os.getenv("SPEAR_DOMAIN_INDEX_MAX_URLS", "20"))  # Links checked per email/SMS body
+
+# Verdicts stored per entry
+ALLOW = 0
+BLOCK = 1
+VERDICT_NAMES = {ALLOW: "allow", BLOCK: "block"}
+
+# File layout: header, Bloom filter bits, sorted uint64 hashes, uint8 verdicts
+MAGIC = b"SPEARDX1"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("entries", "<u8"), ("bloom_bits", "<u8"), ("bloom_hashes", "<u4"),
+                         ("reserved", "<u4")])
+BLOOM_BITS_PER_ENTRY = 10  # ~1% false positives with 7 probes
+BLOOM_HASHES = 7
+_UINT64_MASK = (1 << 64) - 1
+
+
+def normalize_domain(entry: str) -> Optional[str]:
+    """
+    Normalize one list line to a bare domain.
+    Accepts "example.com", "*.example.com", ".example.com", hosts-file lines
+    ("0.0.0.0 example.com") and full URLs; comments and blanks return None.
+    """
+    line = entry.split("#", 1)[0].strip()
+    if not line:
+        return None
+    fields = line.split()
+    line = fields[-1] if len(fields) > 1 else fields[0]
+    if "/" in line or ":" in line:
+        line = url_host(line) or ""
+    domain = line.lower().lstrip("*.").rstrip(".")
+    if "." not in domain:
+        return None  # Bare labels such as "localhost" in hosts files
+    try:
+        return domain.encode("idna").decode("ascii")
+    except UnicodeError:
+        return domain
+
+
+def domain_hash(domain: str) -> Tuple[int, int]:
+    """(sorted-array key, Bloom filter step) for a normalized domain"""
+    digest = hashlib.blake2b(domain.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def host_suffixes(host: str) -> List[str]:
+    """"a.b.example.com" -> ["a.b.example.com", "b.example.com", "example.com", "com"]"""
+    labels = host.split(".")
+    return [".".join(labels[i:]) for i in range(len(labels))]
+
+
+def build_index(allow: Iterable[str], block: Iterable[str], output_path: Path) -> dict:
+    """
+    Compile domain lists into an index file.
+    A domain present in both lists is stored as blocked.
+    
+    Args:
+        allow: Lines of known-good domains
+        block: Lines of known-bad domains
+        output_path: Destination file; replaced atomically so running workers keep their old mapping
+    
+    Returns:
+        dict with entry counts and the file size
+    """
+    keys = []
+    steps = []
+    verdicts = []
+    for verdict, lines in ((ALLOW, allow), (BLOCK, block)):
+        for line in lines:
+            domain = normalize_domain(line)
+            if domain is None:
+                continue
+            key, step = domain_hash(domain)
+            keys.append(key)
+            steps.append(step)
+            verdicts.append(verdict)
+    
+    keys = np.array(keys, dtype=np.uint64)
+    steps = np.array(steps, dtype=np.uint64)
+    verdicts = np.array(verdicts, dtype=np.uint8)
+    
+    # Sort by key, then verdict, and keep the last (highest) verdict per key so BLOCK wins
+    order = np.lexsort((verdicts, keys))
+    keys, steps, verdicts = keys[order], steps[order], verdicts[order]
+    last = np.ones(len(keys), dtype=bool)
+    if len(keys):
+        last[:-1] = keys[1:] != keys[:-1]
+    keys, steps, verdicts = keys[last], steps[last], verdicts[last]
+    
+    # Bloom filter: BLOOM_HASHES probes by double hashing, sized in whole 64-bit words
+    bloom_bits = max(64, -(-len(keys) * BLOOM_BITS_PER_ENTRY // 64) * 64)
+    bloom = np.zeros(bloom_bits // 8, dtype=np.uint8)
+    with np.errstate(over="ignore"):
+        for probe in range(BLOOM_HASHES):
+            positions = (keys + np.uint64(probe) * steps) % np.uint64(bloom_bits)
+            np.bitwise_or.at(bloom, (positions >> np.uint64(3)).astype(np.int64),
+                             (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+    
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header[0] = (MAGIC, len(keys), bloom_bits, BLOOM_HASHES, 0)
+    
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(temp_path, "wb") as handle:
+        handle.write(header.tobytes())
+        handle.write(bloom.tobytes())
+        handle.write(keys.astype("<u8").tobytes())
+        handle.write(verdicts.tobytes())
+    os.replace(temp_path, output_path)
+    
+    return {
+        "entries": int(len(keys)),
+        "allowed": int((verdicts == ALLOW).sum()),
+        "blocked": int((verdicts == BLOCK).sum()),
+        "bytes": output_path.stat().st_size
+    }
+
+
+@dataclass
+class DomainMatch:
+    """A host found in the index"""
+    host: str
+    domain: str  # The matching suffix
+    verdict: int
+
+
+class DomainIndex:
+    """
+    Read-only view of a compiled index file.
+    Nothing is copied into Python objects: the Bloom filter and the sorted
+    arrays are numpy views over one shared memory mapping.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        header = np.frombuffer(self._map, dtype=HEADER_DTYPE, count=1)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"{path} is not a domain index file")
+        
+        self.entries = int(header["entries"])
+        self.bloom_bits = int(header["bloom_bits"])
+        self.bloom_hashes = int(header["bloom_hashes"])
+        
+        offset = HEADER_DTYPE.itemsize
+        view = memoryview(self._map)  # Plain ints on indexing, much cheaper than numpy scalars
+        self._bloom = view[offset:offset + self.bloom_bits // 8]
+        offset += self.bloom_bits // 8
+        self._keys = np.frombuffer(self._map, dtype="<u8", count=self.entries, offset=offset)
+        offset += self.entries * 8
+        self._verdicts = view[offset:offset + self.entries]
+        if len(self._verdicts) != self.entries:
+            raise ValueError(f"{path} is truncated")
+    
+    def _might_contain(self, key: int, step: int) -> bool:
+        for probe in range(self.bloom_hashes):
+            position = ((key + probe * step) & _UINT64_MASK) % self.bloom_bits  # Same wrap-around as the build
+            if not self._bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+    
+    def get(self, domain: str) -> Optional[int]:
+        """Verdict for an exact normalized domain, or None"""
+        key, step = domain_hash(domain)
+        if not self._might_contain(key, step):
+            return None
+        index = int(np.searchsorted(self._keys, np.uint64(key)))
+        if index < self.entries and int(self._keys[index]) == key:
+            return self._verdicts[index]
+        return None
+    
+    def lookup(self, host: str) -> Optional[DomainMatch]:
+        """Longest-suffix match for a hostname"""
+        host = host.lower().rstrip(".")
+        for suffix in host_suffixes(host):
+            verdict = self.get(suffix)
+            if verdict is not None:
+                return DomainMatch(host=host, domain=suffix, verdict=verdict)
+        return None
+
+
+class DomainIndexStage:
+    """
+    Detection stage that answers from the domain lists before any model runs.
+    A URL is decided by its host's verdict. An email or SMS body is only
+    decided when one of its links is blocked; allowed links do not make a
+    message safe, so those bodies still go to the model.
+    """
+    
+    def __init__(self, path: str = DOMAIN_INDEX_PATH, enabled: bool = DOMAIN_INDEX_ENABLED,
+                 max_urls: int = DOMAIN_INDEX_MAX_URLS):
+        self.enabled = enabled
+        self.max_urls = max_urls
+        self.index: Optional[DomainIndex] = None
+        self.path = resolve_path(path) if path else None
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.blocked = 0
+        self.fell_through = 0
+    
+    def load(self) -> None:
+        """Map the index file if it exists (missing file disables the stage)"""
+        if not self.enabled or self.path is None:
+            return
+        if not self.path.exists():
+            print(f"[*] Domain index not found at {self.path} - domain lists disabled")
+            return
+        try:
+            self.index = DomainIndex(self.path)
+            print(f"[OK] Domain index mapped: {self.index.entries} domains")
+        except (OSError, ValueError) as e:
+            print(f"[!] Could not open domain index {self.path}: {e}")
+    
+    def classify(self, content: str, content_type: str) -> Optional[PredictionResult]:
+        """Return a list verdict for the content, or None to fall through to the model"""
+        if self.index is None:
+            return None
+        
+        if content_type == "url":
+            host = None if any(c.isspace() for c in content) else url_host(content)
+            match = self.index.lookup(host) if host else None
+        else:
+            match = None
+            for url in extract_urls(content, self.max_urls):
+                host = url_host(url)
+                candidate = self.index.lookup(host) if host else None
+                if candidate is not None and candidate.verdict == BLOCK:
+                    match = candidate
+                    break
+        
+        if match is None:
+            outcome = None
+        elif match.verdict == BLOCK:
+            outcome = PredictionResult(
+                raw_label="phishing", raw_score=1.0, is_phishing=True, confidence=100.0, stage="domainIndex"
+            )
+        else:
+            outcome = PredictionResult(
+                raw_label="benign", raw_score=1.0, is_phishing=False, confidence=100.0, stage="domainIndex"
+            )
+        
+        with self._lock:
+            if outcome is None:
+                self.fell_through += 1
+            elif outcome.is_phishing:
+                self.blocked += 1
+            else:
+                self.allowed += 1
+        return outcome
+    
+    def stats(self) -> dict:
+        if self.index is None:
+            return {"enabled": False}
+        decided = self.allowed + self.blocked
+        total = decided + self.fell_through
+        return {
+            "enabled": True,
+            "entries": self.index.entries,
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "fell_through": self.fell_through,
+            "short_circuit_ratio": round(decided / total, 4) if total else 0.0
+        }
+
+
+def _read_lines(paths: List[str]) -> Iterable[str]:
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as handle:
+            yield from handle
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Domain allow/block index for the SPEAR AI detector")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    build = sub.add_parser("build", help="Compile plain-text domain lists into an index file")
+    build.add_argument("--allow", action="append", default=[], help="Known-good domain list (repeatable)")
+    build.add_argument("--block", action="append", default=[], help="Known-bad domain list (repeatable)")
+    build.add_argument("-o", "--output", default=DOMAIN_INDEX_PATH, help="Index file (relative to backend/)")
+    
+    lookup = sub.add_parser("lookup", help="Look up hosts or URLs in an index file")
+    lookup.add_argument("hosts", nargs="+")
+    lookup.add_argument("-i", "--index", default=DOMAIN_INDEX_PATH, help="Index file (relative to backend/)")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "build":
+        if not args.allow and not args.block:
+            parser.error("give at least one --allow or --block list")
+        output_path = resolve_path(args.output)
+        summary = build_index(_read_lines(args.allow), _read_lines(args.block), output_path)
+        print(f"[OK] Wrote {output_path}: {summary['entries']} domains "
+              f"({summary['allowed']} allowed, {summary['blocked']} blocked), {summary['bytes']} bytes")
+        return 0
+    
+    index = DomainIndex(resolve_path(args.index))
+    for value in args.hosts:
+        host = url_host(value)
+        match = index.lookup(host) if host else None
+        if match is None:
+            print(f"{value}: not listed")
+        else:
+            print(f"{value}: {VERDICT_NAMES[match.verdict]} (matched {match.domain})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
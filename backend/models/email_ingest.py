@@ -0,0 +1,283 @@
+"""
+Raw email ingestion
+Parses RFC 822 messages and mbox files into the pieces the detector can
+score: the headers, every text body (HTML converted to text), text
+attachments and the URLs found in bodies and link targets. Mailboxes are
+split as a stream, one message at a time, so they are never loaded whole.
+"""
+
+import email
+import os
+import re
+from dataclasses import dataclass, field
+from email import policy
+from email.message import EmailMessage
+from html import unescape
+from html.parser import HTMLParser
+from typing import BinaryIO, Iterator, List, Optional
+
+from .phishing_model import PredictionResult, get_threat_level
+from .url_features import extract_urls
+
+# Ingestion configuration
+INGEST_MAX_PART_CHARS = int(os.getenv("SPEAR_INGEST_MAX_PART_CHARS", "100000"))  # Characters kept per body part
+INGEST_MAX_URLS = int(os.getenv("SPEAR_INGEST_MAX_URLS", "20"))  # URLs scored per message
+INGEST_SCORE_URLS = os.getenv("SPEAR_INGEST_SCORE_URLS", "true").lower() in ("1", "true", "yes")
+INGEST_MAX_MESSAGES = int(os.getenv("SPEAR_INGEST_MAX_MESSAGES", "200"))  # Messages per /ingest/email upload
+
+SUMMARY_CHARS = 3000  # Body text handed to the LLM (its prompt keeps the first 3000 characters)
+_MBOX_ESCAPED_FROM = re.compile(rb"^>+From ")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+
+
+class _HtmlText(HTMLParser):
+    """Visible text and link targets of an HTML body"""
+    
+    SKIPPED = {"script", "style", "head", "title", "noscript", "template"}
+    BREAKS = {"br", "p", "div", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote", "hr"}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks: List[str] = []
+        self.links: List[str] = []
+        self._skipping = 0
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skipping += 1
+        elif tag in self.BREAKS:
+            self.chunks.append("\n")
+        if tag in ("a", "area", "form"):
+            target = dict(attrs).get("action" if tag == "form" else "href")
+            if target and target.strip().lower().startswith(("http://", "https://", "www.")):
+                self.links.append(target.strip())
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skipping = max(0, self._skipping - 1)
+        elif tag in self.BREAKS:
+            self.chunks.append("\n")
+    
+    def handle_data(self, data):
+        if not self._skipping:
+            self.chunks.append(data)
+
+
+def html_to_text(html: str) -> tuple:
+    """
+    Convert an HTML body to plain text.
+    
+    Returns:
+        (visible text, link targets of anchors and forms)
+    """
+    parser = _HtmlText()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        # Malformed markup: fall back to stripping tags
+        return unescape(re.sub(r"<[^>]+>", " ", html)), []
+    text = _SPACES.sub(" ", "".join(parser.chunks))
+    text = _BLANK_LINES.sub("\n\n", "\n".join(line.strip() for line in text.split("\n")))
+    return text.strip(), parser.links
+
+
+@dataclass
+class EmailPart:
+    """One piece of a message that is scored on its own"""
+    kind: str  # "body", "attachment" or "url"
+    label: str  # MIME type, attachment name or the URL
+    content: str
+    content_type: str  # Detector content type: "email" or "url"
+
+
+@dataclass
+class Attachment:
+    filename: Optional[str]
+    mime_type: str
+    size: int
+
+
+@dataclass
+class ParsedEmail:
+    """Headers, scorable parts and attachments of one message"""
+    message_id: Optional[str] = None
+    subject: str = ""
+    sender: str = ""
+    reply_to: str = ""
+    return_path: str = ""
+    to: str = ""
+    date: str = ""
+    parts: List[EmailPart] = field(default_factory=list)
+    urls: List[str] = field(default_factory=list)
+    attachments: List[Attachment] = field(default_factory=list)
+    truncated: bool = False  # A body was cut at INGEST_MAX_PART_CHARS or URLs beyond INGEST_MAX_URLS were dropped
+    
+    def summary_text(self, limit: int = SUMMARY_CHARS) -> str:
+        """Subject and body text, for an LLM analysis of the whole message"""
+        prefix = f"{self.subject}\n\n"
+        bodies = "\n\n".join(part.content[len(prefix):] if part.content.startswith(prefix) else part.content
+                               for part in self.parts if part.kind == "body" and part.label != "subject")
+        return f"From: {self.sender}\nSubject: {self.subject}\n\n{bodies}"[:limit]
+    
+    def headers(self) -> dict:
+        return {
+            "messageId": self.message_id,
+            "subject": self.subject,
+            "from": self.sender,
+            "replyTo": self.reply_to or None,
+            "returnPath": self.return_path or None,
+            "to": self.to,
+            "date": self.date
+        }
+
+
+def _header(message: EmailMessage, name: str) -> str:
+    try:
+        return str(message.get(name, "") or "").strip()
+    except Exception:
+        return ""  # Undecodable header
+
+
+def _part_text(part: EmailMessage) -> str:
+    try:
+        return part.get_content()
+    except Exception:
+        payload = part.get_payload(decode=True) or b""
+        return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+
+
+def parse_message(raw: bytes, max_part_chars: int = INGEST_MAX_PART_CHARS, max_urls: int = INGEST_MAX_URLS,
+                  score_urls: bool = INGEST_SCORE_URLS) -> ParsedEmail:
+    """
+    Split one raw RFC 822 message into scorable parts.
+    
+    Args:
+        raw: Message bytes (headers and body)
+        max_part_chars: Characters kept per body or text attachment
+        max_urls: Distinct URLs kept (and scored) per message
+        score_urls: Add each URL as a part of its own
+    
+    Returns:
+        ParsedEmail; the subject is prepended to every body part, since the
+        model was trained on whole emails
+    """
+    message = email.message_from_bytes(raw, policy=policy.default)
+    parsed = ParsedEmail(
+        message_id=_header(message, "Message-ID") or None,
+        subject=_header(message, "Subject"),
+        sender=_header(message, "From"),
+        reply_to=_header(message, "Reply-To"),
+        return_path=_header(message, "Return-Path"),
+        to=_header(message, "To"),
+        date=_header(message, "Date")
+    )
+    
+    links = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        mime_type = part.get_content_type()
+        filename = part.get_filename()
+        is_attachment = part.get_content_disposition() == "attachment" or filename is not None
+        
+        if is_attachment:
+            payload = part.get_payload(decode=True) or b""
+            parsed.attachments.append(Attachment(filename, mime_type, len(payload)))
+            if mime_type not in ("text/plain", "text/html"):
+                continue
+        elif mime_type not in ("text/plain", "text/html"):
+            continue
+        
+        text = _part_text(part)
+        if mime_type == "text/html":
+            text, anchors = html_to_text(text)
+            links.extend(anchors)
+        if not text.strip():
+            continue
+        if len(text) > max_part_chars:
+            text = text[:max_part_chars]
+            parsed.truncated = True
+        links.extend(extract_urls(text, limit=max_urls + 1))
+        
+        if is_attachment:
+            parsed.parts.append(EmailPart("attachment", filename or mime_type, text, "email"))
+        else:
+            content = f"{parsed.subject}\n\n{text}" if parsed.subject else text
+            parsed.parts.append(EmailPart("body", mime_type, content, "email"))
+    
+    if not any(part.kind == "body" for part in parsed.parts) and parsed.subject:
+        parsed.parts.insert(0, EmailPart("body", "subject", parsed.subject, "email"))
+    
+    seen = set()
+    for link in links:
+        if link.lower() not in seen:
+            seen.add(link.lower())
+            parsed.urls.append(link)
+    if len(parsed.urls) > max_urls:
+        parsed.urls = parsed.urls[:max_urls]
+        parsed.truncated = True
+    if score_urls:
+        parsed.parts.extend(EmailPart("url", url, url, "url") for url in parsed.urls)
+    return parsed
+
+
+def iter_messages(stream: BinaryIO) -> Iterator[bytes]:
+    """
+    Yield raw messages from an mbox (messages separated by "From " lines)
+    or a single .eml file, reading one line at a time.
+    """
+    first = stream.readline()
+    if not first:
+        return
+    if not first.startswith(b"From "):
+        yield first + stream.read()  # A single message
+        return
+    
+    lines: List[bytes] = []
+    previous_blank = True
+    for line in stream:
+        if line.startswith(b"From ") and previous_blank:
+            yield b"".join(lines)
+            lines = []
+            previous_blank = False
+            continue
+        if _MBOX_ESCAPED_FROM.match(line):
+            line = line[1:]  # Undo mboxrd quoting of body lines starting with "From "
+        lines.append(line)
+        previous_blank = line in (b"\n", b"\r\n")
+    if lines:
+        yield b"".join(lines)
+
+
+def part_phishing_score(prediction: PredictionResult) -> float:
+    """Phishing probability (0-100) of a part, whichever label the model chose"""
+    return prediction.confidence if prediction.is_phishing else 100 - prediction.confidence
+
+
+def aggregate_verdict(parts: List[EmailPart], predictions: list) -> Optional[dict]:
+    """
+    Message verdict from its scored parts: the most phishing-like part decides,
+    since one malicious link or body is enough to make the message malicious.
+    
+    Args:
+        parts: The message's parts
+        predictions: PredictionResult (or Exception) per part
+    
+    Returns:
+        dict with threatLevel, confidenceScore, isPhishing and decidedBy, or None if no part could be scored
+    """
+    scored = [(part_phishing_score(prediction), part) for part, prediction in zip(parts, predictions)
+              if isinstance(prediction, PredictionResult)]
+    if not scored:
+        return None
+    score, part = max(scored, key=lambda item: item[0])
+    is_phishing = score >= 50
+    confidence = score if is_phishing else 100 - score
+    return {
+        "threatLevel": get_threat_level(is_phishing, confidence),
+        "confidenceScore": round(confidence, 2),
+        "isPhishing": is_phishing,
+        "decidedBy": {"kind": part.kind, "label": part.label}
+    }
@@ -0,0 +1,396 @@
+"""
+Durable job queue
+Long-running analyses submitted to POST /jobs are stored in a SQLite file
+and processed by a pool of asyncio workers in every server process. Each
+step's result is saved as it completes, so GET /jobs/{id} can report
+progress, and a job interrupted by a restart resumes after its last
+completed step. Claims are leased: a job whose worker died is picked up
+again once its lease runs out.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Awaitable, Callable, List, Optional
+
+from .cache import content_key, normalize_content, resolve_path
+
+# Job queue configuration
+JOBS_ENABLED = os.getenv("SPEAR_JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOBS_DB = os.getenv("SPEAR_JOBS_DB", "cache/jobs.db")
+JOBS_WORKERS = int(os.getenv("SPEAR_JOBS_WORKERS", "4"))  # Jobs processed at once per server process
+JOBS_DEDUP_WINDOW = float(os.getenv("SPEAR_JOBS_DEDUP_WINDOW", "300"))  # Seconds identical content reuses a job
+JOBS_LEASE = float(os.getenv("SPEAR_JOBS_LEASE", "60"))  # Seconds a claim lasts without a heartbeat
+JOBS_MAX_ATTEMPTS = int(os.getenv("SPEAR_JOBS_MAX_ATTEMPTS", "3"))
+JOBS_RETENTION = float(os.getenv("SPEAR_JOBS_RETENTION", "86400"))  # Seconds finished jobs are kept
+JOBS_POLL_INTERVAL = float(os.getenv("SPEAR_JOBS_POLL_INTERVAL", "1.0"))  # Seconds between idle queue checks
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (QUEUED, RUNNING, DONE, FAILED)
+
+
+class JobRetry(Exception):
+    """Raised by a job handler to put the job back in the queue for a while without failing it"""
+    
+    def __init__(self, delay: float):
+        super().__init__(f"retry in {delay:g}s")
+        self.delay = delay
+
+
+@dataclass
+class Job:
+    id: str
+    content: str
+    content_type: str
+    status: str
+    progress: dict = field(default_factory=dict)  # Results of the steps completed so far
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+
+class JobStore:
+    """
+    Jobs table in a SQLite file shared by all server processes (WAL mode).
+    Claims run in IMMEDIATE transactions, so two workers never take the same job.
+    The *_async methods run the same queries on one thread per process, off
+    the event loop and in the order they were called.
+    """
+    
+    PRUNE_EVERY = 256  # Submissions between retention passes
+    COLUMNS = "id, content, content_type, status, progress, error, attempts, created_at, updated_at"
+    
+    def __init__(self, path: str = JOBS_DB, dedup_window: float = JOBS_DEDUP_WINDOW, lease: float = JOBS_LEASE,
+                 max_attempts: int = JOBS_MAX_ATTEMPTS, retention: float = JOBS_RETENTION):
+        self.path = resolve_path(path)
+        self.dedup_window = dedup_window
+        self.lease = lease
+        self.max_attempts = max(1, max_attempts)
+        self.retention = retention
+        self._local = threading.local()
+        self._executor = None
+        self._executor_pid = None
+        self._submissions = 0
+        self.submitted = 0
+        self.reused = 0
+        
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, dedup_key TEXT NOT NULL, content TEXT NOT NULL, content_type TEXT NOT NULL, "
+            "status TEXT NOT NULL, progress TEXT NOT NULL, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, lease_until REAL, worker TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at)")
+    
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread and per process"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    async def _offload(self, func, *args, **kwargs):
+        """Run a blocking store method on the store's thread"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-db")
+            self._executor_pid = os.getpid()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+    
+    @staticmethod
+    def _job(row) -> Job:
+        job_id, content, content_type, status, progress, error, attempts, created_at, updated_at = row
+        return Job(job_id, content, content_type, status, json.loads(progress), error, attempts, created_at, updated_at)
+    
+    def submit(self, content: str, content_type: str) -> tuple:
+        """
+        Queue a job, or return the job already holding the same content.
+        
+        Returns:
+            (Job, True if an existing job submitted within the dedup window was reused)
+        """
+        dedup_key = content_key(content_type, normalize_content(content))
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs WHERE dedup_key = ? AND created_at >= ? AND status != ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (dedup_key, now - self.dedup_window, FAILED)
+            ).fetchone()
+            if row is None:
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (id, dedup_key, content, content_type, status, progress, available_at, "
+                    "created_at, updated_at) VALUES (?, ?, ?, ?, ?, '{}', ?, ?, ?)",
+                    (job_id, dedup_key, content, content_type, QUEUED, now, now, now)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        
+        if row is not None:
+            self.reused += 1
+            return self._job(row), True
+        self.submitted += 1
+        self._submissions += 1
+        if self._submissions % self.PRUNE_EVERY == 0:
+            self.prune()
+        return Job(job_id, content, content_type, QUEUED, created_at=now, updated_at=now), False
+    
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._connection().execute(f"SELECT {self.COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+    
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Take the oldest runnable job: queued, or running under an expired
+        lease (its worker died). Jobs that used up their attempts are failed.
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? "
+                "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (FAILED, f"Gave up after {self.max_attempts} attempts", now, RUNNING, now, self.max_attempts)
+            )
+            row = conn.execute(
+                f"SELECT {self.COLUMNS} FROM jobs "
+                "WHERE (status = ? AND available_at <= ?) OR (status = ? AND lease_until < ?) "
+                "ORDER BY available_at LIMIT 1",
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, worker = ?, updated_at = ? "
+                    "WHERE id = ?",
+                    (RUNNING, now + self.lease, worker, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        job = self._job(row)
+        job.status = RUNNING
+        job.attempts += 1
+        return job
+    
+    def save_progress(self, job: Job, **steps) -> None:
+        """Record completed steps (merged into job.progress) and extend the lease"""
+        job.progress.update(steps)
+        self._write_progress(job.id, json.dumps(job.progress))
+    
+    def _write_progress(self, job_id: str, progress: str) -> None:
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET progress = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+            (progress, now + self.lease, now, job_id)
+        )
+    
+    def heartbeat(self, job_id: str) -> None:
+        self._connection().execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() + self.lease, job_id))
+    
+    def finish(self, job: Job, status: str = DONE, error: Optional[str] = None) -> None:
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, error = ?, progress = ?, lease_until = NULL, updated_at = ? WHERE id = ?",
+            (status, error, json.dumps(job.progress), now, job.id)
+        )
+    
+    def release(self, job: Job, delay: float = 0.0, count_attempt: bool = False) -> None:
+        """Put a claimed job back in the queue, keeping its progress"""
+        now = time.time()
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - ?, available_at = ?, lease_until = NULL, "
+            "worker = NULL, updated_at = ? WHERE id = ?",
+            (QUEUED, 0 if count_attempt else 1, now + delay, now, job.id)
+        )
+    
+    def prune(self) -> None:
+        """Drop finished jobs past the retention period"""
+        self._connection().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, time.time() - self.retention)
+        )
+    
+    def counts(self) -> dict:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(rows)
+        return counts
+    
+    async def submit_async(self, content: str, content_type: str) -> tuple:
+        return await self._offload(self.submit, content, content_type)
+    
+    async def get_async(self, job_id: str) -> Optional[Job]:
+        return await self._offload(self.get, job_id)
+    
+    async def claim_async(self, worker: str) -> Optional[Job]:
+        return await self._offload(self.claim, worker)
+    
+    async def save_progress_async(self, job: Job, **steps) -> None:
+        """
+        save_progress() off the loop. job.progress is updated and serialized
+        here, so steps saved concurrently are all in the snapshot written last.
+        """
+        job.progress.update(steps)
+        await self._offload(self._write_progress, job.id, json.dumps(job.progress))
+    
+    async def heartbeat_async(self, job_id: str) -> None:
+        await self._offload(self.heartbeat, job_id)
+    
+    async def finish_async(self, job: Job, status: str = DONE, error: Optional[str] = None) -> None:
+        await self._offload(self.finish, job, status, error)
+    
+    async def release_async(self, job: Job, delay: float = 0.0, count_attempt: bool = False) -> None:
+        await self._offload(self.release, job, delay, count_attempt)
+    
+    async def counts_async(self) -> dict:
+        return await self._offload(self.counts)
+    
+    async def stats_async(self) -> dict:
+        return await self._offload(self.stats)
+    
+    def close(self) -> None:
+        """Finish the queries already handed to the store's thread"""
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=True)
+            self._executor = None
+    
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "jobs": self.counts(),
+            "submitted": self.submitted,
+            "reused": self.reused,
+            "dedup_window_seconds": self.dedup_window,
+            "lease_seconds": self.lease,
+            "max_attempts": self.max_attempts
+        }
+
+
+class JobWorkerPool:
+    """
+    asyncio workers claiming jobs from a JobStore and running them through a
+    handler. The handler saves its own progress; returning marks the job
+    done, JobRetry requeues it and any other exception retries it until its
+    attempts run out.
+    """
+    
+    RETRY_DELAY = 5.0  # Seconds before a job that raised is tried again
+    
+    def __init__(self, store: JobStore, handler: Callable[[Job], Awaitable[None]], workers: int = JOBS_WORKERS,
+                 poll_interval: float = JOBS_POLL_INTERVAL):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.active = 0
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+    
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._work(index)) for index in range(self.workers)]
+    
+    async def stop(self) -> None:
+        """Cancel the workers; jobs they were running go back to the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    def notify(self) -> None:
+        """Wake idle workers after a submission instead of waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _idle(self) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+    
+    async def _work(self, index: int) -> None:
+        worker = f"{self.name}/{index}"
+        while True:
+            try:
+                job = await self.store.claim_async(worker)
+            except sqlite3.Error as e:
+                print(f"[!] Job queue unavailable: {e}")
+                job = None
+            if job is None:
+                await self._idle()
+                continue
+            await self._run(job)
+    
+    async def _run(self, job: Job) -> None:
+        heartbeat = asyncio.ensure_future(self._heartbeat(job.id))
+        self.active += 1
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            await self.store.release_async(job)  # Shutting down: another process or the next start picks it up
+            raise
+        except JobRetry as e:
+            self.retried += 1
+            await self.store.release_async(job, delay=e.delay)
+        except Exception as e:
+            if job.attempts >= self.store.max_attempts:
+                self.failed += 1
+                await self.store.finish_async(job, FAILED, f"{type(e).__name__}: {e}")
+            else:
+                self.retried += 1
+                await self.store.release_async(job, delay=self.RETRY_DELAY, count_attempt=True)
+        else:
+            self.completed += 1
+            await self.store.finish_async(job)
+        finally:
+            self.active -= 1
+            heartbeat.cancel()
+    
+    async def _heartbeat(self, job_id: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            try:
+                await self.store.heartbeat_async(job_id)
+            except sqlite3.Error as e:
+                print(f"[!] Job heartbeat failed: {e}")
+    
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried
+        }
@@ -3,11 +3,25 @@ LLM-based Cybersecurity Analysis
 Dual LLM Support: DeepSeek V3.1 Nex N1 + Google Gemini 3
 """
 
+import asyncio
 import os
+import random
+import threading
+import time
+from collections import Counter, deque
 from pathlib import Path
-from openai import OpenAI
+from typing import AsyncIterator, List, Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
 from dotenv import load_dotenv
 
+from . import metrics
+from .analysis_parser import AnalysisParser, parse_analysis
+from .cache import AnalysisCache, LLM_CACHE_ENABLED, analysis_key, content_key
+from .rate_limiter import LLMScheduler, RateLimited
+from .singleflight import SingleFlight
+
 # Load environment variables from backend/.env
 BACKEND_DIR = Path(__file__).parent.parent
 ENV_PATH = BACKEND_DIR / ".env"
@@ -15,12 +29,35 @@ load_dotenv(dotenv_path=ENV_PATH)
 
 # OpenRouter configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")  # Override to use benchmarks/fake_openrouter.py
 
 # Dual LLM Models (both use same OpenRouter API key)
 PRIMARY_MODEL = "nex-agi/deepseek-v3.1-nex-n1:free"  # DeepSeek
 SECONDARY_MODEL = "google/gemini-2.0-flash-exp:free"  # Gemini
 
+# Async client settings
+PRIMARY_TIMEOUT = float(os.getenv("SPEAR_PRIMARY_TIMEOUT", "60"))  # Seconds per DeepSeek call
+SECONDARY_TIMEOUT = float(os.getenv("SPEAR_SECONDARY_TIMEOUT", "45"))  # Seconds per Gemini call
+DUAL_DEADLINE = float(os.getenv("SPEAR_DUAL_DEADLINE", "60"))  # Seconds before dual analysis uses what it has
+LLM_MAX_CONNECTIONS = int(os.getenv("SPEAR_LLM_MAX_CONNECTIONS", "20"))  # Pooled HTTP connections
+
+# Resilience: per-attempt timeout, jittered retries, failover chain and hedging
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("SPEAR_LLM_ATTEMPT_TIMEOUT", "30"))  # Seconds per attempt, within the deadline
+LLM_RETRIES = int(os.getenv("SPEAR_LLM_RETRIES", "2"))  # Extra attempts per model on transient errors
+LLM_RETRY_BASE_DELAY = float(os.getenv("SPEAR_LLM_RETRY_BASE_DELAY", "0.5"))  # Seconds, doubled per retry
+LLM_RETRY_MAX_DELAY = float(os.getenv("SPEAR_LLM_RETRY_MAX_DELAY", "4"))
+LLM_FAILOVER_MODELS = [model.strip() for model in os.getenv("SPEAR_LLM_FAILOVER_MODELS", "").split(",") if model.strip()]
+LLM_HEDGE_ENABLED = os.getenv("SPEAR_LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_QUANTILE = float(os.getenv("SPEAR_LLM_HEDGE_QUANTILE", "0.95"))  # Hedge once a call is slower than this
+LLM_HEDGE_MIN_DELAY = float(os.getenv("SPEAR_LLM_HEDGE_MIN_DELAY", "2"))  # Seconds; also used until latencies are known
+LLM_LATENCY_WINDOW = 200  # Recent successful calls per model kept for the hedge delay
+
+# OpenRouter attribution headers sent with every request
+EXTRA_HEADERS = {
+    "HTTP-Referer": "https://spear-ai.local",
+    "X-Title": "SPEAR AI Security Analyzer"
+}
+
 # System prompt for the cybersecurity analyst
 SYSTEM_PROMPT = """You are an expert cybersecurity analyst specializing in phishing detection and social engineering analysis. Your role is to comprehensively analyze potentially malicious content (URLs, emails, SMS messages) and provide detailed security assessments.
 
@@ -68,6 +105,84 @@ Your analysis must include ALL of the following sections in this exact format:
 
 Be thorough and provide actionable intelligence. All sections are mandatory."""
 
+# Report sections whose parsed fields are emitted as soon as the section is complete when streaming
+STREAM_SECTIONS = {
+    "Anomaly Detection": "anomalyDetection",
+    "Risk Classification": "riskAssessment",
+    "Mitigation Recommendations": "mitigationRecommendations"
+}
+
+# Prompt templates. Bump PROMPT_VERSION whenever SYSTEM_PROMPT, the user
+# prompt or a template changes: it is part of every LLM cache key.
+PROMPT_VERSION = "1"
+PROMPT_TEMPLATES = {
+    # Full DeepSeek analysis
+    "analyze": {
+        "instruction": "Provide a COMPLETE analysis following ALL sections in the system prompt. Be specific and thorough.",
+        "max_tokens": 2000,
+        "temperature": 0.4,
+        "failure_label": "LLM analysis failed"
+    },
+    # Gemini secondary validation
+    "validate": {
+        "instruction": "Provide a concise security assessment focusing on validation and key indicators.",
+        "max_tokens": 1500,
+        "temperature": 0.3,
+        "failure_label": "Gemini validation failed"
+    },
+    # Second opinion in dual analysis
+    "expert": {
+        "instruction": "Please provide your expert cybersecurity analysis of this content.",
+        "max_tokens": 1000,
+        "temperature": 0.3,
+        "failure_label": "Analysis failed"
+    }
+}
+
+# Errors worth retrying on the same model; anything else moves on to the next model in the chain
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError, httpx.TimeoutException, httpx.TransportError,
+    APIConnectionError, RateLimitError, InternalServerError
+)
+
+
+class LatencyTracker:
+    """Rolling latencies of successful calls per model, used to pick the hedge delay"""
+    
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}  # model -> deque of seconds
+    
+    def record(self, model: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(seconds)
+    
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        """Latency quantile in seconds, or None before enough calls were seen"""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < 20:
+            return None
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+    
+    def stats(self) -> dict:
+        with self._lock:
+            models = {model: sorted(samples) for model, samples in self._samples.items()}
+        return {
+            model: {
+                "calls": len(samples),
+                "p50_ms": round(samples[len(samples) // 2] * 1000),
+                "p95_ms": round(samples[min(int(0.95 * len(samples)), len(samples) - 1)] * 1000)
+            }
+            for model, samples in models.items() if samples
+        }
+
+
+def retry_delay(retry: int) -> float:
+    """Full-jitter exponential backoff before the given retry (1-based)"""
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** (retry - 1)))
+
 
 class LLMAnalyzer:
     """
@@ -77,16 +192,34 @@ class LLMAnalyzer:
     
     def __init__(self):
         self.client = None
+        self.async_client = None
         self.is_configured = False
+        self.cache = AnalysisCache() if LLM_CACHE_ENABLED else None
+        self.latencies = LatencyTracker()
+        self.scheduler = LLMScheduler()  # Per-model RPM/TPM budgets shared by every call
+        self.flights = SingleFlight("llm")  # Identical analyses in flight share one OpenRouter call
+        self._counters = Counter()  # retries, failovers, hedges fired/won, deadline misses
+        self._counters_lock = threading.Lock()
         self._initialize()
     
     def _initialize(self):
-        """Initialize the OpenAI client for OpenRouter"""
+        """Initialize the OpenAI clients for OpenRouter"""
         if OPENROUTER_API_KEY and OPENROUTER_API_KEY.strip():
             self.client = OpenAI(
                 base_url=OPENROUTER_BASE_URL,
                 api_key=OPENROUTER_API_KEY,
             )
+            # One pooled HTTP client shared by all async calls
+            self.async_client = AsyncOpenAI(
+                base_url=OPENROUTER_BASE_URL,
+                api_key=OPENROUTER_API_KEY,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=LLM_MAX_CONNECTIONS
+                    )
+                )
+            )
             self.is_configured = True
             print(f"[OK] Dual LLM Analyzer configured:")
             print(f"    - Primary: {PRIMARY_MODEL}")
@@ -95,7 +228,8 @@ class LLMAnalyzer:
             print("[!] LLM Analyzer not configured - OPENROUTER_API_KEY not set")
             self.is_configured = False
     
-    def analyze(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float) -> dict:
+    def analyze(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float,
+                use_cache: bool = True) -> dict:
         """
         Perform comprehensive LLM-based security analysis including anomaly detection,
         risk classification, and mitigation recommendations.
@@ -105,15 +239,470 @@ class LLMAnalyzer:
             content_type: Type of content ("url", "email", "sms")
             bert_threat_level: Threat level from BERT model
             bert_confidence: Confidence score from BERT model
-            
+            use_cache: Serve a cached analysis if one exists (a fresh result is always stored)
+        
         Returns:
             dict with comprehensive analysis including anomalies, risk, and mitigations
         """
         if not self.is_configured:
             return self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
         
-        # Build the user prompt with context
-        user_prompt = f"""Analyze the following {content_type.upper()} for potential phishing or social engineering threats.
+        return self._run("analyze", PRIMARY_MODEL, content, content_type, bert_threat_level, bert_confidence, use_cache)
+    
+    async def analyze_async(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float,
+                            timeout: Optional[float] = PRIMARY_TIMEOUT, use_cache: bool = True,
+                            priority: str = "interactive") -> dict:
+        """
+        Async version of analyze() using the shared pooled AsyncOpenAI client.
+        
+        Args:
+            timeout: Seconds to wait for the model before giving up (None = no limit)
+            priority: "interactive" or "bulk"; bulk calls yield quota to interactive ones
+        """
+        if not self.is_configured:
+            return self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
+        
+        return await self._run_async(
+            "analyze", PRIMARY_MODEL, content, content_type, bert_threat_level, bert_confidence, timeout, use_cache,
+            priority
+        )
+    
+    def _run(self, template: str, model: str, content: str, content_type: str,
+             bert_threat_level: str, bert_confidence: float, use_cache: bool = True) -> dict:
+        """Run a prompt template against a model with the sync client"""
+        cache_key, cached = self._cache_lookup(template, model, content, content_type, bert_threat_level, use_cache)
+        if cached is not None:
+            return cached
+        
+        flight_key = self._flight_key(template, model, content, content_type, bert_threat_level, "sync")
+        return self.flights.run(flight_key, lambda: self._call(
+            template, model, content, content_type, bert_threat_level, bert_confidence, cache_key
+        ))
+    
+    def _call(self, template: str, model: str, content: str, content_type: str, bert_threat_level: str,
+              bert_confidence: float, cache_key: Optional[str]) -> dict:
+        """Call the model with the sync client and cache a successful result"""
+        params = self._completion_params(template, model, content, content_type, bert_threat_level, bert_confidence)
+        start = time.monotonic()
+        try:
+            timeout = SECONDARY_TIMEOUT if model == SECONDARY_MODEL else PRIMARY_TIMEOUT
+            response, winner, attempts = self._complete(params, timeout)
+            result = self._build_result(response, winner)
+        except Exception as e:
+            return self._build_failure(e, model, PROMPT_TEMPLATES[template]["failure_label"], content, content_type)
+        
+        result.update(wait_ms=round((time.monotonic() - start) * 1000), attempts=attempts, hedged=False)
+        self._cache_store(cache_key, result)
+        return result
+    
+    async def _run_async(self, template: str, model: str, content: str, content_type: str,
+                         bert_threat_level: str, bert_confidence: float,
+                         timeout: Optional[float] = None, use_cache: bool = True,
+                         priority: str = "interactive") -> dict:
+        """
+        Run a prompt template against a model with the async client.
+        Concurrent identical requests await a single call and share its result
+        (marked "coalesced" for the callers that joined).
+        """
+        cache_key, cached = await self._cache_lookup_async(template, model, content, content_type, bert_threat_level,
+                                                           use_cache)
+        if cached is not None:
+            return cached
+        
+        flight_key = self._flight_key(template, model, content, content_type, bert_threat_level, priority)
+        result, joined = await self.flights.run_async(flight_key, lambda: self._call_async(
+            template, model, content, content_type, bert_threat_level, bert_confidence, cache_key, timeout, priority
+        ))
+        return {**result, "coalesced": True} if joined else result
+    
+    async def _call_async(self, template: str, model: str, content: str, content_type: str,
+                          bert_threat_level: str, bert_confidence: float, cache_key: Optional[str],
+                          timeout: Optional[float], priority: str) -> dict:
+        """Call the model with the async client and cache a successful result"""
+        params = self._completion_params(template, model, content, content_type, bert_threat_level, bert_confidence)
+        start = time.monotonic()
+        try:
+            response, winner, attempts, hedged = await self._complete_async(params, timeout, priority=priority)
+            metrics.LLM_PHASE_SECONDS.observe(time.monotonic() - start, model=winner, phase="total",
+                                              **metrics.request_labels())
+            result = self._build_result(response, winner)
+        except Exception as e:
+            return self._build_failure(e, model, PROMPT_TEMPLATES[template]["failure_label"], content, content_type)
+        
+        result.update(wait_ms=round((time.monotonic() - start) * 1000), attempts=attempts, hedged=hedged)
+        self._cache_store(cache_key, result)
+        return result
+    
+    def _flight_key(self, template: str, model: str, content: str, content_type: str,
+                    bert_threat_level: str, lane: str) -> str:
+        """In-flight key: the cache key's inputs plus the lane (sync client or call priority)"""
+        prompt_version = f"{template}:v{PROMPT_VERSION}"
+        return content_key(lane, analysis_key(model, prompt_version, content, content_type, bert_threat_level))
+    
+    def _model_chain(self, model: str) -> List[str]:
+        """The requested model followed by the configured failover models"""
+        return [model] + [fallback for fallback in LLM_FAILOVER_MODELS if fallback != model]
+    
+    @staticmethod
+    def _estimate_tokens(params: dict) -> int:
+        """Rough prompt + completion tokens of a call (about four characters per token)"""
+        prompt_chars = sum(len(message["content"]) for message in params["messages"])
+        return prompt_chars // 4 + params["max_tokens"]
+    
+    def _count(self, counter: str) -> None:
+        with self._counters_lock:
+            self._counters[counter] += 1
+    
+    def _complete(self, params: dict, timeout: Optional[float]) -> tuple:
+        """
+        Blocking completion with retries and failover (no hedging).
+        
+        Returns:
+            (response, model that answered, attempts made)
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        estimate = self._estimate_tokens(params)
+        attempts = 0
+        last_error = None
+        
+        for index, model in enumerate(self._model_chain(params["model"])):
+            if deadline is not None and deadline <= time.monotonic():
+                break
+            if index:
+                self._count("failovers")
+            for retry in range(LLM_RETRIES + 1):
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if retry:
+                    delay = retry_delay(retry)
+                    if remaining is not None and delay >= remaining:
+                        break
+                    self._count("retries")
+                    time.sleep(delay)
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                
+                try:
+                    self.scheduler.acquire_blocking(model, estimate, remaining)
+                except RateLimited as e:
+                    last_error = e
+                    break
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                
+                attempts += 1
+                start = time.monotonic()
+                try:
+                    response = self.client.chat.completions.create(
+                        **{**params, "model": model},
+                        timeout=min(LLM_ATTEMPT_TIMEOUT, remaining) if remaining is not None else LLM_ATTEMPT_TIMEOUT
+                    )
+                except Exception as e:
+                    last_error = e
+                    if isinstance(e, RateLimitError):
+                        self.scheduler.penalize(model)
+                    if not isinstance(e, TRANSIENT_ERRORS):
+                        break
+                    continue
+                self.latencies.record(model, time.monotonic() - start)
+                self.scheduler.settle(model, estimate, response.usage.total_tokens if response.usage else None)
+                return response, model, attempts
+        
+        self._count("exhausted")
+        raise last_error or asyncio.TimeoutError(f"no response within {timeout:g}s deadline")
+    
+    async def _complete_async(self, params: dict, timeout: Optional[float], attempt=None,
+                              priority: str = "interactive") -> tuple:
+        """
+        Completion with a deadline, jittered retries on transient errors,
+        failover through LLM_FAILOVER_MODELS and optional hedging. Every
+        attempt first waits for the model's rate-limit budget; a model whose
+        budget cannot be had before the deadline is skipped for the next one.
+        
+        Args:
+            params: Chat completion parameters for the requested model
+            timeout: Seconds allowed for the whole call, retries included (None = no limit)
+            attempt: Coroutine function (params, timeout, priority) -> (response, model,
+                {model: tokens used} for the calls that lost a hedge race) making one
+                attempt; defaults to a hedged completion
+            priority: "interactive" or "bulk"
+        
+        Returns:
+            (response, model that answered, attempts made, whether a hedge won)
+        """
+        attempt = attempt or self._attempt_async
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        estimate = self._estimate_tokens(params)
+        attempts = 0
+        last_error = None
+        
+        for index, model in enumerate(self._model_chain(params["model"])):
+            if deadline is not None and deadline <= loop.time():
+                break
+            if index:
+                self._count("failovers")
+            for retry in range(LLM_RETRIES + 1):
+                remaining = deadline - loop.time() if deadline is not None else None
+                if retry:
+                    delay = retry_delay(retry)
+                    if remaining is not None and delay >= remaining:
+                        break
+                    self._count("retries")
+                    await asyncio.sleep(delay)
+                    remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                
+                try:
+                    waited = await self.scheduler.acquire(model, estimate, priority, timeout=remaining)
+                except RateLimited as e:
+                    last_error = e
+                    break
+                metrics.LLM_PHASE_SECONDS.observe(waited, model=model, phase="quota_wait", **metrics.request_labels())
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                
+                attempts += 1
+                attempt_timeout = min(LLM_ATTEMPT_TIMEOUT, remaining) if remaining is not None else LLM_ATTEMPT_TIMEOUT
+                try:
+                    with metrics.LLM_IN_FLIGHT.track(model=model):
+                        response, winner, losers = await attempt({**params, "model": model}, attempt_timeout, priority)
+                except Exception as e:
+                    last_error = e
+                    if isinstance(e, RateLimitError):
+                        self.scheduler.penalize(model)
+                    if not isinstance(e, TRANSIENT_ERRORS):
+                        break
+                    continue
+                for loser, used in losers.items():
+                    self.scheduler.settle(loser, estimate, used)  # Both hedged calls reserved the estimate
+                usage = getattr(response, "usage", None)  # Streams settle once their usage arrives
+                if usage is not None:
+                    self.scheduler.settle(winner, estimate, usage.total_tokens)
+                return response, winner, attempts, winner != model
+        
+        self._count("exhausted")
+        raise last_error or asyncio.TimeoutError(f"no response within {timeout:g}s deadline")
+    
+    async def _open_stream(self, params: dict, timeout: float, priority: str = "interactive") -> tuple:
+        """One attempt at opening a streamed completion (streams are never hedged)"""
+        stream = await asyncio.wait_for(
+            self.async_client.chat.completions.create(**params, stream=True, stream_options={"include_usage": True}),
+            timeout=timeout
+        )
+        return stream, params["model"], {}
+    
+    async def _timed_create(self, params: dict):
+        """One completion call, recording its latency when it succeeds"""
+        start = time.monotonic()
+        response = await self.async_client.chat.completions.create(**params)
+        self.latencies.record(params["model"], time.monotonic() - start)
+        return response
+    
+    async def _attempt_async(self, params: dict, timeout: float, priority: str = "interactive") -> tuple:
+        """
+        One attempt, hedged when enabled: if the model has not answered within
+        its recent p95 latency, the same prompt goes to SECONDARY_MODEL and the
+        first successful response wins; the other call is cancelled. A hedge
+        is only sent when SECONDARY_MODEL has rate-limit budget to spare.
+        
+        Returns:
+            (response, model that answered, {model: tokens used} for the call
+            that lost the race: its usage if it also answered, else 0)
+        """
+        model = params["model"]
+        if not LLM_HEDGE_ENABLED or model == SECONDARY_MODEL:
+            return await asyncio.wait_for(self._timed_create(params), timeout=timeout), model, {}
+        
+        hedge_delay = max(self.latencies.quantile(model, LLM_HEDGE_QUANTILE) or 0.0, LLM_HEDGE_MIN_DELAY)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        tasks = {asyncio.ensure_future(self._timed_create(params)): model}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=min(hedge_delay, timeout))
+            if not done and self.scheduler.try_acquire(SECONDARY_MODEL, self._estimate_tokens(params), priority):
+                self._count("hedges_fired")
+                hedge = {**params, "model": SECONDARY_MODEL}
+                tasks[asyncio.ensure_future(self._timed_create(hedge))] = SECONDARY_MODEL
+            
+            last_error = None
+            pending = set(tasks)
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] != model:
+                            self._count("hedges_won")
+                        return task.result(), tasks[task], self._loser_usage(tasks, task)
+                    last_error = task.exception()
+            if last_error is not None and not pending:
+                raise last_error
+            raise asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    @staticmethod
+    def _loser_usage(tasks: dict, winner: asyncio.Task) -> dict:
+        """Tokens used by the hedged calls that did not win: their usage if they answered too, else 0"""
+        losers = {}
+        for task, model in tasks.items():
+            if task is winner:
+                continue
+            usage = None
+            if task.done() and not task.cancelled() and task.exception() is None:
+                usage = getattr(task.result(), "usage", None)
+            losers[model] = usage.total_tokens if usage is not None else 0
+        return losers
+    
+    async def analyze_stream(self, content: str, content_type: str, bert_threat_level: str,
+                             bert_confidence: float, timeout: Optional[float] = PRIMARY_TIMEOUT,
+                             use_cache: bool = True, priority: str = "interactive") -> AsyncIterator[tuple]:
+        """
+        Streaming version of analyze_async().
+        
+        Yields (event, data) pairs:
+            ("start", {"model", "cached"}) before the model is called
+            ("token", {"text"}) for every chunk of generated text
+            ("section", {"name", "field", "data"}) once a report section with
+                structured fields (see STREAM_SECTIONS) has been fully received
+            ("done", result) with the same result dict analyze_async() returns
+        
+        Args:
+            timeout: Seconds allowed for the whole stream (None = no limit)
+        """
+        if not self.is_configured:
+            yield "done", self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
+            return
+        
+        async for event in self._stream_async("analyze", PRIMARY_MODEL, content, content_type, bert_threat_level,
+                                              bert_confidence, timeout, use_cache, priority):
+            yield event
+    
+    async def analyze_with_gemini_stream(self, content: str, content_type: str, bert_threat_level: str,
+                                         bert_confidence: float, timeout: Optional[float] = SECONDARY_TIMEOUT,
+                                         use_cache: bool = True, priority: str = "interactive") -> AsyncIterator[tuple]:
+        """Streaming version of analyze_with_gemini_async(); yields the same events as analyze_stream()"""
+        if not self.is_configured:
+            yield "done", self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
+            return
+        
+        async for event in self._stream_async("validate", SECONDARY_MODEL, content, content_type, bert_threat_level,
+                                              bert_confidence, timeout, use_cache, priority):
+            yield event
+    
+    async def _stream_async(self, template: str, model: str, content: str, content_type: str,
+                            bert_threat_level: str, bert_confidence: float, timeout: Optional[float],
+                            use_cache: bool, priority: str) -> AsyncIterator[tuple]:
+        """Stream a prompt template from a model (see analyze_stream for the events)"""
+        cache_key, cached = await self._cache_lookup_async(template, model, content, content_type, bert_threat_level,
+                                                           use_cache)
+        if cached is not None:
+            yield "start", {"model": model, "cached": True}
+            yield "token", {"text": cached["analysis"]}
+            if cached.get("parsed"):
+                for section, field in STREAM_SECTIONS.items():
+                    yield "section", {"name": section, "field": field, "data": cached["parsed"][field]}
+            yield "done", cached
+            return
+        
+        yield "start", {"model": model, "cached": False}
+        
+        params = self._completion_params(template, model, content, content_type, bert_threat_level, bert_confidence)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + timeout if timeout is not None else None
+        parser = AnalysisParser()
+        text = ""
+        tokens_used = None
+        stream = None
+        parse_seconds = 0.0  # Parsing is spread over the stream, so it is summed per chunk
+        labels = metrics.request_labels()
+        
+        try:
+            # Retries and failover are only possible until the first token has been sent
+            stream, winner, attempts, _ = await self._complete_async(
+                params, timeout, attempt=self._open_stream, priority=priority
+            )
+            while True:
+                remaining = deadline - loop.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    raise asyncio.TimeoutError()
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=remaining)
+                except StopAsyncIteration:
+                    break
+                
+                if chunk.usage:
+                    tokens_used = chunk.usage.total_tokens
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                
+                delta = chunk.choices[0].delta.content
+                if not text:
+                    metrics.LLM_PHASE_SECONDS.observe(loop.time() - start, model=winner, phase="first_token", **labels)
+                text += delta
+                yield "token", {"text": delta}
+                
+                parse_start = time.perf_counter()
+                completed = parser.feed(delta)
+                parse_seconds += time.perf_counter() - parse_start
+                for event in self._section_events(parser, completed):
+                    yield "section", event
+        except Exception as e:
+            yield "done", self._build_failure(
+                e, model, PROMPT_TEMPLATES[template]["failure_label"], content, content_type
+            )
+            return
+        finally:
+            if stream is not None:
+                # Failed, timed-out and cancelled streams settle too; without usage the estimate stands
+                self.scheduler.settle(winner, self._estimate_tokens(params), tokens_used)
+                await stream.close()
+        
+        # The final section ends with the stream
+        parse_start = time.perf_counter()
+        completed = parser.close()
+        metrics.LLM_PARSE_SECONDS.observe(parse_seconds + time.perf_counter() - parse_start, model=winner, **labels)
+        metrics.LLM_PHASE_SECONDS.observe(loop.time() - start, model=winner, phase="total", **labels)
+        for event in self._section_events(parser, completed):
+            yield "section", event
+        
+        result = {
+            "success": True,
+            "analysis": text,
+            "model": winner,
+            "tokens_used": tokens_used,
+            "parsed": parser.result(),
+            "wait_ms": round((loop.time() - start) * 1000),
+            "attempts": attempts,
+            "hedged": False
+        }
+        self._cache_store(cache_key, result)
+        yield "done", result
+    
+    def _section_events(self, parser: AnalysisParser, completed: list) -> list:
+        """Structured fields of the report sections that just completed"""
+        sections = [section for section in completed if section in STREAM_SECTIONS]
+        if not sections:
+            return []
+        parsed = parser.result()
+        return [
+            {"name": section, "field": STREAM_SECTIONS[section], "data": parsed[STREAM_SECTIONS[section]]}
+            for section in sections
+        ]
+    
+    def _build_user_prompt(self, content: str, content_type: str, bert_threat_level: str,
+                           bert_confidence: float, instruction: str) -> str:
+        """Build the user prompt with content and BERT context"""
+        return f"""Analyze the following {content_type.upper()} for potential phishing or social engineering threats.
 
 **Content to analyze:**
 ```
@@ -124,119 +713,129 @@ class LLMAnalyzer:
 - Threat Level: {bert_threat_level.upper()}
 - Confidence: {bert_confidence}%
 
-Provide a COMPLETE analysis following ALL sections in the system prompt. Be specific and thorough."""
-
-        try:
-            response = self.client.chat.completions.create(
-                model=PRIMARY_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.4,
-                extra_headers={
-                    "HTTP-Referer": "https://spear-ai.local",
-                    "X-Title": "SPEAR AI Security Analyzer"
-                }
-            )
-            
-            analysis_text = response.choices[0].message.content
-            
-            # Parse the LLM response to extract structured data
-            parsed_data = self._parse_llm_analysis(analysis_text)
-            
-            return {
-                "success": True,
-                "analysis": analysis_text,
-                "model": PRIMARY_MODEL,
-                "tokens_used": response.usage.total_tokens if response.usage else None,
-                "parsed": parsed_data
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "analysis": f"LLM analysis failed: {str(e)}",
-                "error": str(e),
-                "model": PRIMARY_MODEL,
-                "parsed": self._get_fallback_parsed_data(content, content_type)
-            }
+{instruction}"""
     
-    def _parse_llm_analysis(self, analysis_text: str) -> dict:
-        """Parse LLM analysis text to extract structured data"""
-        import re
-        
-        # Extract risk level
-        risk_match = re.search(r'\*\*Risk Level\*\*:\s*(CRITICAL|HIGH|MEDIUM|LOW)', analysis_text, re.IGNORECASE)
-        risk_level = risk_match.group(1).upper() if risk_match else "MEDIUM"
-        
-        # Extract risk score
-        score_match = re.search(r'\*\*Risk Score\*\*:\s*(\d+)', analysis_text)
-        risk_score = int(score_match.group(1)) if score_match else 50
-        
-        # Extract anomaly score
-        anomaly_match = re.search(r'\*\*Anomaly Score\*\*:\s*(\d+)', analysis_text)
-        anomaly_score = int(anomaly_match.group(1)) if anomaly_match else 0
-        
-        # Extract risk category
-        category_match = re.search(r'\*\*Risk Category\*\*:\s*([^\n]+)', analysis_text)
-        category = category_match.group(1).strip() if category_match else "Unknown"
-        
-        # Extract anomalies (bullet points under Detected Anomalies)
-        anomalies = []
-        anomaly_section = re.search(r'\*\*Detected Anomalies\*\*:(.*?)(?=\*\*|##|$)', analysis_text, re.DOTALL)
-        if anomaly_section:
-            anomalies = [line.strip('• ').strip() for line in anomaly_section.group(1).split('\n') 
-                        if line.strip().startswith('•')]
-        
-        # Extract risk factors
-        factors = []
-        factor_section = re.search(r'\*\*Risk Factors\*\*:(.*?)(?=##|$)', analysis_text, re.DOTALL)
-        if factor_section:
-            factors = [line.strip('• ').strip() for line in factor_section.group(1).split('\n') 
-                      if line.strip().startswith('•')]
-        
-        # Extract strategies
-        strategies = []
-        strategy_section = re.search(r'### Security Strategies(.*?)(?=###|##|$)', analysis_text, re.DOTALL)
-        if strategy_section:
-            strategies = [line.strip('• ').strip() for line in strategy_section.group(1).split('\n') 
-                         if line.strip().startswith('•')]
-        
-        # Extract incident response
-        incident_response = []
-        incident_section = re.search(r'### Incident Response(.*?)(?=###|##|$)', analysis_text, re.DOTALL)
-        if incident_section:
-            incident_response = [line.strip('• ').strip() for line in incident_section.group(1).split('\n') 
-                                if line.strip().startswith('•')]
-        
-        # Extract patterns
-        patterns = []
-        pattern_match = re.search(r'\*\*Behavioral Patterns\*\*:\s*([^\n]+)', analysis_text)
-        if pattern_match:
-            patterns = [p.strip() for p in pattern_match.group(1).split(',')]
+    def _completion_params(self, template: str, model: str, content: str, content_type: str,
+                           bert_threat_level: str, bert_confidence: float) -> dict:
+        """Chat completion parameters shared by the sync and async clients"""
+        spec = PROMPT_TEMPLATES[template]
+        user_prompt = self._build_user_prompt(
+            content, content_type, bert_threat_level, bert_confidence, spec["instruction"]
+        )
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": spec["max_tokens"],
+            "temperature": spec["temperature"],
+            "extra_headers": EXTRA_HEADERS
+        }
+    
+    def _cache_lookup(self, template: str, model: str, content: str, content_type: str,
+                      bert_threat_level: str, use_cache: bool) -> tuple:
+        """Return (cache key, cached result or None)"""
+        if self.cache is None:
+            return None, None
+        
+        cache_key = self.cache.key(model, f"{template}:v{PROMPT_VERSION}", content, content_type, bert_threat_level)
+        if not use_cache:
+            return cache_key, None
+        return cache_key, self._cached_result(self.cache.get(cache_key), model)
+    
+    async def _cache_lookup_async(self, template: str, model: str, content: str, content_type: str,
+                                  bert_threat_level: str, use_cache: bool) -> tuple:
+        """_cache_lookup() for the async paths: SQLite is read off the event loop"""
+        if self.cache is None:
+            return None, None
         
+        cache_key = self.cache.key(model, f"{template}:v{PROMPT_VERSION}", content, content_type, bert_threat_level)
+        if not use_cache:
+            return cache_key, None
+        return cache_key, self._cached_result(await self.cache.get_async(cache_key), model)
+    
+    @staticmethod
+    def _cached_result(entry: Optional[dict], model: str) -> Optional[dict]:
+        if entry is None:
+            return None
         return {
-            "riskAssessment": {
-                "level": risk_level,
-                "score": risk_score,
-                "factors": factors[:10],  # Limit to 10
-                "category": category
-            },
-            "anomalyDetection": {
-                "hasAnomalies": len(anomalies) > 0,
-                "anomalies": anomalies[:15],  # Limit to 15
-                "anomalyScore": anomaly_score,
-                "patterns": patterns[:8]  # Limit to 8
-            },
-            "mitigationRecommendations": {
-                "strategies": strategies[:10],
-                "incidentResponse": incident_response[:8],
-                "policyAlignment": ["NIST CSF", "ISO/IEC 27001", "CIS Controls"]
-            }
+            "success": True,
+            "analysis": entry["analysis"],
+            "model": entry.get("model") or model,
+            "tokens_used": entry.get("tokens_used"),
+            "parsed": entry.get("parsed"),
+            "cached": True
+        }
+    
+    def _cache_store(self, cache_key: Optional[str], result: dict) -> None:
+        """Cache a successful result (the SQLite write happens in the background)"""
+        if cache_key is not None and result.get("success"):
+            self.cache.set(cache_key, result)
+    
+    def call_stats(self) -> dict:
+        """Retry, failover and hedging counters plus recent per-model latencies"""
+        with self._counters_lock:
+            counters = dict(self._counters)
+        return {
+            "hedging": LLM_HEDGE_ENABLED,
+            "failover_models": LLM_FAILOVER_MODELS,
+            "retries": counters.get("retries", 0),
+            "failovers": counters.get("failovers", 0),
+            "hedges_fired": counters.get("hedges_fired", 0),
+            "hedges_won": counters.get("hedges_won", 0),
+            "exhausted": counters.get("exhausted", 0),
+            "latency": self.latencies.stats()
         }
     
+    def cache_stats(self) -> dict:
+        """LLM analysis cache statistics"""
+        if self.cache is None:
+            return {"enabled": False}
+        return self.cache.stats()
+    
+    async def cache_stats_async(self) -> dict:
+        """cache_stats() without counting the SQLite table on the event loop"""
+        if self.cache is None:
+            return {"enabled": False}
+        return await self.cache.stats_async()
+    
+    def _build_result(self, response, model: str) -> dict:
+        """Convert a chat completion into an analysis result"""
+        analysis_text = response.choices[0].message.content
+        
+        # Parse the LLM response to extract structured data
+        with metrics.LLM_PARSE_SECONDS.time(model=model, **metrics.request_labels()):
+            parsed_data = self._parse_llm_analysis(analysis_text)
+        
+        return {
+            "success": True,
+            "analysis": analysis_text,
+            "model": model,
+            "tokens_used": response.usage.total_tokens if response.usage else None,
+            "parsed": parsed_data
+        }
+    
+    def _build_failure(self, error: Exception, model: str, label: str, content: str, content_type: str) -> dict:
+        """Convert an exception into a failed analysis result"""
+        timed_out = isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException, APITimeoutError))
+        message = "timed out" if timed_out and not str(error) else str(error)
+        failure = {
+            "success": False,
+            "analysis": f"{label}: {message}",
+            "error": message,
+            "model": model,
+            "timed_out": timed_out,
+            "parsed": self._get_fallback_parsed_data(content, content_type)
+        }
+        if isinstance(error, RateLimited):
+            failure["retry_after"] = round(error.retry_after, 1)
+        return failure
+    
+    def _parse_llm_analysis(self, analysis_text: str) -> dict:
+        """Parse LLM analysis text to extract structured data"""
+        return parse_analysis(analysis_text)
+    
     def _get_fallback_analysis(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float) -> dict:
         """Provide fallback analysis when LLM is unavailable"""
         return {
@@ -247,7 +846,8 @@ Provide a COMPLETE analysis following ALL sections in the system prompt. Be spec
             "parsed": self._get_fallback_parsed_data(content, content_type)
         }
     
-    def analyze_with_gemini(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float) -> dict:
+    def analyze_with_gemini(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float,
+                            use_cache: bool = True) -> dict:
         """
         Perform secondary analysis using Gemini model for validation.
         Uses the same API key through OpenRouter.
@@ -255,53 +855,19 @@ Provide a COMPLETE analysis following ALL sections in the system prompt. Be spec
         if not self.is_configured:
             return self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
         
-        user_prompt = f"""Analyze the following {content_type.upper()} for potential phishing or social engineering threats.
-
-**Content to analyze:**
-```
-{content[:3000]}  
-```
-
-**BERT Model Pre-analysis:**
-- Threat Level: {bert_threat_level.upper()}
-- Confidence: {bert_confidence}%
-
-Provide a concise security assessment focusing on validation and key indicators."""
-
-        try:
-            response = self.client.chat.completions.create(
-                model=SECONDARY_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=1500,
-                temperature=0.3,
-                extra_headers={
-                    "HTTP-Referer": "https://spear-ai.local",
-                    "X-Title": "SPEAR AI Security Analyzer"
-                }
-            )
-            
-            analysis_text = response.choices[0].message.content
-            parsed_data = self._parse_llm_analysis(analysis_text)
-            
-            return {
-                "success": True,
-                "analysis": analysis_text,
-                "model": SECONDARY_MODEL,
-                "tokens_used": response.usage.total_tokens if response.usage else None,
-                "parsed": parsed_data
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "analysis": f"Gemini validation failed: {str(e)}",
-                "error": str(e),
-                "model": SECONDARY_MODEL,
-                "parsed": self._get_fallback_parsed_data(content, content_type)
-            }
+        return self._run("validate", SECONDARY_MODEL, content, content_type, bert_threat_level, bert_confidence, use_cache)
+    
+    async def analyze_with_gemini_async(self, content: str, content_type: str, bert_threat_level: str,
+                                        bert_confidence: float, timeout: Optional[float] = SECONDARY_TIMEOUT,
+                                        use_cache: bool = True, priority: str = "interactive") -> dict:
+        """Async version of analyze_with_gemini() using the shared pooled client"""
+        if not self.is_configured:
+            return self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
+        
+        return await self._run_async(
+            "validate", SECONDARY_MODEL, content, content_type, bert_threat_level, bert_confidence, timeout, use_cache,
+            priority
+        )
     
     def _get_fallback_parsed_data(self, content: str, content_type: str) -> dict:
         """Generate basic fallback data when LLM is unavailable"""
@@ -325,7 +891,8 @@ Provide a concise security assessment focusing on validation and key indicators.
             }
         }
     
-    def analyze_dual(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float) -> dict:
+    def analyze_dual(self, content: str, content_type: str, bert_threat_level: str, bert_confidence: float,
+                     use_cache: bool = True) -> dict:
         """
         Perform dual LLM analysis using both DeepSeek and Gemini models.
         Returns combined insights from both models.
@@ -335,7 +902,7 @@ Provide a concise security assessment focusing on validation and key indicators.
             content_type: Type of content
             bert_threat_level: Threat level from BERT
             bert_confidence: Confidence from BERT
-            
+        
         Returns:
             dict with 'primary', 'secondary', and 'consensus' analyses
         """
@@ -347,15 +914,63 @@ Provide a concise security assessment focusing on validation and key indicators.
             }
         
         # Run primary analysis (DeepSeek)
-        primary_result = self.analyze(content, content_type, bert_threat_level, bert_confidence)
+        primary_result = self.analyze(content, content_type, bert_threat_level, bert_confidence, use_cache)
         
         # Run secondary analysis (Gemini)
         secondary_result = self._analyze_with_model(
-            content, content_type, bert_threat_level, bert_confidence, SECONDARY_MODEL
+            content, content_type, bert_threat_level, bert_confidence, SECONDARY_MODEL, use_cache
         )
         
         # Generate consensus
-        consensus = self._generate_consensus(primary_result, secondary_result)
+        consensus = self.generate_consensus(primary_result, secondary_result)
+        
+        return {
+            "primary": primary_result,
+            "secondary": secondary_result,
+            "consensus": consensus
+        }
+    
+    async def analyze_dual_async(self, content: str, content_type: str, bert_threat_level: str,
+                                 bert_confidence: float, deadline: float = DUAL_DEADLINE,
+                                 use_cache: bool = True, priority: str = "interactive") -> dict:
+        """
+        Async dual LLM analysis.
+        DeepSeek and Gemini run concurrently, each with its own timeout, so
+        latency is the slower of the two rather than their sum. Whatever has
+        arrived when the deadline passes is used for the consensus; models
+        still running are cancelled and reported as timed out.
+        
+        Returns:
+            dict with 'primary', 'secondary', and 'consensus' analyses
+        """
+        if not self.is_configured:
+            return self.analyze_dual(content, content_type, bert_threat_level, bert_confidence)
+        
+        primary_task = asyncio.ensure_future(
+            self.analyze_async(content, content_type, bert_threat_level, bert_confidence,
+                               timeout=PRIMARY_TIMEOUT, use_cache=use_cache, priority=priority)
+        )
+        secondary_task = asyncio.ensure_future(
+            self.analyze_secondary_async(content, content_type, bert_threat_level, bert_confidence,
+                                         use_cache=use_cache, priority=priority)
+        )
+        
+        try:
+            await asyncio.wait([primary_task, secondary_task], timeout=deadline)
+        finally:
+            for task in (primary_task, secondary_task):
+                if not task.done():
+                    task.cancel()
+        
+        deadline_error = asyncio.TimeoutError(f"no response within {deadline:g}s deadline")
+        primary_result = (primary_task.result() if primary_task.done() and not primary_task.cancelled()
+                          else self._build_failure(deadline_error, PRIMARY_MODEL,
+                                                   PROMPT_TEMPLATES["analyze"]["failure_label"], content, content_type))
+        secondary_result = (secondary_task.result() if secondary_task.done() and not secondary_task.cancelled()
+                            else self._build_failure(deadline_error, SECONDARY_MODEL,
+                                                     PROMPT_TEMPLATES["expert"]["failure_label"], content, content_type))
+        
+        consensus = self.generate_consensus(primary_result, secondary_result)
         
         return {
             "primary": primary_result,
@@ -363,57 +978,41 @@ Provide a concise security assessment focusing on validation and key indicators.
             "consensus": consensus
         }
     
+    async def analyze_secondary_async(self, content: str, content_type: str, bert_threat_level: str,
+                                      bert_confidence: float, timeout: Optional[float] = SECONDARY_TIMEOUT,
+                                      use_cache: bool = True, priority: str = "interactive") -> dict:
+        """Gemini half of analyze_dual_async(), for callers that track the two models separately"""
+        if not self.is_configured:
+            return self._get_fallback_analysis(content, content_type, bert_threat_level, bert_confidence)
+        
+        return await self._analyze_with_model_async(
+            content, content_type, bert_threat_level, bert_confidence, SECONDARY_MODEL,
+            timeout=timeout, use_cache=use_cache, priority=priority
+        )
+    
     def _analyze_with_model(self, content: str, content_type: str, 
-                           bert_threat_level: str, bert_confidence: float, model: str) -> dict:
+                           bert_threat_level: str, bert_confidence: float, model: str,
+                           use_cache: bool = True) -> dict:
         """Run analysis with a specific model"""
-        user_prompt = f"""Analyze the following {content_type.upper()} for potential phishing or social engineering threats.
-
-**Content to analyze:**
-```
-{content[:3000]}  
-```
-
-**BERT Model Pre-analysis:**
-- Threat Level: {bert_threat_level.upper()}
-- Confidence: {bert_confidence}%
-
-Please provide your expert cybersecurity analysis of this content."""
-
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=1000,
-                temperature=0.3,
-                extra_headers={
-                    "HTTP-Referer": "https://spear-ai.local",
-                    "X-Title": "SPEAR AI Security Analyzer"
-                }
-            )
-            
-            return {
-                "success": True,
-                "analysis": response.choices[0].message.content,
-                "model": model
-            }
-        except Exception as e:
-            return {
-                "success": False,
-                "analysis": f"Analysis failed: {str(e)}",
-                "error": str(e),
-                "model": model
-            }
+        return self._run("expert", model, content, content_type, bert_threat_level, bert_confidence, use_cache)
     
-    def _generate_consensus(self, primary: dict, secondary: dict) -> str:
+    async def _analyze_with_model_async(self, content: str, content_type: str, bert_threat_level: str,
+                                        bert_confidence: float, model: str, timeout: Optional[float] = None,
+                                        use_cache: bool = True, priority: str = "interactive") -> dict:
+        """Async version of _analyze_with_model()"""
+        return await self._run_async(
+            "expert", model, content, content_type, bert_threat_level, bert_confidence, timeout, use_cache, priority
+        )
+    
+    def generate_consensus(self, primary: dict, secondary: dict) -> str:
         """Generate consensus from both LLM analyses"""
         if not primary.get("success") or not secondary.get("success"):
             if primary.get("success"):
-                return f"Based on primary analysis: {primary['analysis'][:200]}..."
+                note = " (secondary timed out)" if secondary.get("timed_out") else ""
+                return f"Based on primary analysis{note}: {primary['analysis'][:200]}..."
             elif secondary.get("success"):
-                return f"Based on secondary analysis: {secondary['analysis'][:200]}..."
+                note = " (primary timed out)" if primary.get("timed_out") else ""
+                return f"Based on secondary analysis{note}: {secondary['analysis'][:200]}..."
             else:
                 return "Both LLM analyses failed"
         
@@ -432,6 +1031,13 @@ Review both analyses below for comprehensive security assessment."""
     def is_available(self) -> bool:
         """Check if LLM analyzer is available"""
         return self.is_configured
+    
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client and finish pending cache writes"""
+        if self.async_client is not None:
+            await self.async_client.close()
+        if self.cache is not None:
+            self.cache.close()
 
 
 # Singleton instance
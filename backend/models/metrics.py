@@ -0,0 +1,289 @@
+"""
+Prometheus-style metrics
+A small in-process registry of counters, gauges and histograms rendered in
+the Prometheus text exposition format by /metrics. Request labels (endpoint
+and content type) travel with the asyncio task in a context variable, so
+code deep in the pipeline can label what it records without threading them
+through every call.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Metrics configuration
+METRICS_ENABLED = os.getenv("SPEAR_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Histogram buckets in seconds
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)  # In-process stages
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)  # LLM calls and waits
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+CONTENT_TYPE_UNKNOWN = "unknown"
+CONTENT_TYPES = ("url", "email", "sms")  # Anything else is labelled "other" to bound label cardinality
+
+# Labels of the request being served: {"endpoint": ..., "content_type": ...}
+_request_labels: ContextVar[Dict[str, str]] = ContextVar("spear_request_labels", default={})
+
+
+def set_request_labels(endpoint: str, content_type: Optional[str] = None) -> None:
+    """Label everything recorded by the current request (and tasks it starts)"""
+    _request_labels.set({"endpoint": endpoint, "content_type": content_type or CONTENT_TYPE_UNKNOWN})
+
+
+def set_content_type(content_type: str) -> None:
+    """Add the content type to the current request's labels once the handler knows it"""
+    labels = request_labels()
+    labels["content_type"] = content_type if content_type in CONTENT_TYPES else "other"
+    _request_labels.set(labels)
+
+
+def request_labels() -> Dict[str, str]:
+    """Endpoint and content type of the current request ("background" outside one)"""
+    labels = _request_labels.get()
+    return {
+        "endpoint": labels.get("endpoint", "background"),
+        "content_type": labels.get("content_type", CONTENT_TYPE_UNKNOWN)
+    }
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class: one metric family with a fixed set of label names"""
+    
+    kind = "untyped"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+    
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+    
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(Metric):
+    kind = "counter"
+    
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+    
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+    
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+    
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = FAST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, **labels) -> None:
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(round(total, 6))}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """All metric families plus collectors that refresh gauges right before a scrape"""
+    
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+    
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+    
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"[!] Metrics collector failed: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Detection pipeline
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "spear_request_duration_seconds", "End-to-end request latency",
+    ("endpoint", "method", "status"), SLOW_BUCKETS
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "spear_requests_in_flight", "Requests currently being served", ("endpoint",)
+))
+DETECTION_STAGE_SECONDS = REGISTRY.register(Histogram(
+    "spear_detection_stage_seconds", "Time per detection stage (cache, domainIndex, urlLexical, ngram, bert)",
+    ("endpoint", "content_type", "stage")
+))
+DETECTIONS = REGISTRY.register(Counter(
+    "spear_detections_total", "Verdicts by the stage that decided them", ("endpoint", "content_type", "stage")
+))
+
+# BERT inference (batches mix requests, so these carry the model but not the endpoint)
+BERT_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "spear_bert_phase_seconds", "BERT batch time by phase (tokenize, forward, postprocess)", ("model", "phase")
+))
+BERT_BATCH_SIZE = REGISTRY.register(Histogram(
+    "spear_bert_batch_size", "Contents per BERT batch", ("model",), SIZE_BUCKETS
+))
+BERT_SEQUENCES = REGISTRY.register(Histogram(
+    "spear_bert_sequences_per_batch", "Token windows per BERT batch", ("model",), SIZE_BUCKETS
+))
+
+# LLM calls
+LLM_PHASE_SECONDS = REGISTRY.register(Histogram(
+    "spear_llm_phase_seconds",
+    "LLM time by phase (lane_wait, quota_wait, first_token, total)",
+    ("endpoint", "content_type", "model", "phase"), SLOW_BUCKETS
+))
+LLM_PARSE_SECONDS = REGISTRY.register(Histogram(
+    "spear_llm_parse_seconds", "Time to parse an LLM report into structured fields", ("endpoint", "content_type", "model")
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "spear_llm_calls_total", "LLM analyses by outcome (ok, failed, cached, coalesced, skipped)",
+    ("endpoint", "content_type", "model", "outcome")
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "spear_llm_tokens_total", "Tokens reported by OpenRouter", ("endpoint", "content_type", "model")
+))
+LLM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "spear_llm_calls_in_flight", "LLM calls currently waiting on a model", ("model",)
+))
+
+# Refreshed from component stats at scrape time
+CACHE_REQUESTS = REGISTRY.register(Gauge(
+    "spear_cache_requests", "Cache lookups since start by result", ("cache", "tier", "result")
+))
+CACHE_HIT_RATIO = REGISTRY.register(Gauge(
+    "spear_cache_hit_ratio", "Cache hit ratio since start", ("cache", "tier")
+))
+LANE_REQUESTS = REGISTRY.register(Gauge(
+    "spear_lane_requests", "Work admitted to the execution lanes by state (running, queued)", ("lane", "state")
+))
+COALESCED = REGISTRY.register(Gauge(
+    "spear_coalesced_calls", "Calls that joined an identical in-flight call since start", ("kind",)
+))
+JOBS = REGISTRY.register(Gauge(
+    "spear_jobs", "Jobs in the durable queue by status (queued, running, done, failed)", ("status",)
+))
+
+
+def record_llm_result(result: dict, model: Optional[str] = None) -> None:
+    """Count an LLM analysis result and its token usage under the current request labels"""
+    labels = request_labels()
+    model = result.get("model") or model or ""
+    if result.get("skipped"):
+        outcome = "skipped"
+    elif result.get("coalesced"):
+        outcome = "coalesced"
+    elif result.get("cached"):
+        outcome = "cached"
+    else:
+        outcome = "ok" if result.get("success") else "failed"
+    LLM_CALLS.inc(model=model, outcome=outcome, **labels)
+    if outcome == "ok" and result.get("tokens_used"):
+        LLM_TOKENS.inc(result["tokens_used"], model=model, **labels)
+
+
+def render() -> str:
+    return REGISTRY.render()
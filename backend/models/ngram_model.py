@@ -0,0 +1,389 @@
+"""
+Hashed n-gram first-stage classifier
+A linear model over hashed character and word n-grams, stored as NumPy
+arrays and distilled offline from BERT-labelled traffic. In cascade mode it
+screens every item first; only items whose score falls inside the
+uncertainty band are escalated to BERT.
+
+Usage:
+    python -m models.ngram_model label --input traffic.jsonl --output labelled.jsonl
+    python -m models.ngram_model train --data labelled.jsonl
+    python -m models.ngram_model evaluate --data holdout.jsonl
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .cache import resolve_path
+from .phishing_model import PredictionResult
+
+# Cascade configuration
+CASCADE_ENABLED = os.getenv("SPEAR_CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+NGRAM_MODEL_PATH = os.getenv("SPEAR_NGRAM_MODEL_PATH", "cache/ngram_model.npz")  # Relative to backend/
+CASCADE_SAFE_BELOW = float(os.getenv("SPEAR_CASCADE_SAFE_BELOW", "0.05"))  # Scores at or below: benign, no BERT
+CASCADE_PHISHING_ABOVE = float(os.getenv("SPEAR_CASCADE_PHISHING_ABOVE", "0.95"))  # Scores at or above: phishing
+CASCADE_AUDIT_RATE = float(os.getenv("SPEAR_CASCADE_AUDIT_RATE", "0.02"))  # Decided items also sent to BERT
+
+# Feature hashing
+DEFAULT_BUCKETS = 1 << 20
+CHAR_NGRAM_SIZES = (3, 4, 5)
+MAX_FEATURE_CHARS = 4000  # Characters featurized per item
+_PRIME = np.uint64(1099511628211)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_CHAR_SALT = 0x1000193
+_WORD_SALT = np.uint64(0x51ED27)
+_BIGRAM_SALT = np.uint64(0x2545F491)
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+MODEL_FORMAT_VERSION = 1
+
+
+def _bucket(hashes: np.ndarray, buckets: int) -> np.ndarray:
+    """Spread 64-bit hashes over a power-of-two number of buckets"""
+    return ((hashes * _MIX) >> np.uint64(64 - buckets.bit_length() + 1)).astype(np.int64)
+
+
+def featurize(content: str, buckets: int = DEFAULT_BUCKETS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed character 3-5-grams plus word unigrams and bigrams.
+    
+    Args:
+        content: Text content (URL, email, or SMS)
+        buckets: Feature space size (power of two)
+    
+    Returns:
+        (bucket indices, L2-normalized log counts), indices unique
+    """
+    text = " ".join(content.lower().split())[:MAX_FEATURE_CHARS]
+    padded = f" {text} "
+    codes = np.frombuffer(padded.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    
+    parts = []
+    for size in CHAR_NGRAM_SIZES:
+        if len(codes) < size:
+            continue
+        # Polynomial rolling hash over every window of `size` code points (uint64 wrap-around)
+        hashes = np.full(len(codes) - size + 1, _CHAR_SALT * size, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * _PRIME + codes[offset:len(codes) - size + 1 + offset]
+        parts.append(hashes)
+    
+    words = _WORD_PATTERN.findall(text)
+    if words:
+        word_hashes = np.array([zlib.crc32(word.encode("utf-8")) for word in words], dtype=np.uint64)
+        parts.append(word_hashes ^ _WORD_SALT)
+        if len(words) > 1:
+            parts.append((word_hashes[:-1] * _PRIME + word_hashes[1:]) ^ _BIGRAM_SALT)
+    
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    
+    indices, counts = np.unique(_bucket(np.concatenate(parts), buckets), return_counts=True)
+    values = np.log1p(counts).astype(np.float32)
+    values /= np.sqrt(np.dot(values, values))
+    return indices, values
+
+
+class NgramModel:
+    """Logistic regression over hashed n-gram features"""
+    
+    def __init__(self, weights: np.ndarray, bias: float):
+        self.weights = weights
+        self.bias = bias
+        self.buckets = len(weights)
+    
+    @classmethod
+    def empty(cls, buckets: int = DEFAULT_BUCKETS) -> "NgramModel":
+        if buckets & (buckets - 1):
+            raise ValueError("buckets must be a power of two")
+        return cls(np.zeros(buckets, dtype=np.float32), 0.0)
+    
+    @classmethod
+    def load(cls, path: Path) -> "NgramModel":
+        with np.load(path) as data:
+            if int(data["version"]) != MODEL_FORMAT_VERSION:
+                raise ValueError(f"{path} has an unsupported model format")
+            return cls(data["weights"].astype(np.float32), float(data["bias"]))
+    
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as handle:
+            np.savez(handle, weights=self.weights, bias=np.float64(self.bias), version=MODEL_FORMAT_VERSION)
+    
+    def score(self, content: str) -> float:
+        """Phishing probability in [0, 1]"""
+        indices, values = featurize(content, self.buckets)
+        logit = float(np.dot(self.weights[indices], values)) + self.bias
+        return 1 / (1 + math.exp(-max(min(logit, 50.0), -50.0)))
+    
+    def fit(self, contents: List[str], targets: List[float], epochs: int = 5, learning_rate: float = 0.5,
+            l2: float = 1e-6, seed: int = 13) -> None:
+        """
+        Train with AdaGrad SGD on (soft) phishing targets in [0, 1].
+        
+        Args:
+            contents: Training texts
+            targets: BERT phishing probability (or 0/1 label) per text
+            epochs: Passes over the data
+            learning_rate: AdaGrad base step
+            l2: L2 penalty applied to the touched weights
+            seed: Shuffling seed
+        """
+        features = [featurize(content, self.buckets) for content in contents]
+        squared = np.full(self.buckets, 1e-8, dtype=np.float32)
+        bias_squared = 1e-8
+        order = list(range(len(contents)))
+        rng = random.Random(seed)
+        
+        for _ in range(epochs):
+            rng.shuffle(order)
+            for item in order:
+                indices, values = features[item]
+                logit = float(np.dot(self.weights[indices], values)) + self.bias
+                probability = 1 / (1 + math.exp(-max(min(logit, 50.0), -50.0)))
+                error = probability - targets[item]
+                
+                gradient = error * values + l2 * self.weights[indices]
+                squared[indices] += gradient * gradient
+                self.weights[indices] -= learning_rate * gradient / np.sqrt(squared[indices])
+                bias_squared += error * error
+                self.bias -= learning_rate * error / math.sqrt(bias_squared)
+
+
+@dataclass
+class FirstStageResult:
+    """Outcome of screening one item"""
+    score: float
+    prediction: Optional[PredictionResult]  # Verdict to return; None escalates to BERT
+    decided: Optional[bool] = None  # First-stage verdict (is_phishing) when outside the band
+    audited: bool = False  # Decided, but sampled for a BERT agreement check
+
+
+class NgramCascade:
+    """
+    First stage of the detection cascade.
+    Scores outside [safe_below, phishing_above] are answered directly; scores
+    inside the band escalate to BERT. A sample of decided items is escalated
+    anyway so the agreement of direct verdicts with BERT can be measured.
+    """
+    
+    def __init__(self, model_path: str = NGRAM_MODEL_PATH, enabled: bool = CASCADE_ENABLED,
+                 safe_below: float = CASCADE_SAFE_BELOW, phishing_above: float = CASCADE_PHISHING_ABOVE,
+                 audit_rate: float = CASCADE_AUDIT_RATE):
+        self.enabled = enabled
+        self.model_path = resolve_path(model_path) if model_path else None
+        self.model: Optional[NgramModel] = None
+        self.safe_below = safe_below
+        self.phishing_above = phishing_above
+        self.audit_rate = audit_rate
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.decided_safe = 0
+        self.decided_phishing = 0
+        self.escalated = 0
+        self.audited = 0
+        self.audit_agreed = 0
+        self.band_agreed = 0  # Escalated items where the first stage leaned the same way as BERT
+        self.band_checked = 0
+    
+    def load(self) -> None:
+        """Load the trained model when cascade mode is enabled"""
+        if not self.enabled:
+            return
+        if self.model_path is None or not self.model_path.exists():
+            print(f"[!] Cascade enabled but no n-gram model at {self.model_path} - train one with "
+                  "python -m models.ngram_model train")
+            return
+        try:
+            self.model = NgramModel.load(self.model_path)
+            print(f"[OK] Cascade first stage loaded ({self.model.buckets} buckets), "
+                  f"escalating scores in ({self.safe_below}, {self.phishing_above})")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[!] Could not load n-gram model {self.model_path}: {e}")
+    
+    def screen(self, content: str) -> FirstStageResult:
+        """Score content and decide whether BERT is needed"""
+        score = self.model.score(content)
+        if self.safe_below < score < self.phishing_above:
+            with self._lock:
+                self.escalated += 1
+            return FirstStageResult(score=score, prediction=None)
+        
+        is_phishing = score >= self.phishing_above
+        with self._lock:
+            if self.audit_rate > 0 and self._random.random() < self.audit_rate:
+                self.audited += 1
+                return FirstStageResult(score=score, prediction=None, decided=is_phishing, audited=True)
+            if is_phishing:
+                self.decided_phishing += 1
+            else:
+                self.decided_safe += 1
+        
+        raw_score = score if is_phishing else 1 - score
+        return FirstStageResult(
+            score=score,
+            decided=is_phishing,
+            prediction=PredictionResult(
+                raw_label="phishing" if is_phishing else "benign", raw_score=raw_score, is_phishing=is_phishing,
+                confidence=raw_score * 100, stage="ngram"
+            )
+        )
+    
+    def record_bert(self, first: FirstStageResult, prediction: PredictionResult) -> None:
+        """Compare an escalated or audited item's BERT verdict with the first stage"""
+        with self._lock:
+            if first.audited:
+                self.audit_agreed += first.decided == prediction.is_phishing
+            else:
+                self.band_checked += 1
+                self.band_agreed += (first.score >= 0.5) == prediction.is_phishing
+    
+    def stats(self, bert_avg_ms: Optional[float] = None, first_stage_avg_ms: Optional[float] = None) -> dict:
+        if self.model is None:
+            return {"enabled": False}
+        decided = self.decided_safe + self.decided_phishing
+        screened = decided + self.escalated + self.audited
+        stats = {
+            "enabled": True,
+            "band": [self.safe_below, self.phishing_above],
+            "screened": screened,
+            "decided_safe": self.decided_safe,
+            "decided_phishing": self.decided_phishing,
+            "escalated": self.escalated,
+            "escalation_ratio": round((self.escalated + self.audited) / screened, 4) if screened else 0.0,
+            "audited": self.audited,
+            "audit_agreement": round(self.audit_agreed / self.audited, 4) if self.audited else None,
+            "band_agreement": round(self.band_agreed / self.band_checked, 4) if self.band_checked else None
+        }
+        if bert_avg_ms is not None:
+            stats["estimated_saved_ms"] = round(decided * (bert_avg_ms - (first_stage_avg_ms or 0.0)), 1)
+        return stats
+
+
+def read_labelled(path: Path) -> Tuple[List[str], List[float]]:
+    """
+    Load BERT-labelled traffic: JSONL with "content" and either
+    "phishing_probability" (preferred, soft target) or "label".
+    """
+    contents = []
+    targets = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "phishing_probability" in record:
+                target = float(record["phishing_probability"])
+            else:
+                target = 1.0 if str(record["label"]).lower() in ("phishing", "1", "true") else 0.0
+            contents.append(record["content"])
+            targets.append(target)
+    return contents, targets
+
+
+def evaluate_bands(scores: List[float], targets: List[float], bands: Iterable[Tuple[float, float]]) -> List[dict]:
+    """Escalation ratio and agreement of the directly decided items with BERT, per band"""
+    scores = np.asarray(scores)
+    labels = np.asarray(targets) >= 0.5
+    rows = []
+    for safe_below, phishing_above in bands:
+        safe = scores <= safe_below
+        phishing = scores >= phishing_above
+        decided = safe | phishing
+        agreed = (safe & ~labels) | (phishing & labels)
+        rows.append({
+            "band": [safe_below, phishing_above],
+            "escalation_ratio": round(1 - decided.mean(), 4) if len(scores) else 0.0,
+            "decided_agreement": round(agreed.sum() / decided.sum(), 4) if decided.any() else None,
+            "missed_phishing": int((safe & labels).sum())
+        })
+    return rows
+
+
+def _read_contents(path: Path) -> List[str]:
+    """JSONL with a "content" field, or plain text with one item per line"""
+    with open(path, encoding="utf-8") as handle:
+        if path.suffix == ".jsonl":
+            return [json.loads(line)["content"] for line in handle if line.strip()]
+        return [line.rstrip("\n") for line in handle if line.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hashed n-gram first stage for the SPEAR AI detection cascade")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    label = sub.add_parser("label", help="Label traffic with BERT to build a training set")
+    label.add_argument("--input", type=Path, required=True, help="JSONL with 'content', or text with one item per line")
+    label.add_argument("--output", type=Path, required=True)
+    
+    train = sub.add_parser("train", help="Train the n-gram model on BERT-labelled traffic")
+    train.add_argument("--data", type=Path, required=True, help="JSONL with 'content' and 'phishing_probability'/'label'")
+    train.add_argument("-o", "--output", default=NGRAM_MODEL_PATH, help="Model file (relative to backend/)")
+    train.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS)
+    train.add_argument("--epochs", type=int, default=5)
+    
+    evaluate = sub.add_parser("evaluate", help="Escalation ratio and agreement with BERT for several bands")
+    evaluate.add_argument("--data", type=Path, required=True, help="Held-out BERT-labelled JSONL")
+    evaluate.add_argument("-m", "--model", default=NGRAM_MODEL_PATH, help="Model file (relative to backend/)")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "label":
+        from .phishing_model import PhishingDetector
+        
+        contents = _read_contents(args.input)
+        detector = PhishingDetector(batching=False)
+        detector.load()
+        results = detector.predict_many(contents)
+        written = 0
+        with open(args.output, "w", encoding="utf-8") as handle:
+            for content, result in zip(contents, results):
+                if isinstance(result, Exception):
+                    continue
+                probability = result.raw_score if result.is_phishing else 1 - result.raw_score
+                handle.write(json.dumps({
+                    "content": content,
+                    "label": "phishing" if result.is_phishing else "benign",
+                    "phishing_probability": round(probability, 6)
+                }) + "\n")
+                written += 1
+        print(f"[OK] Labelled {written} of {len(contents)} items: {args.output}")
+        return 0
+    
+    contents, targets = read_labelled(args.data)
+    
+    if args.command == "train":
+        model = NgramModel.empty(args.buckets)
+        model.fit(contents, targets, epochs=args.epochs)
+        output_path = resolve_path(args.output)
+        model.save(output_path)
+        training = evaluate_bands([model.score(content) for content in contents], targets, [(0.5, 0.5)])[0]
+        print(f"[OK] Trained on {len(contents)} items, training agreement {training['decided_agreement']}: "
+              f"{output_path}")
+        return 0
+    
+    model = NgramModel.load(resolve_path(args.model))
+    scores = [model.score(content) for content in contents]
+    bands = [(0.5, 0.5), (0.2, 0.8), (0.1, 0.9), (0.05, 0.95), (0.02, 0.98), (0.01, 0.99)]
+    print(f"{'band':<14}{'escalated':>11}{'agreement':>11}{'missed phishing':>17}")
+    for row in evaluate_bands(scores, targets, bands):
+        agreement = "-" if row["decided_agreement"] is None else f"{row['decided_agreement']:.4f}"
+        print(f"{row['band'][0]:<5}- {row['band'][1]:<6}{row['escalation_ratio']:>11.4f}{agreement:>11}"
+              f"{row['missed_phishing']:>17}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+"""
+ONNX Runtime inference backend
+Exports the BERT phishing model to ONNX, optionally applies dynamic INT8
+quantization, and runs it on CPU with configurable thread counts.
+
+Requires the optional packages: pip install onnx onnxruntime
+
+Usage:
+    python -m models.onnx_backend export
+    python -m models.onnx_backend parity --samples samples.txt
+"""
+
+import argparse
+import inspect
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# ONNX Runtime configuration
+ONNX_DIR = os.getenv("SPEAR_ONNX_DIR", "onnx")  # Exported models, relative to backend/
+ONNX_QUANTIZE = os.getenv("SPEAR_ONNX_QUANTIZE", "true").lower() in ("1", "true", "yes")
+ONNX_INTRA_OP_THREADS = int(os.getenv("SPEAR_ONNX_INTRA_OP_THREADS", "0"))  # 0 = ONNX Runtime default
+ONNX_INTER_OP_THREADS = int(os.getenv("SPEAR_ONNX_INTER_OP_THREADS", "1"))
+ONNX_OPSET = 17
+
+# Sample inputs for the parity check when no file is given
+DEFAULT_PARITY_SAMPLES = [
+    "https://www.google.com/search?q=weather",
+    "http://paypa1-secure-login.verify-account.xyz/signin",
+    "Hi team, the quarterly report is attached. Let me know if you have questions.",
+    "URGENT: Your bank account has been suspended. Verify your identity at http://bit.ly/3xYz now!",
+    "Your package could not be delivered. Pay the $1.99 redelivery fee: http://usps-track.info/pay",
+    "Reminder: dentist appointment tomorrow at 10am.",
+]
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+        return onnxruntime
+    except ImportError as e:
+        raise RuntimeError(
+            "ONNX backend requires onnxruntime and onnx: pip install onnx onnxruntime"
+        ) from e
+
+
+def model_paths(model_id: str, model_dir: str = ONNX_DIR) -> tuple:
+    """Return (fp32 path, int8 path) for a model identity"""
+    directory = Path(model_dir)
+    if not directory.is_absolute():
+        directory = BACKEND_DIR / directory
+    stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+    return directory / f"{stem}.onnx", directory / f"{stem}-int8.onnx"
+
+
+def export_onnx(model, tokenizer, output_path: Path) -> None:
+    """Export a Hugging Face sequence classifier to ONNX with dynamic batch and sequence axes"""
+    import torch
+    
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+        
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.wrapped(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            ).logits
+    
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    token_type_ids = sample.get("token_type_ids", torch.zeros_like(sample["input_ids"]))
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False  # TorchScript exporter handles dynamic_axes for BERT reliably
+    
+    with torch.inference_mode():
+        torch.onnx.export(
+            LogitsOnly(model.cpu().eval()),
+            (sample["input_ids"], sample["attention_mask"], token_type_ids),
+            str(output_path),
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "token_type_ids": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"}
+            },
+            opset_version=ONNX_OPSET,
+            **export_kwargs
+        )
+
+
+def quantize_int8(source_path: Path, output_path: Path) -> None:
+    """Apply dynamic INT8 weight quantization"""
+    _require_onnxruntime()
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(str(source_path), str(output_path), weight_type=QuantType.QInt8)
+
+
+class OnnxBackend:
+    """
+    CPU inference through ONNX Runtime.
+    Exported (and quantized) models are cached on disk per model identity,
+    so only the first start pays for the export.
+    """
+    
+    def __init__(self, quantize: bool = ONNX_QUANTIZE, intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+                 inter_op_threads: int = ONNX_INTER_OP_THREADS, model_dir: str = ONNX_DIR):
+        self.quantize = quantize
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.model_dir = model_dir
+        self.session = None
+        self.input_names: List[str] = []
+        self.model_path = None
+    
+    @property
+    def variant(self) -> str:
+        return "onnx-int8" if self.quantize else "onnx"
+    
+    def is_exported(self, model_id: str) -> bool:
+        """Whether the fp32 ONNX export exists (quantization does not need PyTorch weights)"""
+        fp32_path, _ = model_paths(model_id, self.model_dir)
+        return fp32_path.exists()
+    
+    def prepare(self, model, tokenizer, model_id: str) -> None:
+        """
+        Export/quantize if needed, then open an inference session.
+        model may be None when is_exported() is already true.
+        """
+        ort = _require_onnxruntime()
+        fp32_path, int8_path = model_paths(model_id, self.model_dir)
+        
+        if not fp32_path.exists():
+            print(f"[*] Exporting {model_id} to ONNX: {fp32_path}")
+            export_onnx(model, tokenizer, fp32_path)
+        if self.quantize and not int8_path.exists():
+            print(f"[*] Quantizing to INT8: {int8_path}")
+            quantize_int8(fp32_path, int8_path)
+        self.model_path = int8_path if self.quantize else fp32_path
+        
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = self.inter_op_threads
+        options.execution_mode = (ort.ExecutionMode.ORT_PARALLEL if self.inter_op_threads > 1
+                                  else ort.ExecutionMode.ORT_SEQUENTIAL)
+        
+        self.session = ort.InferenceSession(str(self.model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+    
+    def logits(self, encoded) -> np.ndarray:
+        """Run the session on tokenizer output (numpy arrays)"""
+        feeds = {}
+        for name in self.input_names:
+            if name in encoded:
+                feeds[name] = np.asarray(encoded[name], dtype=np.int64)
+            else:
+                feeds[name] = np.zeros_like(np.asarray(encoded["input_ids"], dtype=np.int64))
+        return self.session.run(["logits"], feeds)[0]
+
+
+def check_parity(reference, candidate, samples: List[str]) -> dict:
+    """
+    Compare two loaded PhishingDetectors (e.g. PyTorch vs ONNX) on the same inputs.
+    
+    Returns:
+        dict with label agreement and phishing-probability drift statistics
+    """
+    expected = reference.predict_batch(samples)
+    actual = candidate.predict_batch(samples)
+    
+    def phishing_probability(result):
+        return result.raw_score if result.is_phishing else 1 - result.raw_score
+    
+    drifts = [abs(phishing_probability(a) - phishing_probability(b)) for a, b in zip(expected, actual)]
+    agreements = [a.raw_label == b.raw_label for a, b in zip(expected, actual)]
+    
+    return {
+        "samples": len(samples),
+        "label_agreement": round(sum(agreements) / len(samples), 4) if samples else 1.0,
+        "disagreements": [sample for sample, agree in zip(samples, agreements) if not agree],
+        "mean_score_drift": round(sum(drifts) / len(drifts), 6) if drifts else 0.0,
+        "max_score_drift": round(max(drifts), 6) if drifts else 0.0
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ONNX Runtime backend for the SPEAR AI phishing detector")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    sub.add_parser("export", help="Export (and quantize) the configured model ahead of time")
+    
+    parity = sub.add_parser("parity", help="Compare ONNX predictions against the PyTorch path")
+    parity.add_argument("--samples", help="Text file with one sample per line (default: built-in samples)")
+    parity.add_argument("--no-quantize", action="store_true", help="Check the fp32 ONNX model instead of INT8")
+    
+    args = parser.parse_args(argv)
+    
+    from .phishing_model import PhishingDetector
+    
+    if args.command == "export":
+        detector = PhishingDetector(batching=False, backend="onnx")
+        detector.load()
+        print(f"[OK] ONNX model ready: {detector.onnx.model_path}")
+        return 0
+    
+    samples = DEFAULT_PARITY_SAMPLES
+    if args.samples:
+        with open(args.samples, encoding="utf-8") as handle:
+            samples = [line.strip() for line in handle if line.strip()]
+    
+    reference = PhishingDetector(batching=False, backend="torch")
+    reference.load()
+    candidate = PhishingDetector(batching=False, backend="onnx", onnx_quantize=not args.no_quantize)
+    candidate.load()
+    
+    print(json.dumps(check_parity(reference, candidate, samples), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,85 @@
 """
 BERT-based Phishing Detection Model
 Uses ealvaradob/bert-finetuned-phishing from Hugging Face
+
+torch and transformers are imported by PhishingDetector.load(), not at
+import time. To load without any hub lookups, write a pinned local snapshot
+once and point SPEAR_MODEL_DIR at it:
+    python -m models.phishing_model snapshot --output snapshots/bert-phishing
 """
 
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-import torch
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+from . import metrics
+from .cache import content_key, resolve_path
+from .onnx_backend import OnnxBackend, ONNX_QUANTIZE
+from .singleflight import SingleFlight
+
+# Micro-batching configuration
+BATCH_ENABLED = os.getenv("SPEAR_BATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("SPEAR_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("SPEAR_BATCH_MAX_WAIT_MS", "5"))
+BATCH_CHUNK_SIZE = int(os.getenv("SPEAR_BATCH_CHUNK_SIZE", "32"))
+
+# Inference backend: "torch" (PyTorch) or "onnx" (ONNX Runtime, CPU)
+INFERENCE_BACKEND = os.getenv("SPEAR_INFERENCE_BACKEND", "torch").lower()
+
+# Long-input handling:
+#   "chars"          - cut at MAX_CONTENT_LENGTH characters, then at 512 tokens
+#   "head_tail"      - keep the first TRUNCATION_HEAD_TOKENS tokens and fill the rest from the end
+#   "sliding_window" - score overlapping 512-token windows and aggregate them
+TRUNCATION_MODE = os.getenv("SPEAR_TRUNCATION_MODE", "chars").lower()
+TRUNCATION_HEAD_TOKENS = int(os.getenv("SPEAR_TRUNCATION_HEAD_TOKENS", "128"))
+WINDOW_OVERLAP_TOKENS = int(os.getenv("SPEAR_WINDOW_OVERLAP_TOKENS", "128"))
+WINDOW_MAX_COUNT = int(os.getenv("SPEAR_WINDOW_MAX_COUNT", "8"))
+WINDOW_AGGREGATION = os.getenv("SPEAR_WINDOW_AGGREGATION", "max").lower()  # max / mean / attention
+WINDOW_ATTENTION_TEMPERATURE = 0.1  # Lower = attention concentrates on the worst window
+MAX_TOKENIZE_CHARS = 200_000  # Hard cap on characters tokenized per item
+FORWARD_MAX_SEQUENCES = int(os.getenv("SPEAR_FORWARD_MAX_SEQUENCES", "64"))  # Sequences per forward pass
+
+# Cold start: pinned local snapshot (safetensors, no hub lookups) and a warm-up pass before serving
+MODEL_DIR = os.getenv("SPEAR_MODEL_DIR", "")  # Empty = resolve against the Hugging Face hub
+WARMUP_ENABLED = os.getenv("SPEAR_WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_MANIFEST = "spear_snapshot.json"  # Written next to the weights by the snapshot command
+WARMUP_SAMPLE = "Your account has been suspended. Verify your login at http://example.com/verify"
+
+# Imported on first use by _import_runtime()
+torch = None
+transformers = None
+
+
+def _import_runtime(need_torch: bool = True) -> None:
+    """Import transformers (and torch unless only the tokenizer and config are needed)"""
+    global torch, transformers
+    if transformers is None:
+        import transformers as transformers_module
+        transformers = transformers_module
+    if need_torch and torch is None:
+        import torch as torch_module
+        torch = torch_module
+
+
+def read_snapshot_manifest(model_dir: Path) -> dict:
+    """Model name and resolved revision recorded when the snapshot was written"""
+    try:
+        with open(model_dir / SNAPSHOT_MANIFEST, encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
 
 
 @dataclass
@@ -15,6 +89,135 @@ class PredictionResult:
     raw_score: float
     is_phishing: bool
     confidence: float
+    cached: bool = False  # Served from the verdict cache
+    windows: int = 1  # Token windows scored for this content
+    stage: str = "bert"  # Pipeline stage that produced the verdict: "cache", "domainIndex", "urlLexical", "ngram" or "bert"
+
+
+def get_threat_level(is_phishing: bool, confidence: float) -> str:
+    """Determine threat level based on model prediction"""
+    if is_phishing:
+        if confidence >= 80:
+            return "malicious"
+        else:
+            return "suspicious"
+    else:
+        if confidence >= 80:
+            return "safe"
+        else:
+            return "suspicious"
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler.
+    Collects concurrent prediction requests into a queue and flushes them as
+    one padded forward pass when the batch is full or the oldest request has
+    waited max_wait_ms. Results are delivered through per-request futures.
+    """
+    
+    def __init__(self, run_batch: Callable[[List[str]], List[PredictionResult]],
+                 max_batch_size: int = BATCH_MAX_SIZE, max_wait_ms: float = BATCH_MAX_WAIT_MS):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        
+        # Statistics
+        self._batches = 0
+        self._items = 0
+        self._max_observed = 0
+        self._size_histogram = {}
+        self._flush_reasons = {"size": 0, "timeout": 0}
+    
+    def submit(self, content: str) -> Future:
+        """Queue content for the next batch and return a future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((content, future))
+        return future
+    
+    def _ensure_started(self) -> None:
+        """Start the worker thread lazily (and again in forked children)"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # Threads do not survive fork(): start over with a fresh queue
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._worker, name="spear-micro-batcher", daemon=True)
+            self._thread.start()
+    
+    def _collect(self) -> tuple:
+        """Block for the first request, then gather more until size or time limit"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch, "timeout"
+        return batch, "size"
+    
+    def _worker(self) -> None:
+        while True:
+            batch, reason = self._collect()
+            # Skip requests whose callers have already given up
+            batch = [(content, future) for content, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._record(len(batch), reason)
+            
+            try:
+                results = self.run_batch([content for content, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # Retry item by item so one bad input does not fail its neighbours' requests
+                for content, future in batch:
+                    try:
+                        future.set_result(self.run_batch([content])[0])
+                    except Exception as item_error:
+                        future.set_exception(item_error)
+                continue
+            
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+    
+    def _record(self, size: int, reason: str) -> None:
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._max_observed = max(self._max_observed, size)
+            self._size_histogram[size] = self._size_histogram.get(size, 0) + 1
+            self._flush_reasons[reason] += 1
+    
+    def stats(self) -> dict:
+        """Queue depth and batch-size statistics"""
+        with self._lock:
+            return {
+                "enabled": True,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "max_observed_batch_size": self._max_observed,
+                "batch_size_histogram": dict(sorted(self._size_histogram.items())),
+                "flush_reasons": dict(self._flush_reasons)
+            }
 
 
 class PhishingDetector:
@@ -24,39 +227,153 @@ class PhishingDetector:
     """
     
     MODEL_NAME = "ealvaradob/bert-finetuned-phishing"
+    MODEL_REVISION = os.getenv("SPEAR_MODEL_REVISION", "main")  # Hub branch, tag or commit hash
     MAX_CONTENT_LENGTH = 2000  # Character limit for model input
+    MAX_TOKENS = 512  # BERT sequence length limit
     
     # Labels that indicate phishing content
     PHISHING_LABELS = ['phishing', 'spam', 'malicious', '1', 'label_1']
     
-    def __init__(self):
+    def __init__(self, batching: bool = BATCH_ENABLED, backend: str = INFERENCE_BACKEND,
+                 onnx_quantize: Optional[bool] = None, truncation: str = TRUNCATION_MODE,
+                 aggregation: str = WINDOW_AGGREGATION, model_dir: str = MODEL_DIR):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        if truncation not in ("chars", "head_tail", "sliding_window"):
+            raise ValueError(f"Unknown truncation mode: {truncation}")
+        if aggregation not in ("max", "mean", "attention"):
+            raise ValueError(f"Unknown window aggregation: {aggregation}")
+        
         self.model = None
         self.tokenizer = None
-        self.classifier = None
+        self.id2label = {}
         self.is_loaded = False
-        self.device = "GPU" if torch.cuda.is_available() else "CPU"
+        self.backend = backend
+        self.onnx = None
+        self.onnx_quantize = ONNX_QUANTIZE if onnx_quantize is None else onnx_quantize
+        self.truncation = truncation
+        self.aggregation = aggregation
+        self.device = "CPU"  # Decided in load(), once torch is imported
+        self.torch_device = None
+        self.model_dir = resolve_path(model_dir) if model_dir else None
+        # A snapshot pins the exact commit it was taken from; cache keys follow it
+        manifest = read_snapshot_manifest(self.model_dir) if self.model_dir is not None else {}
+        self.revision = manifest.get("revision") or self.MODEL_REVISION
+        self.load_timings: Dict[str, float] = {}  # Startup phase -> milliseconds
+        self._warm_pid = None  # Process that ran the warm-up pass
+        self.batcher = MicroBatcher(self.predict_batch) if batching else None
+        self.flights = SingleFlight("bert")  # Identical contents in flight share one inference
+    
+    @property
+    def model_id(self) -> str:
+        """Identity of the model and settings that produce a verdict (used in cache keys)"""
+        model_id = f"{self.MODEL_NAME}@{self.revision}"
+        if self.backend == "onnx":
+            # INT8 scores drift slightly from fp32, so keep their cache entries apart
+            model_id += "+onnx-int8" if self.onnx_quantize else "+onnx"
+        if self.truncation == "sliding_window":
+            model_id += f"+windows-{self.aggregation}"
+        elif self.truncation == "head_tail":
+            model_id += "+head-tail"
+        return model_id
+    
+    @property
+    def source(self) -> str:
+        """Where the weights are loaded from"""
+        return str(self.model_dir) if self.model_dir is not None else f"hub:{self.MODEL_NAME}@{self.revision}"
+    
+    @contextmanager
+    def _phase(self, name: str):
+        """Record the duration of one loading phase in load_timings"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.load_timings[name] = round((time.perf_counter() - start) * 1000, 1)
+    
+    def _pretrained(self, loader, **kwargs):
+        """
+        from_pretrained() against the local snapshot (no network, memory-mapped
+        safetensors) when SPEAR_MODEL_DIR is set, otherwise against the hub
+        """
+        if self.model_dir is not None:
+            return loader.from_pretrained(str(self.model_dir), local_files_only=True, **kwargs)
+        return loader.from_pretrained(self.MODEL_NAME, revision=self.revision, **kwargs)
+    
+    def _load_weights(self):
+        kwargs = {"low_cpu_mem_usage": True}
+        if self.model_dir is not None:
+            kwargs["use_safetensors"] = True
+        return self._pretrained(transformers.AutoModelForSequenceClassification, **kwargs)
     
     def load(self) -> None:
-        """Load the BERT model from Hugging Face"""
-        print(f"Loading BERT phishing detection model: {self.MODEL_NAME}")
+        """Load the BERT model from the local snapshot or Hugging Face"""
+        print(f"Loading BERT phishing detection model: {self.MODEL_NAME} ({self.source})")
         
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(self.MODEL_NAME)
-            self.model = AutoModelForSequenceClassification.from_pretrained(self.MODEL_NAME)
-            self.classifier = pipeline(
-                "text-classification",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if torch.cuda.is_available() else -1,
-                truncation=True,  # Auto-truncate inputs longer than 512 tokens
-                max_length=512
-            )
+            # The ONNX path needs torch only to export on first use
+            needs_torch = self.backend == "torch"
+            with self._phase("import_runtime"):
+                _import_runtime(need_torch=needs_torch)
+            if torch is not None and torch.cuda.is_available():
+                self.device = "GPU" if self.backend == "torch" else "CPU"
+                self.torch_device = torch.device("cuda")
+            elif torch is not None:
+                self.torch_device = torch.device("cpu")
+            
+            with self._phase("tokenizer"):
+                self.tokenizer = self._pretrained(transformers.AutoTokenizer)
+            
+            if self.backend == "onnx":
+                with self._phase("onnx_session"):
+                    self._load_onnx()
+            else:
+                with self._phase("weights"):
+                    self.model = self._load_weights()
+                    self.model.to(self.torch_device)
+                    self.model.eval()
+                    self.id2label = self.model.config.id2label
+            
             self.is_loaded = True
-            print(f"Model loaded successfully! Using {self.device}")
+            backend = self.onnx.variant if self.onnx is not None else "pytorch"
+            print(f"Model loaded successfully! Using {self.device} ({backend})")
         except Exception as e:
             print(f"Error loading model: {e}")
             raise e
     
+    def warm_up(self) -> None:
+        """
+        Run one forward pass so the first request does not pay for lazy
+        initialization (kernel selection, thread pools, allocator). Done once
+        per process: the prefork server warms each worker after forking.
+        """
+        if not self.is_loaded or self._warm_pid == os.getpid():
+            return
+        with self._phase("warm_up"):
+            self.predict_batch([WARMUP_SAMPLE])
+        self._warm_pid = os.getpid()
+    
+    @property
+    def is_warm(self) -> bool:
+        return self._warm_pid == os.getpid()
+    
+    def _load_onnx(self) -> None:
+        """Open the ONNX Runtime session, exporting from PyTorch weights on first use"""
+        base_id = f"{self.MODEL_NAME}@{self.revision}"
+        self.onnx = OnnxBackend(quantize=self.onnx_quantize)
+        
+        model = None
+        if self.onnx.is_exported(base_id):
+            # Labels are all we need from the model files once the ONNX file exists
+            self.id2label = self._pretrained(transformers.AutoConfig).id2label
+        else:
+            _import_runtime(need_torch=True)
+            model = self._load_weights()
+            model.eval()
+            self.id2label = model.config.id2label
+        
+        self.onnx.prepare(model, self.tokenizer, base_id)
+    
     def predict(self, content: str) -> PredictionResult:
         """
         Run phishing detection on the given content.
@@ -74,15 +391,213 @@ class PhishingDetector:
         if not self.is_loaded:
             raise RuntimeError("Model not loaded. Call load() first.")
         
-        # Truncate content if too long for the model (max 512 tokens)
-        truncated_content = content[:self.MAX_CONTENT_LENGTH]
+        if self.batcher is not None:
+            return self.submit(content).result()
+        
+        return self.flights.run(self._flight_key(content), lambda: self.predict_batch([content])[0])
+    
+    def submit(self, content: str) -> Future:
+        """
+        Schedule phishing detection and return a future for the result.
+        With batching enabled the request joins the next micro-batch;
+        otherwise inference runs immediately in the calling thread. Content
+        already waiting for a result shares that request's inference.
+        
+        Raises:
+            RuntimeError: If model is not loaded
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load() first.")
+        
+        if self.batcher is not None:
+            return self.flights.share(self._flight_key(content), lambda: self.batcher.submit(content))
+        
+        future = Future()
+        try:
+            future.set_result(self.predict(content))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    
+    def _flight_key(self, content: str) -> str:
+        return content_key(self.model_id, content)
+    
+    def predict_batch(self, contents: List[str]) -> List[PredictionResult]:
+        """
+        Run phishing detection on several contents in one padded forward pass.
+        
+        Args:
+            contents: Text contents to analyze
+            
+        Returns:
+            One PredictionResult per content, in input order
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load() first.")
+        if not contents:
+            return []
+        
+        # Tokenize each content once into one or more model-sized sequences
+        with metrics.BERT_PHASE_SECONDS.time(model=self.model_id, phase="tokenize"):
+            sequences = [self.encode(content) for content in contents]
+        return self.score_encoded(sequences)
+    
+    def score_encoded(self, sequences: List[List[List[int]]]) -> List[PredictionResult]:
+        """
+        Score contents that were already tokenized with encode().
+        Lets callers tokenize the next batch on other threads while this one
+        runs through the model.
         
-        # Run inference
-        result = self.classifier(truncated_content)[0]
+        Args:
+            sequences: encode() output of each content
+            
+        Returns:
+            One PredictionResult per content, in input order
+        """
+        if not sequences:
+            return []
+        model_id = self.model_id
         
-        raw_label = result['label']
-        raw_score = result['score']
+        # Score every sequence of every content together
+        flat = [sequence for content_sequences in sequences for sequence in content_sequences]
+        metrics.BERT_BATCH_SIZE.observe(len(sequences), model=model_id)
+        metrics.BERT_SEQUENCES.observe(len(flat), model=model_id)
+        with metrics.BERT_PHASE_SECONDS.time(model=model_id, phase="forward"):
+            probabilities = self._forward(flat)
         
+        results = []
+        offset = 0
+        with metrics.BERT_PHASE_SECONDS.time(model=model_id, phase="postprocess"):
+            for content_sequences in sequences:
+                rows = probabilities[offset:offset + len(content_sequences)]
+                offset += len(content_sequences)
+                row = self._aggregate(rows)
+                label_id = max(range(len(row)), key=row.__getitem__)
+                results.append(self._to_result(self.id2label[label_id], row[label_id], windows=len(rows)))
+        return results
+    
+    def encode(self, content: str) -> List[List[int]]:
+        """Token id sequences (with special tokens) to score for one content; safe to call from several threads"""
+        if self.truncation == "chars":
+            # Truncate content if too long for the model (max 512 tokens)
+            return [self.tokenizer(
+                content[:self.MAX_CONTENT_LENGTH],
+                truncation=True,
+                max_length=self.MAX_TOKENS
+            )["input_ids"]]
+        
+        tokens = self.tokenizer(
+            content[:MAX_TOKENIZE_CHARS],
+            add_special_tokens=False,
+            truncation=False,
+            verbose=False
+        )["input_ids"]
+        body = self.MAX_TOKENS - self.tokenizer.num_special_tokens_to_add()
+        
+        if len(tokens) <= body:
+            return [self._with_special_tokens(tokens)]
+        
+        if self.truncation == "head_tail":
+            head = min(TRUNCATION_HEAD_TOKENS, body)
+            kept = tokens[:head] + (tokens[-(body - head):] if body > head else [])
+            return [self._with_special_tokens(kept)]
+        
+        return [
+            self._with_special_tokens(tokens[start:start + body])
+            for start in self._window_starts(len(tokens), body)
+        ]
+    
+    def _with_special_tokens(self, tokens: List[int]) -> List[int]:
+        """Wrap a token id sequence as a single BERT segment: [CLS] tokens [SEP]"""
+        return [self.tokenizer.cls_token_id] + tokens + [self.tokenizer.sep_token_id]
+    
+    def _window_starts(self, length: int, body: int) -> List[int]:
+        """Start offsets of overlapping windows; the last window always ends at the tail"""
+        step = max(1, body - WINDOW_OVERLAP_TOKENS)
+        last = length - body
+        starts = list(range(0, last, step)) + [last]
+        
+        if len(starts) > WINDOW_MAX_COUNT:
+            # Keep the head and tail windows and spread the rest evenly
+            count = max(2, WINDOW_MAX_COUNT)
+            starts = [round(i * last / (count - 1)) for i in range(count)]
+        return starts
+    
+    def _aggregate(self, rows: List[List[float]]) -> List[float]:
+        """Combine per-window class probabilities into one distribution"""
+        if len(rows) == 1:
+            return rows[0]
+        
+        phishing_ids = [i for i, label in self.id2label.items() if label.lower() in self.PHISHING_LABELS]
+        phishing = np.array([sum(row[i] for i in phishing_ids) for row in rows])
+        matrix = np.array(rows)
+        
+        if self.aggregation == "max":
+            return rows[int(phishing.argmax())]
+        if self.aggregation == "mean":
+            return matrix.mean(axis=0).tolist()
+        
+        # Attention: weight windows by how phishing-like they look
+        weights = np.exp((phishing - phishing.max()) / WINDOW_ATTENTION_TEMPERATURE)
+        weights /= weights.sum()
+        return (weights @ matrix).tolist()
+    
+    def _forward(self, sequences: List[List[int]]) -> List[List[float]]:
+        """Run padded forward passes over token id sequences; returns class probabilities per sequence"""
+        probabilities = []
+        for start in range(0, len(sequences), FORWARD_MAX_SEQUENCES):
+            chunk = sequences[start:start + FORWARD_MAX_SEQUENCES]
+            
+            if self.onnx is not None:
+                encoded = self.tokenizer.pad({"input_ids": chunk}, padding=True, return_tensors="np")
+                logits = self.onnx.logits(encoded)
+                exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+                probabilities.extend((exp / exp.sum(axis=-1, keepdims=True)).tolist())
+                continue
+            
+            encoded = self.tokenizer.pad({"input_ids": chunk}, padding=True, return_tensors="pt").to(self.torch_device)
+            with torch.inference_mode():
+                logits = self.model(**encoded).logits
+            probabilities.extend(torch.softmax(logits, dim=-1).tolist())
+        
+        return probabilities
+    
+    def predict_many(self, contents: List[str], chunk_size: int = BATCH_CHUNK_SIZE) -> List[Union[PredictionResult, Exception]]:
+        """
+        Run phishing detection on a large list of contents in chunked forward passes.
+        
+        A failing chunk is retried item by item so that one bad input does not
+        fail its neighbours; items that still fail are returned as the raised
+        exception in their slot.
+        
+        Args:
+            contents: Text contents to analyze
+            chunk_size: Maximum number of items per forward pass
+            
+        Returns:
+            One PredictionResult (or Exception) per content, in input order
+        """
+        if not self.is_loaded:
+            raise RuntimeError("Model not loaded. Call load() first.")
+        
+        results: List[Union[PredictionResult, Exception]] = []
+        chunk_size = max(1, chunk_size)
+        
+        for start in range(0, len(contents), chunk_size):
+            chunk = contents[start:start + chunk_size]
+            try:
+                results.extend(self.predict_batch(chunk))
+            except Exception:
+                for content in chunk:
+                    try:
+                        results.extend(self.predict_batch([content]))
+                    except Exception as e:
+                        results.append(e)
+        
+        return results
+    
+    def _to_result(self, raw_label: str, raw_score: float, windows: int = 1) -> PredictionResult:
+        """Convert a raw model label and score into a PredictionResult"""
         # Determine if content is phishing based on model output
         is_phishing = raw_label.lower() in self.PHISHING_LABELS
         confidence = raw_score * 100
@@ -91,14 +606,81 @@ class PhishingDetector:
             raw_label=raw_label,
             raw_score=raw_score,
             is_phishing=is_phishing,
-            confidence=confidence
+            confidence=confidence,
+            windows=windows
         )
     
+    def batch_stats(self) -> dict:
+        """Micro-batching queue depth and batch-size statistics"""
+        if self.batcher is None:
+            return {"enabled": False}
+        return self.batcher.stats()
+    
+    def coalescing_stats(self) -> dict:
+        """Predictions that joined an identical in-flight inference"""
+        return self.flights.stats()
+    
     def is_gpu_available(self) -> bool:
-        """Check if GPU is available for inference"""
-        return torch.cuda.is_available()
+        """Check if GPU is available for inference (False until torch has been imported by load())"""
+        return torch is not None and torch.cuda.is_available()
+
+
+def write_snapshot(output: Path, revision: str = PhishingDetector.MODEL_REVISION) -> dict:
+    """
+    Download the model once and save it as a self-contained local snapshot:
+    safetensors weights, tokenizer, config and a manifest with the resolved
+    commit, so serving never has to contact the hub.
+    """
+    _import_runtime(need_torch=True)
+    name = PhishingDetector.MODEL_NAME
+    tokenizer = transformers.AutoTokenizer.from_pretrained(name, revision=revision)
+    model = transformers.AutoModelForSequenceClassification.from_pretrained(name, revision=revision)
+    
+    staging = output.with_name(output.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    model.save_pretrained(staging, safe_serialization=True)
+    tokenizer.save_pretrained(staging)
+    manifest = {
+        "model": name,
+        "revision": getattr(model.config, "_commit_hash", None) or revision,
+        "requested_revision": revision,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S")
+    }
+    with open(staging / SNAPSHOT_MANIFEST, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, indent=2)
+    
+    shutil.rmtree(output, ignore_errors=True)
+    staging.rename(output)
+    return manifest
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="BERT phishing model utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    
+    snapshot = sub.add_parser("snapshot", help="Save a pinned local copy of the model for SPEAR_MODEL_DIR")
+    snapshot.add_argument("--output", "-o", required=True, help="Snapshot directory (replaced if it exists)")
+    snapshot.add_argument("--revision", default=PhishingDetector.MODEL_REVISION, help="Hub branch, tag or commit")
+    
+    profile = sub.add_parser("profile", help="Load the model and print the startup phase timings")
+    profile.add_argument("--backend", default=INFERENCE_BACKEND, choices=["torch", "onnx"])
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "snapshot":
+        output = resolve_path(args.output)
+        manifest = write_snapshot(output, args.revision)
+        print(f"[OK] Snapshot of {manifest['model']}@{manifest['revision']} written to {output}")
+        print(f"    Set SPEAR_MODEL_DIR={args.output} to load it without hub lookups")
+        return 0
+    
+    detector = PhishingDetector(batching=False, backend=args.backend)
+    detector.load()
+    detector.warm_up()
+    print(json.dumps({"source": detector.source, "phases_ms": detector.load_timings}, indent=2))
+    return 0
 
 
-# Singleton instance for the application
-phishing_detector = PhishingDetector()
+if __name__ == "__main__":
+    sys.exit(main())
 
@@ -0,0 +1,324 @@
+"""
+Client-side rate limiting for LLM quota
+Per-model token buckets for requests per minute and tokens per minute, with
+a priority queue in front of them. Interactive calls are served first; bulk
+work may only use the part of each bucket above a reserve, and is shed when
+its estimated time-to-service is too long, so the provider's limits are not
+hit in the first place.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Quota configuration
+RATE_LIMIT_ENABLED = os.getenv("SPEAR_LLM_RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+DEFAULT_RPM = float(os.getenv("SPEAR_LLM_DEFAULT_RPM", "20"))  # Requests per minute per model (0 = unlimited)
+DEFAULT_TPM = float(os.getenv("SPEAR_LLM_DEFAULT_TPM", "0"))  # Tokens per minute per model (0 = unlimited)
+MODEL_LIMITS = os.getenv("SPEAR_LLM_MODEL_LIMITS", "")  # "model=rpm:tpm,model=rpm:tpm" overrides
+BULK_RESERVE = float(os.getenv("SPEAR_LLM_BULK_RESERVE", "0.25"))  # Share of each bucket kept for interactive calls
+BULK_MAX_WAIT = float(os.getenv("SPEAR_LLM_BULK_MAX_WAIT", "30"))  # Seconds; bulk calls expected to wait longer are shed
+
+# Lower rank is served first
+PRIORITIES = {"interactive": 0, "bulk": 1}
+
+
+class RateLimited(Exception):
+    """Raised when a call cannot be served within its budget"""
+    
+    def __init__(self, model: str, retry_after: float, reason: str):
+        super().__init__(f"{model} {reason}, retry in {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def parse_model_limits(value: str) -> Dict[str, tuple]:
+    """Parse "model=rpm:tpm,..." into {model: (rpm, tpm)}"""
+    limits = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        model, _, budget = item.rpartition("=")
+        rpm, _, tpm = budget.partition(":")
+        limits[model.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+class TokenBucket:
+    """Continuously refilling bucket holding up to one minute of budget"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+    
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def time_until(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until `amount` can be taken while leaving `reserve` (fraction of capacity) behind"""
+        target = amount + reserve * self.capacity
+        if amount <= self.capacity:
+            target = min(target, self.capacity)  # A full bucket always admits a single call
+        return max(target - self.level, 0.0) / self.rate
+
+
+class ModelBudget:
+    """RPM and TPM buckets for one model plus the calls waiting on them"""
+    
+    def __init__(self, rpm: float, tpm: float):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.waiters = []  # heap of [rank, sequence, tokens]
+        self.condition: Optional[asyncio.Condition] = None
+        self.loop = None  # Event loop the condition belongs to
+        self.granted = {name: 0 for name in PRIORITIES}
+        self.shed = {name: 0 for name in PRIORITIES}
+        self.wait_total = {name: 0.0 for name in PRIORITIES}
+        self.wait_max = {name: 0.0 for name in PRIORITIES}
+    
+    def buckets(self):
+        return [bucket for bucket in (self.requests, self.tokens) if bucket is not None]
+    
+    def time_until(self, requests: float, tokens: float, reserve: float, now: float) -> float:
+        waits = []
+        for bucket, amount in ((self.requests, requests), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                waits.append(bucket.time_until(amount, reserve))
+        return max(waits, default=0.0)
+    
+    def clamp(self, tokens: float) -> float:
+        """A call larger than the whole TPM bucket is charged as one full bucket"""
+        return min(tokens, self.tokens.capacity) if self.tokens is not None else tokens
+    
+    def consume(self, tokens: float) -> None:
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= tokens
+
+
+class LLMScheduler:
+    """
+    Admits LLM calls against per-model RPM/TPM budgets.
+    Async callers queue by priority and are woken in order as the buckets
+    refill; bulk calls are shed up front when their estimated wait exceeds
+    bulk_max_wait, and any call is refused when it could not start before
+    its own deadline.
+    """
+    
+    def __init__(self, enabled: bool = RATE_LIMIT_ENABLED, default_rpm: float = DEFAULT_RPM,
+                 default_tpm: float = DEFAULT_TPM, model_limits: str = MODEL_LIMITS,
+                 bulk_reserve: float = BULK_RESERVE, bulk_max_wait: float = BULK_MAX_WAIT):
+        self.enabled = enabled
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.model_limits = parse_model_limits(model_limits)
+        self.bulk_reserve = bulk_reserve
+        self.bulk_max_wait = bulk_max_wait
+        self._lock = threading.Lock()  # Guards bucket state for async and blocking callers alike
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._sequence = itertools.count()
+    
+    def _budget(self, model: str) -> Optional[ModelBudget]:
+        if not self.enabled:
+            return None
+        budget = self._budgets.get(model)
+        if budget is None:
+            rpm, tpm = self.model_limits.get(model, (self.default_rpm, self.default_tpm))
+            if rpm <= 0 and tpm <= 0:
+                return None
+            budget = self._budgets.setdefault(model, ModelBudget(rpm, tpm))
+        return budget
+    
+    def _reserve(self, priority: str) -> float:
+        return self.bulk_reserve if priority == "bulk" else 0.0
+    
+    def estimate_wait(self, model: str, tokens: float, priority: str = "interactive") -> float:
+        """Estimated seconds before a new call of this priority would be served (time-to-service)"""
+        budget = self._budget(model)
+        if budget is None:
+            return 0.0
+        rank = PRIORITIES.get(priority, 0)
+        with self._lock:
+            ahead = [waiter for waiter in budget.waiters if waiter[0] <= rank]
+            return budget.time_until(
+                len(ahead) + 1, sum(waiter[2] for waiter in ahead) + tokens, self._reserve(priority), time.monotonic()
+            )
+    
+    async def acquire(self, model: str, tokens: float, priority: str = "interactive",
+                      timeout: Optional[float] = None) -> float:
+        """
+        Wait for budget for one call.
+        
+        Args:
+            model: OpenRouter model the call goes to
+            tokens: Estimated prompt + completion tokens
+            priority: "interactive" or "bulk"
+            timeout: Seconds the caller can afford to wait (None = no limit)
+        
+        Returns:
+            Seconds spent waiting
+        
+        Raises:
+            RateLimited: If the call is shed or could not be served within timeout
+        """
+        budget = self._budget(model)
+        if budget is None:
+            return 0.0
+        if priority not in PRIORITIES:
+            priority = "interactive"
+        tokens = budget.clamp(tokens)
+        
+        eta = self.estimate_wait(model, tokens, priority)
+        if priority == "bulk" and eta > self.bulk_max_wait:
+            self._record_shed(budget, priority)
+            raise RateLimited(model, eta, "bulk quota exhausted")
+        if timeout is not None and eta > timeout:
+            self._record_shed(budget, priority)
+            raise RateLimited(model, eta, "quota exhausted")
+        
+        loop = asyncio.get_running_loop()
+        if budget.loop is not loop:
+            budget.condition = asyncio.Condition()
+            budget.loop = loop
+        start = loop.time()
+        deadline = start + timeout if timeout is not None else None
+        entry = [PRIORITIES[priority], next(self._sequence), tokens]
+        
+        async with budget.condition:
+            with self._lock:
+                heapq.heappush(budget.waiters, entry)
+            try:
+                while True:
+                    wait = None
+                    with self._lock:
+                        if budget.waiters[0] is entry:
+                            wait = budget.time_until(1, tokens, self._reserve(priority), time.monotonic())
+                            if wait <= 0:
+                                heapq.heappop(budget.waiters)
+                                budget.consume(tokens)
+                                break
+                    if priority == "bulk" and wait is not None and wait > self.bulk_max_wait:
+                        self._record_shed(budget, priority)  # Overtaken by interactive calls while queued
+                        raise RateLimited(model, wait, "bulk quota exhausted")
+                    if deadline is not None:
+                        remaining = deadline - loop.time()
+                        if remaining <= 0:
+                            self._record_shed(budget, priority)
+                            raise RateLimited(model, wait or 0.0, "quota wait exceeded deadline")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    try:
+                        await asyncio.wait_for(budget.condition.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                with self._lock:
+                    if entry in budget.waiters:
+                        budget.waiters.remove(entry)
+                        heapq.heapify(budget.waiters)
+                budget.condition.notify_all()
+                raise
+            budget.condition.notify_all()
+        
+        waited = loop.time() - start
+        self._record_grant(budget, priority, waited)
+        return waited
+    
+    def try_acquire(self, model: str, tokens: float, priority: str = "interactive") -> bool:
+        """Take budget only if it is available right now and nobody is queued (used for hedges)"""
+        budget = self._budget(model)
+        if budget is None:
+            return True
+        tokens = budget.clamp(tokens)
+        with self._lock:
+            if budget.waiters or budget.time_until(1, tokens, self._reserve(priority), time.monotonic()) > 0:
+                return False
+            budget.consume(tokens)
+        self._record_grant(budget, priority if priority in PRIORITIES else "interactive", 0.0)
+        return True
+    
+    def acquire_blocking(self, model: str, tokens: float, timeout: Optional[float] = None) -> float:
+        """Blocking variant for the synchronous client; served as interactive, without queue ordering"""
+        budget = self._budget(model)
+        if budget is None:
+            return 0.0
+        tokens = budget.clamp(tokens)
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                wait = budget.time_until(1, tokens, 0.0, time.monotonic())
+                if wait <= 0:
+                    budget.consume(tokens)
+                    break
+            if timeout is not None and time.monotonic() - start + wait > timeout:
+                self._record_shed(budget, "interactive")
+                raise RateLimited(model, wait, "quota exhausted")
+            time.sleep(wait)
+        waited = time.monotonic() - start
+        self._record_grant(budget, "interactive", waited)
+        return waited
+    
+    def settle(self, model: str, estimated: float, actual: Optional[float]) -> None:
+        """Correct the token bucket once the real usage of a call is known"""
+        budget = self._budget(model)
+        if budget is None or budget.tokens is None or actual is None:
+            return
+        with self._lock:
+            budget.tokens.level = min(budget.tokens.capacity, budget.tokens.level + estimated - actual)
+    
+    def penalize(self, model: str) -> None:
+        """The provider answered 429: treat this minute's request budget as spent"""
+        budget = self._budget(model)
+        if budget is None or budget.requests is None:
+            return
+        with self._lock:
+            budget.requests.level = min(budget.requests.level, 0.0)
+    
+    def _record_grant(self, budget: ModelBudget, priority: str, waited: float) -> None:
+        with self._lock:
+            budget.granted[priority] += 1
+            budget.wait_total[priority] += waited
+            budget.wait_max[priority] = max(budget.wait_max[priority], waited)
+    
+    def _record_shed(self, budget: ModelBudget, priority: str) -> None:
+        with self._lock:
+            budget.shed[priority] += 1
+    
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        models = {}
+        for model, budget in list(self._budgets.items()):
+            with self._lock:
+                now = time.monotonic()
+                for bucket in budget.buckets():
+                    bucket.refill(now)
+                queued = {name: sum(1 for waiter in budget.waiters if waiter[0] == rank)
+                          for name, rank in PRIORITIES.items()}
+                models[model] = {
+                    "rpm": budget.requests.capacity if budget.requests else None,
+                    "tpm": budget.tokens.capacity if budget.tokens else None,
+                    "requests_available": round(budget.requests.level, 2) if budget.requests else None,
+                    "tokens_available": round(budget.tokens.level) if budget.tokens else None,
+                    "queued": queued,
+                    "granted": dict(budget.granted),
+                    "shed": dict(budget.shed),
+                    "avg_wait_ms": {
+                        name: round(budget.wait_total[name] / budget.granted[name] * 1000) if budget.granted[name] else 0
+                        for name in PRIORITIES
+                    },
+                    "max_wait_ms": {name: round(budget.wait_max[name] * 1000) for name in PRIORITIES}
+                }
+            models[model]["eta_seconds"] = {
+                name: round(self.estimate_wait(model, 0, name), 2) for name in PRIORITIES
+            }
+        return {"enabled": True, "bulk_reserve": self.bulk_reserve, "models": models}
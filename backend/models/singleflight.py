@@ -0,0 +1,150 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one in-flight computation
+instead of each starting their own: the first caller runs it, everyone who
+arrives before it finishes waits for and receives the same result.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict
+
+# Coalescing configuration
+COALESCE_ENABLED = os.getenv("SPEAR_COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _copy_outcome(source: Future, target: Future) -> None:
+    """Resolve target with source's result or exception (unless its caller gave up)"""
+    if target.cancelled():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class SingleFlight:
+    """
+    Deduplicates identical in-flight work.
+    Blocking callers use run() or share(); async callers use run_async().
+    A caller that is cancelled never cancels the shared work for the others;
+    async work is only cancelled once every caller waiting on it is gone.
+    """
+    
+    def __init__(self, name: str, enabled: bool = COALESCE_ENABLED):
+        self.name = name
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}  # Blocking and future-based work
+        self._tasks: Dict[str, list] = {}  # Async work: key -> [task, callers waiting]
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def run(self, key: str, func: Callable[[], Any]) -> Any:
+        """Run func() once for all concurrent callers with the same key (blocking)"""
+        if not self.enabled:
+            return func()
+        
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._futures.pop(key, None)
+        future.set_result(result)
+        return result
+    
+    def share(self, key: str, start: Callable[[], Future]) -> Future:
+        """
+        Join the in-flight future for key, or call start() to begin one.
+        
+        Returns:
+            A future of the caller's own, so cancelling it leaves the shared work running
+        """
+        if not self.enabled:
+            return start()
+        
+        with self._lock:
+            shared = self._futures.get(key)
+            leader = shared is None
+            if leader:
+                shared = self._futures[key] = start()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        
+        if leader:
+            shared.add_done_callback(lambda done: self._forget(key, done))
+        
+        future = Future()
+        future.set_running_or_notify_cancel()
+        shared.add_done_callback(lambda done: _copy_outcome(done, future))
+        return future
+    
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+    
+    def _forget_task(self, key: str, entry: list) -> None:
+        if self._tasks.get(key) is entry:
+            del self._tasks[key]
+    
+    async def run_async(self, key: str, func: Callable[[], Awaitable[Any]]) -> tuple:
+        """
+        Await func() once for all concurrent callers with the same key.
+        
+        Returns:
+            (result, whether this caller joined another caller's work)
+        """
+        if not self.enabled:
+            return await func(), False
+        
+        entry = self._tasks.get(key)
+        joined = entry is not None and not entry[0].done()
+        if joined:
+            with self._lock:
+                self.coalesced += 1
+        else:
+            entry = self._tasks[key] = [asyncio.ensure_future(func()), 0]
+            with self._lock:
+                self.leaders += 1
+            entry[0].add_done_callback(lambda done: self._forget_task(key, entry))
+        
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task), joined
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()  # Every caller has given up
+    
+    def stats(self) -> dict:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._futures) + len(self._tasks),
+                "executed": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 4) if calls else 0.0
+            }
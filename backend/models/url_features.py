@@ -0,0 +1,394 @@
+"""
+Lexical URL fast path
+Extracts cheap lexical features from a URL (host, TLD, IP-literal hosts,
+punycode, entropy, path depth, brand tokens) and scores them with a small
+logistic model. Verdicts that are confident enough are returned without a
+BERT pass; everything else falls through to the transformer.
+"""
+
+import ipaddress
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from .phishing_model import PredictionResult
+
+# Fast path configuration
+URL_FASTPATH_ENABLED = os.getenv("SPEAR_URL_FASTPATH_ENABLED", "false").lower() in ("1", "true", "yes")
+URL_FASTPATH_PHISHING_THRESHOLD = float(os.getenv("SPEAR_URL_FASTPATH_PHISHING_THRESHOLD", "0.97"))
+URL_FASTPATH_SAFE_THRESHOLD = float(os.getenv("SPEAR_URL_FASTPATH_SAFE_THRESHOLD", "0.03"))
+# Probability without the known-domain credit a URL must also stay under to be reported safe
+URL_FASTPATH_SAFE_BASELINE = float(os.getenv("SPEAR_URL_FASTPATH_SAFE_BASELINE", "0.2"))
+URL_MODEL_PATH = os.getenv("SPEAR_URL_MODEL_PATH", "")  # JSON {"bias": ..., "weights": {...}}; empty = built-in
+
+# Brand tokens and the registrable domains that legitimately use them
+BRAND_DOMAINS = {
+    "paypal": {"paypal.com", "paypal.me"},
+    "apple": {"apple.com", "icloud.com"},
+    "icloud": {"icloud.com", "apple.com"},
+    "microsoft": {"microsoft.com", "live.com", "office.com", "microsoftonline.com"},
+    "office365": {"office.com", "microsoft.com", "office365.com"},
+    "outlook": {"outlook.com", "live.com", "office.com"},
+    "google": {"google.com", "googleusercontent.com", "gmail.com", "youtube.com"},
+    "gmail": {"gmail.com", "google.com"},
+    "amazon": {"amazon.com", "amazon.co.uk", "amazon.de", "amazonaws.com"},
+    "netflix": {"netflix.com"},
+    "facebook": {"facebook.com", "fb.com"},
+    "instagram": {"instagram.com"},
+    "whatsapp": {"whatsapp.com"},
+    "linkedin": {"linkedin.com"},
+    "dropbox": {"dropbox.com"},
+    "docusign": {"docusign.com", "docusign.net"},
+    "adobe": {"adobe.com"},
+    "coinbase": {"coinbase.com"},
+    "binance": {"binance.com"},
+    "metamask": {"metamask.io"},
+    "chase": {"chase.com"},
+    "wellsfargo": {"wellsfargo.com"},
+    "bankofamerica": {"bankofamerica.com"},
+    "citibank": {"citibank.com", "citi.com"},
+    "hsbc": {"hsbc.com", "hsbc.co.uk"},
+    "dhl": {"dhl.com"},
+    "fedex": {"fedex.com"},
+    "usps": {"usps.com"},
+    "steam": {"steampowered.com", "steamcommunity.com"},
+    "ebay": {"ebay.com"},
+}
+
+# Registrable domains that serve pages anyone can publish (Sites, Forms, Drive,
+# shared files, repositories, buckets). Phishing kits are hosted there, so they
+# never count as known domains and never get a fast-path safe verdict.
+USER_CONTENT_DOMAINS = {
+    "google.com", "googleusercontent.com", "forms.gle", "dropbox.com", "dropboxusercontent.com",
+    "github.com", "github.io", "githubusercontent.com", "amazonaws.com", "blogspot.com",
+    "firebaseapp.com", "web.app", "sharepoint.com", "1drv.ms", "azurewebsites.net",
+}
+
+# Well-known registrable domains, scored as strongly legitimate
+KNOWN_DOMAINS = (set().union(*BRAND_DOMAINS.values()) | {
+    "youtube.com", "wikipedia.org", "stackoverflow.com", "reddit.com", "twitter.com", "x.com",
+    "yahoo.com", "bing.com", "duckduckgo.com", "mozilla.org", "python.org", "nytimes.com",
+    "bbc.co.uk", "bbc.com", "cnn.com", "zoom.us", "slack.com", "spotify.com", "twitch.tv",
+}) - USER_CONTENT_DOMAINS
+
+SUSPICIOUS_TLDS = {
+    "xyz", "top", "tk", "ml", "ga", "cf", "gq", "zip", "mov", "click", "country", "stream", "work",
+    "rest", "fit", "cam", "support", "live", "buzz", "icu", "monster",
+}
+SHORTENER_DOMAINS = {"bit.ly", "tinyurl.com", "t.co", "goo.gl", "ow.ly", "is.gd", "buff.ly", "cutt.ly", "rb.gy"}
+SUSPICIOUS_KEYWORDS = (
+    "login", "signin", "verify", "account", "update", "secure", "banking", "confirm",
+    "password", "wallet", "suspend", "unlock", "billing", "invoice", "recover",
+)
+# Second-level suffixes under which the registrable domain has three labels
+MULTI_PART_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "com.au", "net.au", "org.au", "co.jp", "co.nz", "co.za",
+    "com.br", "com.cn", "com.mx", "co.in", "com.sg", "com.tr",
+}
+# Digit-for-letter substitutions used in typosquatted brand names
+LEET_TABLE = str.maketrans({"0": "o", "1": "l", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+
+# Built-in logistic model (positive weights push toward phishing)
+DEFAULT_BIAS = -1.5
+DEFAULT_WEIGHTS = {
+    "is_ip": 3.0,
+    "is_punycode": 2.5,
+    "brand_mismatch": 3.5,
+    "suspicious_tld": 1.5,
+    "keyword_count": 0.8,
+    "has_userinfo": 3.0,
+    "has_port": 1.0,
+    "is_shortener": 0.5,
+    "extra_subdomains": 0.6,
+    "host_hyphens": 0.4,
+    "host_entropy": 0.5,
+    "host_digit_ratio": 3.0,
+    "length_excess": 0.5,
+    "path_depth_excess": 0.15,
+    "uses_https": -0.5,
+    "known_domain": -6.0,
+}
+
+_SCHEME_PATTERN = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*://")
+# Links in free text: explicit http(s)/www links and bare "domain.tld/path" mentions
+_TEXT_URL_PATTERN = re.compile(
+    r"(?:https?://|www\.)[^\s<>\"'()\[\]]+|\b(?:[a-z0-9](?:[a-z0-9-]*[a-z0-9])?\.)+[a-z]{2,63}(?:/[^\s<>\"'()\[\]]*)?",
+    re.IGNORECASE
+)
+_TRAILING_PUNCTUATION = ".,;:!?*'\""
+
+
+@dataclass
+class UrlFeatures:
+    """Lexical features of a single URL"""
+    host: str
+    tld: str
+    registrable_domain: str
+    is_ip: bool
+    is_punycode: bool
+    host_entropy: float
+    path_depth: int
+    url_length: int
+    subdomain_count: int
+    host_hyphens: int
+    host_digit_ratio: float
+    has_userinfo: bool
+    has_port: bool
+    uses_https: bool
+    is_shortener: bool
+    suspicious_tld: bool
+    known_domain: bool
+    keyword_count: int
+    brand_tokens: List[str] = field(default_factory=list)
+    brand_mismatch: bool = False
+    user_content_host: bool = False  # Not a model input; only blocks safe short-circuits
+    
+    def vector(self) -> Dict[str, float]:
+        """Model inputs, with counts capped so no single feature dominates"""
+        return {
+            "is_ip": float(self.is_ip),
+            "is_punycode": float(self.is_punycode),
+            "brand_mismatch": float(self.brand_mismatch),
+            "suspicious_tld": float(self.suspicious_tld),
+            "keyword_count": float(min(self.keyword_count, 3)),
+            "has_userinfo": float(self.has_userinfo),
+            "has_port": float(self.has_port),
+            "is_shortener": float(self.is_shortener),
+            "extra_subdomains": float(min(max(self.subdomain_count - 2, 0), 3)),
+            "host_hyphens": float(min(self.host_hyphens, 4)),
+            "host_entropy": max(self.host_entropy - 3.0, 0.0),
+            "host_digit_ratio": self.host_digit_ratio,
+            "length_excess": max(self.url_length - 75, 0) / 25,
+            "path_depth_excess": float(max(self.path_depth - 3, 0)),
+            "uses_https": float(self.uses_https),
+            "known_domain": float(self.known_domain),
+        }
+
+
+def shannon_entropy(text: str) -> float:
+    if not text:
+        return 0.0
+    counts = Counter(text)
+    return -sum(n / len(text) * math.log2(n / len(text)) for n in counts.values())
+
+
+def _parse_ip(host: str) -> bool:
+    """Dotted/IPv6 literals plus the integer and hex forms browsers also accept"""
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return bool(re.fullmatch(r"(0x[0-9a-f]+|\d+)", host))
+
+
+def _brand_in_tokens(brand: str, tokens: List[str]) -> bool:
+    """Brand used as a host token ("paypal", "paypal-login", "paypalverify"), not inside another word"""
+    return any(token == brand or (len(brand) >= 5 and token.startswith(brand)) for token in tokens)
+
+
+def url_host(url: str) -> Optional[str]:
+    """Lower-cased hostname of a URL (scheme optional), or None if it has none"""
+    candidate = url.strip()
+    if not _SCHEME_PATTERN.match(candidate):
+        candidate = "http://" + candidate
+    try:
+        host = (urlsplit(candidate).hostname or "").rstrip(".")
+    except ValueError:
+        return None
+    return host or None
+
+
+def extract_urls(text: str, limit: int = 50) -> List[str]:
+    """
+    Find the links in an email or SMS body.
+    
+    Args:
+        text: Free text
+        limit: Maximum number of distinct URLs returned
+    
+    Returns:
+        Distinct URLs in order of first appearance
+    """
+    urls = []
+    seen = set()
+    for match in _TEXT_URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip(_TRAILING_PUNCTUATION)
+        if url.lower() in seen:
+            continue
+        seen.add(url.lower())
+        urls.append(url)
+        if len(urls) >= limit:
+            break
+    return urls
+
+
+def registrable_domain(host: str) -> str:
+    """Approximate eTLD+1 for a hostname"""
+    labels = host.split(".")
+    if len(labels) >= 3 and ".".join(labels[-2:]) in MULTI_PART_SUFFIXES:
+        return ".".join(labels[-3:])
+    return ".".join(labels[-2:])
+
+
+def extract_url_features(url: str) -> Optional[UrlFeatures]:
+    """
+    Extract lexical features from a URL.
+    
+    Returns:
+        UrlFeatures, or None if the text does not parse as a URL with a host
+    """
+    candidate = url.strip()
+    if not _SCHEME_PATTERN.match(candidate):
+        candidate = "http://" + candidate
+    
+    try:
+        parts = urlsplit(candidate)
+        host = (parts.hostname or "").rstrip(".")
+        port = parts.port
+    except ValueError:
+        return None
+    
+    is_ip = bool(host) and _parse_ip(host)
+    if not host or (not is_ip and "." not in host):
+        return None
+    
+    domain = host if is_ip else registrable_domain(host)
+    tld = "" if is_ip else host.rsplit(".", 1)[-1]
+    domain_label = domain.split(".")[0]
+    
+    lowered = candidate.lower()
+    host_tokens = re.split(r"[.-]", host.translate(LEET_TABLE))
+    host_brands = [brand for brand in BRAND_DOMAINS if _brand_in_tokens(brand, host_tokens)]
+    path_brands = [brand for brand in BRAND_DOMAINS if brand not in host_brands and brand in lowered]
+    brand_mismatch = any(domain not in BRAND_DOMAINS[brand] for brand in host_brands)
+    
+    return UrlFeatures(
+        host=host,
+        tld=tld,
+        registrable_domain=domain,
+        is_ip=is_ip,
+        is_punycode=any(label.startswith("xn--") for label in host.split(".")),
+        host_entropy=shannon_entropy(domain_label),
+        path_depth=len([segment for segment in parts.path.split("/") if segment]),
+        url_length=len(url.strip()),
+        subdomain_count=0 if is_ip else max(len(host.split(".")) - len(domain.split(".")), 0),
+        host_hyphens=host.count("-"),
+        host_digit_ratio=0.0 if is_ip else sum(c.isdigit() for c in host) / len(host),
+        has_userinfo="@" in parts.netloc,
+        has_port=port is not None and port not in (80, 443),
+        uses_https=parts.scheme.lower() == "https",
+        is_shortener=domain in SHORTENER_DOMAINS,
+        suspicious_tld=tld in SUSPICIOUS_TLDS,
+        known_domain=domain in KNOWN_DOMAINS and "@" not in parts.netloc,
+        keyword_count=sum(1 for keyword in SUSPICIOUS_KEYWORDS if keyword in lowered),
+        brand_tokens=host_brands + path_brands,
+        brand_mismatch=brand_mismatch,
+        user_content_host=domain in USER_CONTENT_DOMAINS
+    )
+
+
+class UrlScorer:
+    """Logistic model over UrlFeatures.vector()"""
+    
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = DEFAULT_BIAS):
+        self.weights = dict(DEFAULT_WEIGHTS if weights is None else weights)
+        self.bias = bias
+    
+    @classmethod
+    def from_file(cls, path: str) -> "UrlScorer":
+        """Load trained weights from a JSON file: {"bias": float, "weights": {feature: float}}"""
+        with open(path, encoding="utf-8") as handle:
+            data = json.load(handle)
+        return cls(weights=data["weights"], bias=data.get("bias", DEFAULT_BIAS))
+    
+    def score(self, features: UrlFeatures, ignore: tuple = ()) -> float:
+        """Phishing probability in [0, 1], optionally leaving some features out"""
+        logit = self.bias + sum(self.weights.get(name, 0.0) * value for name, value in features.vector().items()
+                                if name not in ignore)
+        return 1 / (1 + math.exp(-max(min(logit, 50.0), -50.0)))
+
+
+class UrlFastPath:
+    """
+    Decides obvious URLs without BERT.
+    Only verdicts beyond the confidence thresholds are returned; ambiguous
+    URLs (and non-URL content) return None and go to the transformer.
+    A safe verdict also needs the URL to look benign without the known-domain
+    credit, and is never given to user-content hosts.
+    """
+    
+    def __init__(self, scorer: Optional[UrlScorer] = None, enabled: bool = URL_FASTPATH_ENABLED,
+                 phishing_threshold: float = URL_FASTPATH_PHISHING_THRESHOLD,
+                 safe_threshold: float = URL_FASTPATH_SAFE_THRESHOLD,
+                 safe_baseline: float = URL_FASTPATH_SAFE_BASELINE):
+        if scorer is None:
+            scorer = UrlScorer.from_file(URL_MODEL_PATH) if URL_MODEL_PATH else UrlScorer()
+        self.scorer = scorer
+        self.enabled = enabled
+        self.phishing_threshold = phishing_threshold
+        self.safe_threshold = safe_threshold
+        self.safe_baseline = safe_baseline
+        self._lock = threading.Lock()
+        self.decided_phishing = 0
+        self.decided_safe = 0
+        self.fell_through = 0
+    
+    def classify(self, content: str) -> Optional[PredictionResult]:
+        """Return a confident verdict for a URL, or None to fall through to BERT"""
+        if not self.enabled or any(c.isspace() for c in content):
+            return None
+        
+        features = extract_url_features(content)
+        if features is None:
+            return None
+        
+        probability = self.scorer.score(features)
+        if probability >= self.phishing_threshold:
+            outcome = PredictionResult(
+                raw_label="phishing", raw_score=probability, is_phishing=True, confidence=probability * 100,
+                stage="urlLexical"
+            )
+        elif probability <= self.safe_threshold and self._corroborated_safe(features):
+            outcome = PredictionResult(
+                raw_label="benign", raw_score=1 - probability, is_phishing=False,
+                confidence=(1 - probability) * 100, stage="urlLexical"
+            )
+        else:
+            outcome = None
+        
+        with self._lock:
+            if outcome is None:
+                self.fell_through += 1
+            elif outcome.is_phishing:
+                self.decided_phishing += 1
+            else:
+                self.decided_safe += 1
+        return outcome
+    
+    def _corroborated_safe(self, features: UrlFeatures) -> bool:
+        """A known domain alone is not enough: the other features must agree the URL is benign"""
+        if features.user_content_host:
+            return False
+        return self.scorer.score(features, ignore=("known_domain",)) <= self.safe_baseline
+    
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        decided = self.decided_phishing + self.decided_safe
+        total = decided + self.fell_through
+        return {
+            "enabled": True,
+            "phishing_threshold": self.phishing_threshold,
+            "safe_threshold": self.safe_threshold,
+            "safe_baseline": self.safe_baseline,
+            "decided_phishing": self.decided_phishing,
+            "decided_safe": self.decided_safe,
+            "fell_through": self.fell_through,
+            "short_circuit_ratio": round(decided / total, 4) if total else 0.0
+        }
@@ -0,0 +1,229 @@
+"""
+Prefork production server
+Loads the BERT weights, domain index and n-gram model once in a master
+process, freezes the heap and forks the uvicorn workers, so every worker
+shares the model pages copy-on-write instead of loading its own copy.
+Workers are pinned to disjoint CPU sets with matching torch thread counts.
+
+Usage (from backend/, POSIX only):
+    python prefork.py --workers 4 --port 8000
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+# Prefork configuration
+WORKERS = int(os.getenv("SPEAR_WORKERS", "0"))  # 0 = one per two CPUs available
+HOST = os.getenv("SPEAR_HOST", "0.0.0.0")
+PORT = int(os.getenv("SPEAR_PORT", "8000"))
+PIN_WORKERS = os.getenv("SPEAR_PIN_WORKERS", "true").lower() in ("1", "true", "yes")
+TORCH_THREADS = int(os.getenv("SPEAR_TORCH_THREADS", "0"))  # 0 = CPUs pinned to the worker
+MEMORY_REPORT_INTERVAL = float(os.getenv("SPEAR_MEMORY_REPORT_INTERVAL", "300"))  # Seconds (0 = startup only)
+RESPAWN_DELAY = 1.0  # Seconds before a crashed worker is replaced
+
+# Set in each forked worker, reported by /stats
+WORKER_INFO = {"worker": None, "cpus": None, "torch_threads": None}
+
+
+def available_cpus() -> List[int]:
+    """CPUs this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def default_workers() -> int:
+    return max(1, len(available_cpus()) // 2)
+
+
+def worker_cpus(index: int, workers: int, cpus: Optional[List[int]] = None) -> List[int]:
+    """Contiguous share of the available CPUs for one worker (one CPU each, round-robin, if workers outnumber CPUs)"""
+    cpus = cpus if cpus is not None else available_cpus()
+    if workers >= len(cpus):
+        return [cpus[index % len(cpus)]]
+    per_worker, extra = divmod(len(cpus), workers)
+    start = index * per_worker + min(index, extra)
+    return cpus[start:start + per_worker + (1 if index < extra else 0)]
+
+
+def memory_usage(pid: int) -> Dict[str, Optional[float]]:
+    """
+    Resident and proportional set size of a process, in MB.
+    PSS divides each shared page between the processes mapping it, so the
+    PSS of all workers adds up to their real combined footprint.
+    """
+    usage = {"rss_mb": None, "pss_mb": None, "shared_mb": None}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as handle:
+            fields = {}
+            for line in handle:
+                name, _, value = line.partition(":")
+                parts = value.split()
+                if parts and parts[-1] == "kB":
+                    fields[name] = int(parts[0])
+        usage["rss_mb"] = round(fields.get("Rss", 0) / 1024, 1)
+        usage["pss_mb"] = round(fields.get("Pss", 0) / 1024, 1)
+        usage["shared_mb"] = round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)
+    except OSError:
+        try:
+            with open(f"/proc/{pid}/status") as handle:
+                for line in handle:
+                    if line.startswith("VmRSS:"):
+                        usage["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    return usage
+
+
+def process_stats() -> dict:
+    """Worker identity, CPU pinning and memory of the current process"""
+    return {"pid": os.getpid(), **WORKER_INFO, **memory_usage(os.getpid())}
+
+
+def configure_worker(index: int, workers: int, pin: bool = PIN_WORKERS, torch_threads: int = TORCH_THREADS) -> None:
+    """Pin a freshly forked worker to its CPUs and size torch's thread pools to match"""
+    cpus = worker_cpus(index, workers)
+    if pin and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    threads = torch_threads or len(cpus)
+    torch = sys.modules.get("torch")  # Only imported by the master when the PyTorch backend is used
+    if torch is not None:
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)  # Only allowed before the first parallel op in this process
+        except RuntimeError:
+            pass
+    WORKER_INFO.update(worker=index, cpus=cpus if pin else None, torch_threads=threads if torch is not None else None)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    """Listening socket created by the master and inherited by every worker"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index: int, workers: int, sock: socket.socket) -> None:
+    """Body of a forked worker: serve the app on the shared socket until told to stop"""
+    import uvicorn
+    import main
+    
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    configure_worker(index, workers)
+    print(f"[OK] Worker {index} (pid {os.getpid()}) serving on CPUs {WORKER_INFO['cpus']}, "
+          f"{WORKER_INFO['torch_threads']} torch threads")
+    
+    config = uvicorn.Config(main.app, lifespan="on", log_level="info")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def report_memory(children: Dict[int, int]) -> None:
+    """Print RSS and PSS of the master and every worker"""
+    rows = [("master", os.getpid())]
+    rows += [(f"worker {index}", pid) for pid, index in sorted(children.items(), key=lambda item: item[1])]
+    total_rss = total_pss = 0.0
+    print("[*] Memory per process (MB):  rss / pss / shared")
+    for name, pid in rows:
+        usage = memory_usage(pid)
+        total_rss += usage["rss_mb"] or 0
+        total_pss += usage["pss_mb"] or 0
+        print(f"    {name:<10} pid {pid:<7} {usage['rss_mb']} / {usage['pss_mb']} / {usage['shared_mb']}")
+    print(f"    total      rss {total_rss:.1f} / pss {total_pss:.1f} (pss is the real combined footprint)")
+
+
+def serve(workers: int = WORKERS, host: str = HOST, port: int = PORT) -> None:
+    """Load once, fork `workers` uvicorn processes and keep them running"""
+    if not hasattr(os, "fork"):
+        print("[ERROR] Prefork mode needs os.fork(); on Windows run uvicorn main:app instead")
+        sys.exit(1)
+    workers = workers or default_workers()
+    
+    import main
+    start = time.monotonic()
+    main.preload(warm_up=False)  # Each worker warms up after forking
+    print(f"[OK] Models loaded in the master in {time.monotonic() - start:.1f}s")
+    
+    # Keep objects created so far out of the collector, so garbage collection
+    # in the workers does not write to (and un-share) their pages
+    gc.collect()
+    gc.freeze()
+    
+    sock = bind_socket(host, port)
+    children: Dict[int, int] = {}  # pid -> worker index
+    stopping = False
+    
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, workers, sock)
+            except BaseException as e:
+                print(f"[ERROR] Worker {index} failed: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        children[pid] = index
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    
+    print(f"[*] Starting {workers} workers on http://{host}:{port}")
+    for index in range(workers):
+        spawn(index)
+    
+    next_report = time.monotonic() + 10  # Once workers are up and have touched their pages
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if not stopping and time.monotonic() >= next_report:
+                report_memory(children)
+                next_report = time.monotonic() + MEMORY_REPORT_INTERVAL if MEMORY_REPORT_INTERVAL > 0 else float("inf")
+            time.sleep(0.5)
+            continue
+        
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"[!] Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(RESPAWN_DELAY)
+            spawn(index)
+    
+    sock.close()
+    print("[OK] All workers stopped")
+
+
+def main_cli(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="SPEAR AI prefork server (shared copy-on-write model)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (0 = one per two CPUs)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args(argv)
+    serve(args.workers, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main_cli()
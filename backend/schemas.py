@@ -3,7 +3,7 @@ Pydantic schemas for request/response models
 """
 
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 
 class AnalysisRequest(BaseModel):
@@ -47,6 +47,21 @@ class LLMAnalysis(BaseModel):
     model: Optional[str] = None
     error: Optional[str] = None
     parsed: Optional[ParsedAnalysis] = None
+    cached: bool = False  # Served from the LLM analysis cache
+    coalesced: bool = False  # Shared the result of an identical request already in flight
+    skipped: bool = False  # Templated from the BERT verdict; no LLM was called
+    waitMs: Optional[int] = None  # Time spent waiting for the model, retries and failover included
+    attempts: Optional[int] = None  # Calls made before a model answered
+    hedged: bool = False  # Answered by the hedge request to the secondary model
+    retryAfter: Optional[float] = None  # Seconds until the model's rate-limit budget allows another call
+
+
+class DualLLMAnalysis(BaseModel):
+    """Concurrent DeepSeek + Gemini analysis with consensus"""
+    primary: LLMAnalysis
+    secondary: LLMAnalysis
+    consensus: str
+    processingTime: int
 
 
 class AnalysisResponse(BaseModel):
@@ -55,9 +70,16 @@ class AnalysisResponse(BaseModel):
     rawLabel: str  # Raw model output label
     rawScore: float  # Raw model output score
     llmAnalysis: LLMAnalysis  # LLM cybersecurity analysis
+    secondaryLlmAnalysis: Optional[LLMAnalysis] = None  # Gemini analysis when the policy routed to two LLMs
+    consensus: Optional[str] = None  # Dual LLM consensus when two LLMs were called
+    llmCalls: int = 1  # LLMs called for this request (0 = templated analysis)
+    llmRoute: str = "default"  # Routing policy rule that chose llmCalls
     contentType: str
     timestamp: str
     processingTime: int
+    cached: bool = False  # BERT verdict served from cache
+    decisionStage: str = "bert"  # Stage that decided the verdict: "cache", "domainIndex", "urlLexical", "ngram" or "bert"
+    stageLatencies: Dict[str, float] = {}  # Milliseconds spent in each stage that ran
 
 
 # Separate endpoints for progressive loading
@@ -70,6 +92,107 @@ class DetectionResponse(BaseModel):
     contentType: str
     timestamp: str
     processingTime: int
+    cached: bool = False  # Verdict served from cache
+    decisionStage: str = "bert"  # Stage that decided the verdict: "cache", "domainIndex", "urlLexical", "ngram" or "bert"
+    stageLatencies: Dict[str, float] = {}  # Milliseconds spent in each stage that ran
+
+
+class BatchDetectionItem(BaseModel):
+    """Single item of a batch detection request"""
+    content: str
+    content_type: str  # "url", "email", or "sms"
+
+
+class BatchDetectionRequest(BaseModel):
+    """Bulk BERT detection request"""
+    items: List[BatchDetectionItem]
+
+
+class BatchDetectionResult(BaseModel):
+    """Per-item batch result; errors are reported inline"""
+    index: int
+    success: bool
+    detection: Optional[DetectionResponse] = None
+    error: Optional[str] = None
+
+
+class BatchDetectionResponse(BaseModel):
+    """Bulk BERT detection results in input order"""
+    results: List[BatchDetectionResult]
+    total: int
+    succeeded: int
+    failed: int
+    processingTime: int
+
+
+class JobProgress(BaseModel):
+    """Steps of an analysis job completed so far"""
+    bert: bool = False
+    primaryLlm: bool = False  # DeepSeek analysis, or the templated one when the policy skipped the LLMs
+    secondaryLlm: Optional[bool] = None  # None unless the policy routed the job to a second LLM
+
+
+class JobStatus(BaseModel):
+    """State of an asynchronous /analyze job; fields fill in as its steps complete"""
+    jobId: str
+    status: str  # "queued", "running", "done" or "failed"
+    progress: JobProgress
+    detection: Optional[DetectionResponse] = None
+    llmCalls: Optional[int] = None
+    llmRoute: Optional[str] = None
+    llmAnalysis: Optional[LLMAnalysis] = None
+    secondaryLlmAnalysis: Optional[LLMAnalysis] = None
+    consensus: Optional[str] = None
+    result: Optional[AnalysisResponse] = None  # Same payload /analyze returns, once the job is done
+    error: Optional[str] = None
+    attempts: int = 0
+    reused: bool = False  # Identical content was submitted within the dedup window; its job is returned
+    createdAt: str
+    updatedAt: str
+
+
+class EmailPartResult(BaseModel):
+    """Verdict for one body, text attachment or URL of an ingested email"""
+    kind: str  # "body", "attachment" or "url"
+    label: str  # MIME type, attachment name or the URL
+    success: bool
+    detection: Optional[DetectionResponse] = None
+    error: Optional[str] = None
+
+
+class EmailAttachment(BaseModel):
+    filename: Optional[str] = None
+    mimeType: str
+    size: int  # Decoded bytes
+
+
+class MessageVerdict(BaseModel):
+    """Verdict of a whole message: that of its most phishing-like part"""
+    threatLevel: str
+    confidenceScore: float
+    isPhishing: bool
+    decidedBy: Dict[str, str]  # {"kind": ..., "label": ...} of the deciding part
+
+
+class IngestedEmail(BaseModel):
+    """One message of an uploaded .eml or mbox file"""
+    index: int
+    success: bool
+    headers: Dict[str, Optional[str]] = {}
+    verdict: Optional[MessageVerdict] = None
+    parts: List[EmailPartResult] = []
+    urls: List[str] = []
+    attachments: List[EmailAttachment] = []
+    truncated: bool = False  # A body or the URL list was cut to the ingestion limits
+    error: Optional[str] = None
+
+
+class EmailIngestResponse(BaseModel):
+    """Per-message results of an email upload, in file order"""
+    messages: List[IngestedEmail]
+    total: int
+    phishing: int  # Messages whose verdict is phishing
+    processingTime: int
 
 
 class LLMRequest(BaseModel):
@@ -78,4 +201,6 @@ class LLMRequest(BaseModel):
     content_type: str
     threat_level: str
     confidence: float
+    bypass_cache: bool = False  # Force a fresh LLM call
+    priority: str = "interactive"  # "bulk" calls yield LLM quota to interactive ones and may be shed
 
@@ -1,8 +1,12 @@
 """
 SPEAR AI Backend Startup Script
 Creates venv, installs dependencies, and starts the FastAPI server
+
+    python start.py                 # Development: one process with --reload
+    python start.py --workers 4     # Production: prefork workers sharing one model load
 """
 
+import argparse
 import subprocess
 import sys
 import os
@@ -109,7 +113,21 @@ def install_requirements() -> bool:
         return False
 
 
-def start_server():
+def server_command(workers: int, port: int) -> list:
+    """Development server with --reload, or the prefork server when workers are requested"""
+    if workers and IS_WINDOWS:
+        print("[!] Prefork workers need fork(); starting a single process without --reload")
+        return [VENV_PYTHON, "-m", "uvicorn", "main:app", "--host", "0.0.0.0", "--port", str(port)]
+    if workers:
+        return [VENV_PYTHON, "prefork.py", "--workers", str(workers), "--host", "0.0.0.0", "--port", str(port)]
+    return [VENV_PYTHON, "-m", "uvicorn", 
+            "main:app", 
+            "--host", "0.0.0.0", 
+            "--port", str(port), 
+            "--reload"]
+
+
+def start_server(workers: int = 0, port: int = 8000):
     """Start the FastAPI server using venv Python"""
     print("[*] Starting SPEAR AI Backend Server...")
     print("[*] Press Ctrl+C to stop")
@@ -118,27 +136,17 @@ def start_server():
     # Change to backend directory
     os.chdir(BACKEND_DIR)
     
-    # Run uvicorn using venv Python with proper signal handling
+    # Run the server using venv Python with proper signal handling
     process = None
     try:
         # On Windows, use CREATE_NEW_PROCESS_GROUP for proper Ctrl+C handling
         if IS_WINDOWS:
             process = subprocess.Popen(
-                [VENV_PYTHON, "-m", "uvicorn", 
-                 "main:app", 
-                 "--host", "0.0.0.0", 
-                 "--port", "8000", 
-                 "--reload"],
+                server_command(workers, port),
                 creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
             )
         else:
-            process = subprocess.Popen(
-                [VENV_PYTHON, "-m", "uvicorn", 
-                 "main:app", 
-                 "--host", "0.0.0.0", 
-                 "--port", "8000", 
-                 "--reload"]
-            )
+            process = subprocess.Popen(server_command(workers, port))
         
         process.wait()
     except KeyboardInterrupt:
@@ -153,6 +161,12 @@ def start_server():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="SPEAR AI backend startup")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Production mode: prefork this many workers sharing one model load (0 = dev server)")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    
     print("=" * 50)
     print("   SPEAR AI - Backend Startup")
     print("=" * 50)
@@ -189,7 +203,7 @@ def main():
     print()
     
     # Step 3: Start the server
-    start_server()
+    start_server(args.workers, args.port)
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
  * Composable for handling security analysis logic
  */
 import { ref } from 'vue';
-import { getEndpointURL, createRequestOptions } from '../config/api.config';
+import { getEndpointURL, getWebSocketURL, createRequestOptions } from '../config/api.config';
 
 export function useAnalysis() {
   const analysisResults = ref(null);
@@ -13,6 +13,13 @@ export function useAnalysis() {
   const isGeminiLoading = ref(false);
   const errorMessage = ref(null);
 
+  // One WebSocket per composable, reused across analyses
+  let socket = null;
+  let socketOpening = null;
+  let requestCounter = 0;
+  let activeRequest = null;
+  let analysisRun = 0;
+
   /**
    * Perform BERT-based threat detection
    */
@@ -58,18 +65,215 @@ export function useAnalysis() {
     }
   };
 
+  /**
+   * Stream LLM analysis over Server-Sent Events.
+   * llmAnalysis is updated as tokens and parsed sections arrive; falls back
+   * to the non-streaming endpoint if the stream cannot be opened.
+   */
+  const performLLMAnalysisStream = async (content, contentType, threatLevel, confidence) => {
+    const url = getEndpointURL('analyzeLLMStream');
+    const options = createRequestOptions('POST', {
+      content: content,
+      content_type: contentType,
+      threat_level: threatLevel,
+      confidence: confidence,
+    });
+
+    const response = await fetch(url, options);
+
+    if (!response.ok || !response.body) {
+      return await performLLMAnalysis(content, contentType, threatLevel, confidence);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    const partial = { success: true, analysis: "", model: null, parsed: {}, streaming: true };
+    let buffer = "";
+    let result = null;
+
+    const handleEvent = (event, data) => {
+      if (event === "start") {
+        partial.model = data.model;
+      } else if (event === "token") {
+        partial.analysis += data.text;
+      } else if (event === "section") {
+        partial.parsed = { ...partial.parsed, [data.field]: data.data };
+      } else if (event === "done") {
+        result = data;
+        return;
+      } else if (event === "error") {
+        result = { success: false, analysis: "LLM analysis failed", error: data.detail };
+        return;
+      }
+      // First visible text replaces the loading skeleton
+      if (partial.analysis) {
+        isLLMLoading.value = false;
+        llmAnalysis.value = { ...partial };
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += value;
+
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of block.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        }
+        if (data) handleEvent(event, JSON.parse(data));
+      }
+    }
+
+    return result || { ...partial, streaming: false };
+  };
+
+  /**
+   * Open the analysis WebSocket, or reuse the open one.
+   * Resolves null if it cannot be opened.
+   */
+  const openSocket = () => {
+    if (socket) return Promise.resolve(socket);
+    if (socketOpening) return socketOpening;
+
+    socketOpening = new Promise((resolve) => {
+      const ws = new WebSocket(getWebSocketURL('analyzeSocket'));
+      ws.onopen = () => {
+        socket = ws;
+        resolve(ws);
+      };
+      ws.onerror = () => resolve(null);
+      ws.onclose = () => {
+        socket = null;
+        socketOpening = null;
+        if (activeRequest) {
+          activeRequest.finish(activeRequest.detected);
+        }
+      };
+      ws.onmessage = (event) => handleSocketMessage(JSON.parse(event.data));
+    });
+    return socketOpening;
+  };
+
+  /**
+   * Apply one server message to the analysis it belongs to.
+   * Messages of a superseded analysis are ignored.
+   */
+  const handleSocketMessage = (message) => {
+    const request = activeRequest;
+    if (!request || message.requestId !== request.id) return;
+
+    if (message.type === "detection") {
+      request.detected = true;
+      analysisResults.value = message.data;
+      isAnalyzing.value = false;
+      isLLMLoading.value = true;
+      isGeminiLoading.value = true;
+    } else if (message.type === "llm") {
+      handleLLMEvent(request, message.model, message.event, message.data);
+    } else if (message.type === "complete") {
+      request.finish(true);
+    } else if (message.type === "error") {
+      request.fail(new Error(message.detail || "Analysis failed"));
+    }
+  };
+
+  /**
+   * Same events as the SSE stream, for the primary (DeepSeek) or secondary (Gemini) model
+   */
+  const handleLLMEvent = (request, model, event, data) => {
+    const target = model === "primary" ? llmAnalysis : geminiAnalysis;
+    const loading = model === "primary" ? isLLMLoading : isGeminiLoading;
+    const partial = request.partials[model];
+
+    if (event === "start") {
+      partial.model = data.model;
+    } else if (event === "token") {
+      partial.analysis += data.text;
+    } else if (event === "section") {
+      partial.parsed = { ...partial.parsed, [data.field]: data.data };
+    } else if (event === "done") {
+      target.value = data;
+      loading.value = false;
+      return;
+    } else if (event === "error") {
+      target.value = { success: false, analysis: "LLM analysis failed", error: data.detail };
+      loading.value = false;
+      return;
+    }
+    // First visible text replaces the loading skeleton
+    if (partial.analysis) {
+      loading.value = false;
+      target.value = { ...partial };
+    }
+  };
+
+  /**
+   * Analyze over the WebSocket: the content is sent once, the BERT verdict
+   * arrives first, then DeepSeek and Gemini stream side by side. Sending new
+   * content cancels the analysis in flight on the server.
+   * Resolves false if the socket is unavailable before the verdict arrived,
+   * so the caller can fall back to the HTTP endpoints.
+   */
+  const analyzeOverSocket = async (content, contentType) => {
+    const ws = await openSocket();
+    if (!ws) return false;
+
+    if (activeRequest) {
+      activeRequest.settle(true);  // Superseded: its remaining messages are ignored
+    }
+    return new Promise((resolve, reject) => {
+      const newPartial = () => ({ success: true, analysis: "", model: null, parsed: {}, streaming: true });
+      const request = {
+        id: ++requestCounter,
+        detected: false,
+        partials: { primary: newPartial(), secondary: newPartial() },
+        settle: (handled) => {
+          if (activeRequest === request) activeRequest = null;
+          resolve(handled);
+        },
+        finish: (handled) => {
+          isLLMLoading.value = false;
+          isGeminiLoading.value = false;
+          request.settle(handled);
+        },
+        fail: (error) => {
+          if (activeRequest === request) activeRequest = null;
+          reject(error);
+        },
+      };
+      activeRequest = request;
+      ws.send(JSON.stringify({
+        type: "analyze",
+        requestId: request.id,
+        content: content,
+        content_type: contentType,
+      }));
+    });
+  };
+
   /**
    * Main analysis function
    */
   const analyzeContent = async (content, contentType) => {
     if (!content.trim()) return;
 
+    const run = ++analysisRun;
     isAnalyzing.value = true;
     errorMessage.value = null;
     analysisResults.value = null;
     llmAnalysis.value = null;
+    geminiAnalysis.value = null;
 
     try {
+      if (await analyzeOverSocket(content, contentType)) return;
+
       // Step 1: Fast BERT detection
       const detectResult = await performBertDetection(content, contentType);
       analysisResults.value = detectResult;
@@ -77,7 +281,7 @@ export function useAnalysis() {
 
       // Step 2: Start LLM analysis in background
       isLLMLoading.value = true;
-      const llmResult = await performLLMAnalysis(
+      const llmResult = await performLLMAnalysisStream(
         content, 
         contentType, 
         detectResult.threatLevel, 
@@ -86,14 +290,19 @@ export function useAnalysis() {
       llmAnalysis.value = llmResult;
 
     } catch (error) {
+      if (run !== analysisRun) return;
       console.error("Analysis error:", error);
       const { baseURL } = await import('../config/api.config').then(m => m.API_CONFIG);
       errorMessage.value = error.message === "Failed to fetch"
         ? `Cannot connect to the analysis server. Make sure the backend is running on ${baseURL}`
         : error.message;
     } finally {
-      isAnalyzing.value = false;
-      isLLMLoading.value = false;
+      // A newer analysis owns the loading state
+      if (run === analysisRun) {
+        isAnalyzing.value = false;
+        isLLMLoading.value = false;
+        isGeminiLoading.value = false;
+      }
     }
   };
 
@@ -12,6 +12,8 @@ export const API_CONFIG = {
   endpoints: {
     detect: "/detect",
     analyzeLLM: "/analyze-llm",
+    analyzeLLMStream: "/analyze-llm/stream",
+    analyzeSocket: "/ws/analyze",
   },
   
   // Request timeout in milliseconds
@@ -30,6 +32,13 @@ export function getEndpointURL(endpoint) {
   return `${API_CONFIG.baseURL}${API_CONFIG.endpoints[endpoint] || endpoint}`;
 }
 
+/**
+ * Get WebSocket URL of an endpoint (ws:// or wss:// matching the base URL)
+ */
+export function getWebSocketURL(endpoint) {
+  return getEndpointURL(endpoint).replace(/^http/, "ws");
+}
+
 /**
  * Create request options
  */